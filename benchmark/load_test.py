@@ -0,0 +1,212 @@
+"""
+Load benchmark: streams a WAV file from many concurrent sessions and reports
+transport and transcription statistics.
+
+Every profile given with --transport-profiles is run in turn with the same
+load, using the profile's options for the client connections, so profiles
+can be compared against one server. Options negotiated on both ends, like
+compression, follow the client; run the server with the same
+--transport-profile to compare server-side limits and uvloop as well.
+
+    python -m benchmark.load_test --uri ws://127.0.0.1:8765 --api-key KEY \\
+        --sessions 200 --transport-profiles default,high_throughput
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import urllib.parse
+import wave
+
+import websockets
+
+from src.transport import get_transport_options, split_transport_options
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def load_frames(audio_file, frame_ms):
+    with wave.open(audio_file, "rb") as wav_file:
+        if wav_file.getnchannels() != 1 or wav_file.getsampwidth() != 2:
+            raise ValueError("Only mono 16-bit WAV files are supported")
+        sampling_rate = wav_file.getframerate()
+        audio = wav_file.readframes(wav_file.getnframes())
+    frame_bytes = int(sampling_rate * frame_ms / 1000) * 2
+    frames = [
+        audio[i : i + frame_bytes]  # noqa: E203
+        for i in range(0, len(audio), frame_bytes)
+    ]
+    return frames, sampling_rate
+
+
+async def run_session(uri, frames, args, connect_options, stats):
+    frame_seconds = args.frame_ms / 1000 / args.speed
+    connect_start = time.perf_counter()
+    try:
+        websocket = await websockets.connect(uri, **connect_options)
+    except Exception as e:
+        stats["errors"].append(repr(e))
+        return
+    stats["connect_times"].append(time.perf_counter() - connect_start)
+    stats["compressed"] += int(bool(websocket.extensions))
+
+    async def receive():
+        try:
+            async for message in websocket:
+                stats["results"] += 1
+                stats["bytes_received"] += len(message)
+                if isinstance(message, str):
+                    processing_time = json.loads(message).get(
+                        "processing_time"
+                    )
+                    if processing_time is not None:
+                        stats["processing_times"].append(
+                            float(processing_time)
+                        )
+        except websockets.ConnectionClosed:
+            pass
+
+    receive_task = asyncio.create_task(receive())
+    try:
+        await websocket.send(
+            json.dumps({"type": "config", "data": json.loads(args.config)})
+        )
+        next_send = time.perf_counter()
+        for frame in frames:
+            send_start = time.perf_counter()
+            await websocket.send(frame)
+            stats["send_times"].append(time.perf_counter() - send_start)
+            stats["bytes_sent"] += len(frame)
+            next_send += frame_seconds
+            await asyncio.sleep(max(0, next_send - time.perf_counter()))
+        await asyncio.sleep(args.linger)
+    except websockets.ConnectionClosed as e:
+        stats["errors"].append(f"closed: {e.code} {e.reason}")
+    finally:
+        await websocket.close()
+        await receive_task
+
+
+async def run_profile(profile, frames, args):
+    _, connect_options = split_transport_options(
+        get_transport_options(profile)
+    )
+    uri = (
+        args.uri
+        + "?"
+        + urllib.parse.urlencode({"AWAAZ_API_KEY": args.api_key})
+    )
+    stats = {
+        "connect_times": [],
+        "send_times": [],
+        "processing_times": [],
+        "errors": [],
+        "results": 0,
+        "compressed": 0,
+        "bytes_sent": 0,
+        "bytes_received": 0,
+    }
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    sessions = []
+    for _ in range(args.sessions):
+        sessions.append(
+            asyncio.create_task(
+                run_session(uri, frames, args, connect_options, stats)
+            )
+        )
+        await asyncio.sleep(args.ramp_up / args.sessions)
+    await asyncio.gather(*sessions)
+    return {
+        "profile": profile,
+        "sessions": args.sessions,
+        "errors": len(stats["errors"]),
+        "compressed_sessions": stats["compressed"],
+        "wall_time": time.perf_counter() - start,
+        "client_cpu_time": time.process_time() - cpu_start,
+        "connect_p50": percentile(stats["connect_times"], 0.5),
+        "connect_p95": percentile(stats["connect_times"], 0.95),
+        "send_p50": percentile(stats["send_times"], 0.5),
+        "send_p99": percentile(stats["send_times"], 0.99),
+        "results": stats["results"],
+        "processing_time_mean": (
+            statistics.mean(stats["processing_times"])
+            if stats["processing_times"]
+            else 0.0
+        ),
+        "processing_time_p95": percentile(stats["processing_times"], 0.95),
+        "bytes_sent": stats["bytes_sent"],
+        "bytes_received": stats["bytes_received"],
+        "first_errors": stats["errors"][:5],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Load benchmark for the VoiceStreamAI server"
+    )
+    parser.add_argument("--uri", type=str, default="ws://127.0.0.1:8765")
+    parser.add_argument("--api-key", type=str, required=True)
+    parser.add_argument(
+        "--audio-file",
+        type=str,
+        default="test/audio_files/eng_speech.wav",
+        help="Mono 16-bit WAV file streamed by every session",
+    )
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument(
+        "--ramp-up",
+        type=float,
+        default=5,
+        help="Seconds over which the sessions are opened",
+    )
+    parser.add_argument(
+        "--frame-ms",
+        type=int,
+        default=250,
+        help="Duration of the audio sent in each WebSocket message",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Streaming speed relative to real time",
+    )
+    parser.add_argument(
+        "--linger",
+        type=float,
+        default=10,
+        help="Seconds to wait for results after the audio is sent",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="{}",
+        help="JSON string of the config data sent by every session",
+    )
+    parser.add_argument(
+        "--transport-profiles",
+        type=str,
+        default="default",
+        help="Comma separated transport profiles to compare",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    frames, _ = load_frames(args.audio_file, args.frame_ms)
+    for profile in args.transport_profiles.split(","):
+        report = asyncio.run(run_profile(profile.strip(), frames, args))
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
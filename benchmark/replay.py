@@ -0,0 +1,190 @@
+"""
+Replays sessions recorded by the server (--record-sessions) against a
+server, reproducing their frame sizes, pauses, config messages and arrival
+times, and reports the same statistics as the load benchmark.
+
+Sessions start at the same offsets relative to each other as when they were
+recorded and each message is sent at its recorded offset within its
+session, all divided by --speed.
+
+    python -m benchmark.replay recordings/sessions-*.rec.gz \\
+        --uri ws://127.0.0.1:8765 --api-key KEY --speed 2
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import urllib.parse
+
+import websockets
+
+from benchmark.load_test import percentile
+from src.recorder import AUDIO, CONFIG, SESSION_OPEN, read_records
+from src.transport import get_transport_options, split_transport_options
+
+
+def load_sessions(paths, max_sessions=None):
+    """
+    Returns the recorded sessions as (start time, [(offset, message)]),
+    sorted by start time. Sessions whose opening was not recorded are
+    skipped.
+    """
+    sessions = {}
+    for path in paths:
+        for kind, session_id, arrival_time, payload in read_records(path):
+            if kind == SESSION_OPEN:
+                sessions[session_id] = (arrival_time, [])
+            elif session_id in sessions and kind in (AUDIO, CONFIG):
+                start, messages = sessions[session_id]
+                message = payload if kind == AUDIO else payload.decode()
+                messages.append((arrival_time - start, message))
+    ordered = sorted(sessions.values(), key=lambda session: session[0])
+    return ordered[:max_sessions] if max_sessions else ordered
+
+
+async def replay_session(uri, messages, args, connect_options, stats):
+    try:
+        websocket = await websockets.connect(uri, **connect_options)
+    except Exception as e:
+        stats["errors"].append(repr(e))
+        return
+    session_start = time.perf_counter()
+
+    async def receive():
+        try:
+            async for message in websocket:
+                stats["results"] += 1
+                if isinstance(message, str):
+                    processing_time = json.loads(message).get(
+                        "processing_time"
+                    )
+                    if processing_time is not None:
+                        stats["processing_times"].append(
+                            float(processing_time)
+                        )
+        except websockets.ConnectionClosed:
+            pass
+
+    receive_task = asyncio.create_task(receive())
+    try:
+        for offset, message in messages:
+            delay = session_start + offset / args.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                stats["send_lag"].append(-delay)
+            await websocket.send(message)
+            if isinstance(message, bytes):
+                stats["audio_bytes"] += len(message)
+            else:
+                stats["config_messages"] += 1
+        await asyncio.sleep(args.linger)
+    except websockets.ConnectionClosed as e:
+        stats["errors"].append(f"closed: {e.code} {e.reason}")
+    finally:
+        await websocket.close()
+        await receive_task
+
+
+async def replay(sessions, args):
+    _, connect_options = split_transport_options(
+        get_transport_options(args.transport_profile)
+    )
+    uri = (
+        args.uri
+        + "?"
+        + urllib.parse.urlencode({"AWAAZ_API_KEY": args.api_key})
+    )
+    stats = {
+        "processing_times": [],
+        "send_lag": [],
+        "errors": [],
+        "results": 0,
+        "audio_bytes": 0,
+        "config_messages": 0,
+    }
+    first_start = sessions[0][0] if sessions else 0
+    start = time.perf_counter()
+    tasks = []
+    for session_start, messages in sessions:
+        delay = (
+            start
+            + (session_start - first_start) / args.speed
+            - time.perf_counter()
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(
+            asyncio.create_task(
+                replay_session(uri, messages, args, connect_options, stats)
+            )
+        )
+    await asyncio.gather(*tasks)
+    return {
+        "sessions": len(sessions),
+        "speed": args.speed,
+        "errors": len(stats["errors"]),
+        "wall_time": time.perf_counter() - start,
+        "audio_bytes": stats["audio_bytes"],
+        "config_messages": stats["config_messages"],
+        "late_sends": len(stats["send_lag"]),
+        "send_lag_p95": percentile(stats["send_lag"], 0.95),
+        "results": stats["results"],
+        "processing_time_mean": (
+            statistics.mean(stats["processing_times"])
+            if stats["processing_times"]
+            else 0.0
+        ),
+        "processing_time_p95": percentile(stats["processing_times"], 0.95),
+        "first_errors": stats["errors"][:5],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Replay recorded sessions against the VoiceStreamAI "
+        "server"
+    )
+    parser.add_argument(
+        "archives", nargs="+", help="Archives written by --record-sessions"
+    )
+    parser.add_argument("--uri", type=str, default="ws://127.0.0.1:8765")
+    parser.add_argument("--api-key", type=str, required=True)
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Replay speed relative to the recorded timing",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=None,
+        help="Only replay the first sessions of the recording",
+    )
+    parser.add_argument(
+        "--linger",
+        type=float,
+        default=10,
+        help="Seconds to wait for results after a session's last message",
+    )
+    parser.add_argument(
+        "--transport-profile",
+        type=str,
+        default="default",
+        help="Transport profile of the client connections",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sessions = load_sessions(args.archives, args.max_sessions)
+    report = asyncio.run(replay(sessions, args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
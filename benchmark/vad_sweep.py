@@ -0,0 +1,331 @@
+"""
+VAD benchmark: runs VAD backends and parameter grids over labeled audio and
+reports, for each configuration, the latency of the VAD calls, the speech
+recall and precision, and how much audio would be sent to ASR.
+
+The files are streamed through VAD the way SilenceAtEndOfChunk does: the
+scratch buffer grows by --chunk-length-seconds, is discarded when VAD finds
+no speech, and is sent to ASR once the last speech segment ends
+--chunk-offset-seconds before its end (and at the end of the file). Recall
+and precision compare the speech segments of the utterances sent to ASR with
+the "is_speech" segments of the annotations.
+
+Every registered VAD backend is run, with each combination of the values of
+its grid (see DEFAULT_GRIDS and --grid). Backends that cannot be loaded, e.g.
+for a missing dependency or token, are reported with their error.
+
+    python -m benchmark.vad_sweep test/audio_files/annotations.json \\
+        --vad-args '{"pyannote": {"auth_token": "TOKEN"}}' \\
+        --grid '{"silero": {"threshold": [0.3, 0.5, 0.7]}}'
+"""
+
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import statistics
+import time
+import wave
+
+from benchmark.load_test import percentile
+from src.client import Client
+from src.vad.vad_factory import VAD_BACKENDS, VADFactory
+
+# Values tried for each VAD argument, by backend. Dotted names set keys of
+# nested arguments. Pyannote's are around PyannoteVAD.DEFAULT_ARGS.
+DEFAULT_GRIDS = {
+    "pyannote": {
+        "pyannote_args.onset": [0.5, 0.7],
+        "pyannote_args.offset": [0.3, 0.5],
+        "pyannote_args.min_duration_on": [0.3, 0.5],
+        "pyannote_args.min_duration_off": [0.3],
+    },
+    "silero": {
+        "threshold": [0.3, 0.5, 0.7],
+        "min_silence_duration_ms": [300, 500],
+    },
+}
+
+
+def default_args(vad_type):
+    """
+    Returns the default arguments of a VAD backend (its DEFAULT_ARGS, e.g.
+    the nested `pyannote_args` of PyannoteVAD), which the values of the grid
+    are merged into. Backends that cannot be imported have none: `sweep`
+    reports their error.
+    """
+    try:
+        backend = VAD_BACKENDS.get(vad_type)
+    except Exception:
+        return {}
+    return copy.deepcopy(getattr(backend, "DEFAULT_ARGS", {}))
+
+
+def load_dataset(annotations_path):
+    """
+    Returns the annotated files as (name, audio, speech segments), reading
+    the audio next to the annotations.
+    """
+    with open(annotations_path) as annotations_file:
+        annotations = json.load(annotations_file)
+    directory = os.path.dirname(annotations_path)
+    dataset = []
+    for name, data in annotations.items():
+        with wave.open(os.path.join(directory, name), "rb") as wav_file:
+            if (
+                wav_file.getnchannels() != 1
+                or wav_file.getsampwidth() != 2
+                or wav_file.getframerate() != 16000
+            ):
+                raise ValueError(
+                    f"{name}: only mono 16-bit 16 kHz WAV files are "
+                    "supported"
+                )
+            audio = wav_file.readframes(wav_file.getnframes())
+        speech = [
+            (segment["start"], segment["end"])
+            for segment in data["segments"]
+            if segment.get("is_speech", True)
+        ]
+        dataset.append((name, audio, speech))
+    return dataset
+
+
+def expand_grid(grid):
+    """Returns every combination of the values of `grid` as a dict."""
+    names = sorted(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def make_vad_args(base_args, params):
+    vad_args = copy.deepcopy(base_args)
+    for name, value in params.items():
+        target = vad_args
+        *parents, key = name.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[key] = value
+    return vad_args
+
+
+def merge_segments(segments):
+    merged = []
+    for start, end in sorted(segments):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def total_seconds(segments):
+    return sum(end - start for start, end in merge_segments(segments))
+
+
+def overlap_seconds(segments, other_segments):
+    segments = merge_segments(segments)
+    other_segments = merge_segments(other_segments)
+    overlap = 0.0
+    i = j = 0
+    while i < len(segments) and j < len(other_segments):
+        start = max(segments[i][0], other_segments[j][0])
+        end = min(segments[i][1], other_segments[j][1])
+        overlap += max(0.0, end - start)
+        if segments[i][1] < other_segments[j][1]:
+            i += 1
+        else:
+            j += 1
+    return overlap
+
+
+async def stream_file(vad, audio, chunk_length_seconds, chunk_offset_seconds):
+    """
+    Streams `audio` through `vad` like SilenceAtEndOfChunk.
+
+    Returns:
+        tuple: The duration of each VAD call, the speech segments of the
+               utterances sent to ASR in seconds from the start of the file,
+               and the seconds of audio sent to ASR.
+    """
+    client = Client("vad_sweep", 16000, 2)
+    bytes_per_second = client.sampling_rate * client.samples_width
+    chunk_bytes = int(chunk_length_seconds * bytes_per_second)
+    chunk_bytes -= chunk_bytes % client.samples_width
+    latencies = []
+    detected = []
+    forwarded_seconds = 0.0
+    buffer_start = 0.0
+
+    for position in range(0, len(audio), chunk_bytes):
+        client.scratch_buffer += audio[
+            position : position + chunk_bytes  # noqa: E203
+        ]
+        final = position + chunk_bytes >= len(audio)
+        start = time.perf_counter()
+        vad_results = await vad.detect_activity(client)
+        latencies.append(time.perf_counter() - start)
+
+        buffer_duration = len(client.scratch_buffer) / bytes_per_second
+        if not vad_results:
+            client.clear_scratch_buffer()
+            buffer_start += buffer_duration
+        elif (
+            final
+            or vad_results[-1]["end"] < buffer_duration - chunk_offset_seconds
+        ):
+            detected.extend(
+                (
+                    buffer_start + segment["start"],
+                    buffer_start + segment["end"],
+                )
+                for segment in vad_results
+            )
+            forwarded_seconds += buffer_duration
+            client.clear_scratch_buffer()
+            client.increment_file_counter()
+            buffer_start += buffer_duration
+    return latencies, detected, forwarded_seconds
+
+
+async def evaluate(vad, dataset, chunk_length_seconds, chunk_offset_seconds):
+    latencies = []
+    audio_seconds = speech_seconds = detected_seconds = 0.0
+    true_positive_seconds = forwarded_seconds = 0.0
+    for _, audio, speech in dataset:
+        file_latencies, detected, file_forwarded_seconds = await stream_file(
+            vad, audio, chunk_length_seconds, chunk_offset_seconds
+        )
+        latencies.extend(file_latencies)
+        audio_seconds += len(audio) / 32000
+        speech_seconds += total_seconds(speech)
+        detected_seconds += total_seconds(detected)
+        true_positive_seconds += overlap_seconds(detected, speech)
+        forwarded_seconds += file_forwarded_seconds
+    return {
+        "vad_calls": len(latencies),
+        "latency_mean": statistics.mean(latencies) if latencies else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_max": max(latencies, default=0.0),
+        "real_time_factor": sum(latencies) / audio_seconds,
+        "recall": (
+            true_positive_seconds / speech_seconds if speech_seconds else 1.0
+        ),
+        "precision": (
+            true_positive_seconds / detected_seconds
+            if detected_seconds
+            else 1.0
+        ),
+        "audio_seconds": audio_seconds,
+        "forwarded_seconds": forwarded_seconds,
+        "forwarded_fraction": forwarded_seconds / audio_seconds,
+        "detected_speech_seconds": detected_seconds,
+    }
+
+
+async def sweep(dataset, configurations, args):
+    """
+    Evaluates each (vad_type, vad_args) of `configurations` on `dataset`.
+
+    Returns:
+        list: One report per configuration.
+    """
+    reports = []
+    for vad_type, vad_args in configurations:
+        report = {"vad_type": vad_type, "vad_args": vad_args}
+        start = time.perf_counter()
+        try:
+            vad = VADFactory.create_vad_pipeline(vad_type, **vad_args)
+        except Exception as e:
+            report["error"] = repr(e)
+            reports.append(report)
+            continue
+        report["load_seconds"] = time.perf_counter() - start
+        report.update(
+            await evaluate(
+                vad,
+                dataset,
+                args.chunk_length_seconds,
+                args.chunk_offset_seconds,
+            )
+        )
+        reports.append(report)
+    return reports
+
+
+def list_configurations(vad_types, base_args, grids):
+    configurations = []
+    for vad_type in vad_types:
+        base = default_args(vad_type)
+        base.update(base_args.get(vad_type, {}))
+        for params in expand_grid(grids.get(vad_type, {})):
+            configurations.append((vad_type, make_vad_args(base, params)))
+    return configurations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark VAD backends and settings on labeled audio"
+    )
+    parser.add_argument(
+        "annotations",
+        nargs="?",
+        default="test/audio_files/annotations.json",
+        help="JSON annotations of WAV files in the same directory",
+    )
+    parser.add_argument(
+        "--vad-types",
+        type=str,
+        default=None,
+        help="Comma separated VAD backends. default: all the registered ones",
+    )
+    parser.add_argument(
+        "--vad-args",
+        type=str,
+        default="{}",
+        help="JSON object of the arguments of each backend, e.g. "
+        '\'{"pyannote": {"auth_token": "TOKEN"}}\'',
+    )
+    parser.add_argument(
+        "--grid",
+        type=str,
+        default=None,
+        help="JSON object of the values tried for each argument of each "
+        "backend, replacing the default grid of the backends it lists",
+    )
+    parser.add_argument("--chunk-length-seconds", type=float, default=5)
+    parser.add_argument("--chunk-offset-seconds", type=float, default=0.1)
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="JSON lines file the reports are appended to",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    vad_types = (
+        args.vad_types.split(",") if args.vad_types else VAD_BACKENDS.names()
+    )
+    grids = dict(DEFAULT_GRIDS)
+    if args.grid:
+        grids.update(json.loads(args.grid))
+    configurations = list_configurations(
+        vad_types, json.loads(args.vad_args), grids
+    )
+    dataset = load_dataset(args.annotations)
+    reports = asyncio.run(sweep(dataset, configurations, args))
+    if args.output:
+        with open(args.output, "a") as output_file:
+            for report in reports:
+                output_file.write(json.dumps(report) + "\n")
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
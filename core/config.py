@@ -1,9 +1,10 @@
+import json
 import os
+
 from dotenv import load_dotenv
 
 from core.consts import TRUTH_VALUES
 
-
 load_dotenv()
 
 
@@ -17,6 +18,26 @@ def get_int_from_env(env_var: str, default: int = 0) -> int:
         return default
 
 
+def get_float_from_env(env_var: str, default: float = 0.0) -> float:
+    env_var_val = os.environ.get(env_var)
+    if env_var_val is None:
+        return default
+    try:
+        return float(env_var_val)
+    except (ValueError, TypeError):
+        return default
+
+
+def get_json_from_env(env_var: str, default=None):
+    env_var_val = os.environ.get(env_var)
+    if env_var_val is None:
+        return default
+    try:
+        return json.loads(env_var_val)
+    except ValueError:
+        return default
+
+
 def get_bool_from_env(env_var: str, default: bool = False) -> bool:
     try:
         return os.environ.get(env_var, "").lower() in TRUTH_VALUES
@@ -25,11 +46,19 @@ def get_bool_from_env(env_var: str, default: bool = False) -> bool:
 
 
 TARA_API_KEY = os.getenv("TARA_API_KEY")
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 DEPLOYMENT = os.getenv("DEPLOYMENT", "local")
 FORCE_JSON_LOGGER = get_bool_from_env(os.getenv("FORCE_JSON_LOGGER"))
+# Log records waiting for the writer thread, more are dropped
+LOG_QUEUE_SIZE = get_int_from_env("LOG_QUEUE_SIZE", 10000)
+# Sampling and rate limit of the per-chunk log events (0: no limit)
+LOG_HOT_PATH_SAMPLE_RATE = get_float_from_env("LOG_HOT_PATH_SAMPLE_RATE", 1.0)
+LOG_HOT_PATH_MAX_PER_SECOND = get_float_from_env(
+    "LOG_HOT_PATH_MAX_PER_SECOND", 0.0
+)
 
 API_KEYS = [TARA_API_KEY]
-
-
-
+# Per API key overrides of the session limits, for example
+# {"<api key>": {"max_sessions": 50, "audio_seconds_per_minute": 3000}}
+API_KEY_LIMITS = get_json_from_env("API_KEY_LIMITS", {})
@@ -5,3 +5,12 @@ TRUTH_VALUES = (
     "yes",
     "true",
 )
+
+# WebSocket close codes sent by the server (4000-4999 are private codes)
+CLOSE_CODE_INVALID_API_KEY = 4001
+CLOSE_CODE_OVER_CAPACITY = 4002
+CLOSE_CODE_SESSION_LIMIT = 4003
+CLOSE_CODE_AUDIO_RATE_LIMIT = 4004
+CLOSE_CODE_IDLE_TIMEOUT = 4005
+CLOSE_CODE_MEMORY_LIMIT = 4006
+CLOSE_CODE_INVALID_CONFIG = 4007
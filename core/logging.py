@@ -1,16 +1,98 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
+import time
 
-from core.config import LOG_LEVEL, FORCE_JSON_LOGGER, DEPLOYMENT
-from asgi_correlation_id.context import correlation_id
 import structlog
+from asgi_correlation_id.context import correlation_id
 
-logging.basicConfig(
-    format="%(message)s",
-    stream=sys.stdout,
-    level=LOG_LEVEL,
+from core.config import (
+    DEPLOYMENT,
+    FORCE_JSON_LOGGER,
+    LOG_HOT_PATH_MAX_PER_SECOND,
+    LOG_HOT_PATH_SAMPLE_RATE,
+    LOG_LEVEL,
+    LOG_QUEUE_SIZE,
 )
 
+
+class LogStats:
+    """
+    Log records that were not written: `dropped` because the queue of the
+    writer thread was full, `sampled_out` by the hot path sampling.
+    """
+
+    def __init__(self):
+        self.dropped = 0
+        self.sampled_out = 0
+
+
+log_stats = LogStats()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands the records over to the writer thread without rendering them:
+    structlog event dicts are rendered by the writer's ProcessorFormatter.
+    When the queue is full the record is dropped and counted.
+    """
+
+    def prepare(self, record):
+        if isinstance(record.msg, dict):
+            return record
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_stats.dropped += 1
+
+
+class HotPathSampler:
+    """
+    structlog processor thinning out the events logged with
+    `hot_path=True` (see `hot_path_log`): each one is kept with probability
+    `sample_rate`, and at most `max_per_second` of them are kept per second
+    (0 for no limit).
+    """
+
+    def __init__(self, sample_rate=1.0, max_per_second=0.0):
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self._tokens = max_per_second
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self, logger, method_name, event_dict):
+        if not event_dict.pop("hot_path", False):
+            return event_dict
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            log_stats.sampled_out += 1
+            raise structlog.DropEvent
+        if self.max_per_second > 0 and not self._take_token():
+            log_stats.sampled_out += 1
+            raise structlog.DropEvent
+        return event_dict
+
+    def _take_token(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.max_per_second,
+                self._tokens + (now - self._last_refill) * self.max_per_second,
+            )
+            self._last_refill = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
 def add_correlation(logger, method_name, event_dict):
     cid = correlation_id.get()
     if cid:
@@ -24,13 +106,40 @@ else:
     renderer = structlog.dev.ConsoleRenderer()
 
 
+# Records are rendered and written to stdout by a background thread, so that
+# a slow stdout does not block the event loop.
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(
+    structlog.stdlib.ProcessorFormatter(
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            renderer,
+        ],
+        foreign_pre_chain=[
+            structlog.processors.TimeStamper(fmt="iso", key="timestamp"),
+            structlog.stdlib.add_log_level,
+        ],
+    )
+)
+log_queue = queue.Queue(LOG_QUEUE_SIZE)
+log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logging.basicConfig(
+    format="%(message)s",
+    handlers=[NonBlockingQueueHandler(log_queue)],
+    level=LOG_LEVEL,
+)
+
 structlog.configure(
     processors=[
+        HotPathSampler(LOG_HOT_PATH_SAMPLE_RATE, LOG_HOT_PATH_MAX_PER_SECOND),
         add_correlation,
         structlog.processors.TimeStamper(fmt="iso", key="timestamp"),
         structlog.stdlib.add_log_level,
         structlog.processors.format_exc_info,
-        renderer,
+        structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
     ],
     context_class=dict,
     logger_factory=structlog.stdlib.LoggerFactory(),
@@ -40,3 +149,5 @@ structlog.configure(
 
 
 log = structlog.get_logger()
+# For the events logged for every chunk, subject to the hot path sampling
+hot_path_log = log.bind(hot_path=True)
@@ -0,0 +1,173 @@
+# monitoring/loop_lag.py
+
+import asyncio
+import contextvars
+import sys
+import threading
+import time
+import traceback
+import weakref
+
+from asgi_correlation_id import correlation_id
+
+from core.logging import log
+from monitoring.metrics import get_metric_publisher
+
+
+class LoopLagWatchdog:
+    """
+    Measures how late the event loop runs its callbacks, and finds the code
+    blocking it.
+
+    `run` sleeps for `interval` seconds in a loop; the time it wakes up late
+    is the loop lag. Every `publish_interval` seconds the largest and the
+    mean lag, and the number of stalls (lags over `threshold_seconds`), are
+    published as the EventLoopLagMaxSeconds, EventLoopLagMeanSeconds and
+    EventLoopStalls metrics.
+
+    A helper thread watches the heartbeat of `run`: once the loop has been
+    blocked for `threshold_seconds`, it captures the stack of the loop's
+    thread while it is still blocked and logs it, with the correlation id of
+    the task that was running. Stacks are logged at most once per stall and
+    once every `report_cooldown_seconds`.
+    """
+
+    def __init__(
+        self,
+        interval=0.1,
+        threshold_seconds=0.25,
+        publish_interval=60,
+        report_cooldown_seconds=10,
+    ):
+        self.interval = interval
+        self.threshold_seconds = threshold_seconds
+        self.publish_interval = publish_interval
+        self.report_cooldown_seconds = report_cooldown_seconds
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.reported_stalls = 0
+        self._lag_total = 0.0
+        self._lag_count = 0
+        self._heartbeat = time.monotonic()
+        self._reported_heartbeat = None
+        self._last_report = None
+        self._loop = None
+        self._loop_thread_id = None
+        self._task_contexts = weakref.WeakKeyDictionary()
+        self._stopped = threading.Event()
+
+    def record_lag(self, lag):
+        self.max_lag = max(self.max_lag, lag)
+        self._lag_total += lag
+        self._lag_count += 1
+        if lag >= self.threshold_seconds:
+            self.stalls += 1
+
+    def pop_stats(self):
+        """
+        Returns the largest and the mean lag, and the number of stalls,
+        since the last call.
+        """
+        stats = (
+            self.max_lag,
+            self._lag_total / self._lag_count if self._lag_count else 0.0,
+            self.stalls,
+        )
+        self.max_lag = 0.0
+        self._lag_total = 0.0
+        self._lag_count = 0
+        self.stalls = 0
+        return stats
+
+    def publish(self, max_lag, mean_lag, stalls):
+        cw = get_metric_publisher()
+        cw.publish_metric("EventLoopLagMaxSeconds", max_lag, unit="Seconds")
+        cw.publish_metric("EventLoopLagMeanSeconds", mean_lag, unit="Seconds")
+        cw.publish_metric("EventLoopStalls", stalls, unit="Count")
+
+    def _task_factory(self, loop, coro, context=None):
+        # Keeps the context of every task, so that the correlation id of
+        # the running task can be read from the helper thread
+        if context is None:
+            context = contextvars.copy_context()
+        task = asyncio.Task(coro, loop=loop, context=context)
+        self._task_contexts[task] = context
+        return task
+
+    def current_correlation_id(self):
+        task = asyncio.current_task(self._loop)
+        context = self._task_contexts.get(task) if task else None
+        return context.get(correlation_id) if context else None
+
+    def capture_stack(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        return "".join(traceback.format_stack(frame))
+
+    def check(self):
+        """
+        Called by the helper thread: logs the stack of the loop's thread if
+        it has been blocked for `threshold_seconds`.
+
+        Returns:
+            bool: Whether a stack was logged.
+        """
+        heartbeat = self._heartbeat
+        now = time.monotonic()
+        blocked = now - heartbeat - self.interval
+        if (
+            blocked < self.threshold_seconds
+            or heartbeat == self._reported_heartbeat
+        ):
+            return False
+        self._reported_heartbeat = heartbeat
+        if (
+            self._last_report is not None
+            and now - self._last_report < self.report_cooldown_seconds
+        ):
+            return False
+        self._last_report = now
+        self.reported_stalls += 1
+        log.warning(
+            "Event loop blocked",
+            blocked_seconds=round(blocked, 3),
+            correlation_id=self.current_correlation_id(),
+            stack=self.capture_stack(),
+        )
+        return True
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        tracks_tasks = self._loop.get_task_factory() is None
+        if tracks_tasks:
+            self._loop.set_task_factory(self._task_factory)
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        threading.Thread(
+            target=self._watch, name="loop-lag-watchdog", daemon=True
+        ).start()
+        last_publish = time.monotonic()
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                self.record_lag(max(0.0, now - expected))
+                self._heartbeat = now
+                if now - last_publish >= self.publish_interval:
+                    last_publish = now
+                    # Not awaited: the heartbeat must go on while boto3
+                    # publishes
+                    self._loop.run_in_executor(
+                        None, self.publish, *self.pop_stats()
+                    )
+        finally:
+            self._stopped.set()
+            if tracks_tasks:
+                self._loop.set_task_factory(None)
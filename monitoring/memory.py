@@ -0,0 +1,105 @@
+# monitoring/memory.py
+
+import contextlib
+import threading
+import time
+
+from core.logging import log
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+
+class MemorySampler:
+    """
+    Reads the memory of the device the models run on.
+
+    NVML is initialized once and its handle kept for the life of the process.
+    Without NVML (not installed, or no GPU), the host memory is read from
+    `/proc/meminfo` instead, so that sizing and metrics still have numbers
+    to work with.
+    """
+
+    def __init__(self, device_index=0):
+        self.device_index = device_index
+        self.source = "proc"
+        self._handle = None
+        if pynvml is None:
+            log.warning("pynvml not installed, reading memory from /proc")
+            return
+        try:
+            pynvml.nvmlInit()
+            self._handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+            self.source = "nvml"
+        except Exception as e:
+            log.warning(f"NVML unavailable, reading memory from /proc: {e}")
+
+    def read(self):
+        """
+        Returns:
+            tuple: (used, free, total) memory in bytes.
+        """
+        if self._handle is not None:
+            try:
+                info = pynvml.nvmlDeviceGetMemoryInfo(self._handle)
+                return info.used, info.free, info.total
+            except Exception as e:
+                log.error(f"Error reading GPU memory: {e}")
+                return 0, 0, 0
+        return self._read_proc_meminfo()
+
+    @staticmethod
+    def _read_proc_meminfo():
+        values = {}
+        try:
+            with open("/proc/meminfo") as meminfo:
+                for line in meminfo:
+                    name, value = line.split(":", 1)
+                    values[name] = int(value.split()[0]) * 1024
+        except (OSError, ValueError) as e:
+            log.error(f"Error reading /proc/meminfo: {e}")
+            return 0, 0, 0
+        total = values.get("MemTotal", 0)
+        free = values.get("MemAvailable", values.get("MemFree", 0))
+        return total - free, free, total
+
+    def used_bytes(self):
+        return self.read()[0]
+
+    def free_bytes(self):
+        return self.read()[1]
+
+    @contextlib.contextmanager
+    def track_peak(self, interval=0.005):
+        """
+        Samples the used memory from a background thread while the block
+        runs. Yields a dict whose "peak" is the highest value seen.
+        """
+        result = {"peak": self.used_bytes()}
+        stop = threading.Event()
+
+        def sample():
+            while not stop.is_set():
+                result["peak"] = max(result["peak"], self.used_bytes())
+                time.sleep(interval)
+
+        thread = threading.Thread(target=sample, daemon=True)
+        thread.start()
+        try:
+            yield result
+        finally:
+            stop.set()
+            thread.join()
+            result["peak"] = max(result["peak"], self.used_bytes())
+
+
+_memory_sampler = None
+
+
+def get_memory_sampler():
+    global _memory_sampler
+    if _memory_sampler is None:
+        _memory_sampler = MemorySampler()
+    return _memory_sampler
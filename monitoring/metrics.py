@@ -1,20 +1,19 @@
 # monitoring/metrics.py
 
-import boto3
-import time
 import asyncio
+import collections
+import time
 
-from core.logging import log
-
-try:
-    import pynvml
-except ImportError:
-    pynvml = None
-    log.error("pynvml not installed. GPU metrics will not be available.")
+from core.logging import log, log_stats
+from monitoring.memory import get_memory_sampler
 
 
 class CloudWatchMetrics:
     def __init__(self, namespace='AwaazService'):
+        # Imported here: boto3 takes a while to import and is only needed
+        # once the first metric is published
+        import boto3
+
         self.cloudwatch = boto3.client(
             'cloudwatch',
             region_name='ap-south-1',
@@ -40,19 +39,28 @@ class CloudWatchMetrics:
             log.error(f"Error publishing metric {metric_name}: {e}")
 
     def get_gpu_utilization(self):
-        if pynvml is None:
-            return 0
-        try:
-            pynvml.nvmlInit()
-            handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-            mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-            # Report used GPU memory in Megabytes
-            utilization = mem_info.used / (1024 * 1024)
-            pynvml.nvmlShutdown()
-            return utilization
-        except Exception as e:
-            log.error(f"Error getting GPU utilization: {e}")
-            return 0
+        # Report used GPU memory in Megabytes, None when the sampler reads
+        # the host memory instead (no NVML)
+        sampler = get_memory_sampler()
+        if sampler.source != "nvml":
+            return None
+        return sampler.used_bytes() / (1024 * 1024)
+
+
+class OverflowStats:
+    """
+    Chunks held back or dropped by the buffering strategies because their
+    client pipeline was full, counted on the event loop and published by
+    `publish_metrics_loop`: `chunks` by overflow policy, and the seconds of
+    audio dropped.
+    """
+
+    def __init__(self):
+        self.chunks = collections.Counter()
+        self.dropped_seconds = 0.0
+
+
+overflow_stats = OverflowStats()
 
 
 _metric_publisher = None
@@ -71,6 +79,9 @@ async def publish_metrics_loop(server, interval=60):
     - interval: how often (in seconds) to publish metrics.
     """
     cw = get_metric_publisher()
+    dropped_logs, sampled_out_logs = 0, 0
+    overflowed_chunks = collections.Counter()
+    dropped_audio_seconds = 0.0
     while True:
         # Get GPU utilization (in MB)
         gpu_usage = cw.get_gpu_utilization()
@@ -84,14 +95,49 @@ async def publish_metrics_loop(server, interval=60):
             total_audio_duration += client.total_samples / client.sampling_rate
 
         # Publish each metric
-        cw.publish_metric("GPUUtilizationMB", gpu_usage, unit="Megabytes")
+        if gpu_usage is not None:
+            cw.publish_metric("GPUUtilizationMB", gpu_usage, unit="Megabytes")
         cw.publish_metric("ActiveWebSocketConnections", active_connections,
                           unit="Count")
         cw.publish_metric("AudioDurationProcessed", total_audio_duration,
                           unit="Seconds")
+        pool_size = getattr(server.asr_pipeline, "size", None)
+        if pool_size is not None:
+            cw.publish_metric("ASRPoolSize", pool_size, unit="Count")
+            cw.publish_metric(
+                "ASRPoolInUse", server.asr_pipeline.in_use, unit="Count"
+            )
+
+        cw.publish_metric(
+            "LogRecordsDropped", log_stats.dropped - dropped_logs, unit="Count"
+        )
+        cw.publish_metric(
+            "LogRecordsSampledOut",
+            log_stats.sampled_out - sampled_out_logs,
+            unit="Count",
+        )
+        dropped_logs = log_stats.dropped
+        sampled_out_logs = log_stats.sampled_out
+
+        for policy, chunks in overflow_stats.chunks.items():
+            if chunks > overflowed_chunks[policy]:
+                cw.publish_metric(
+                    "ChunksOverflowed",
+                    chunks - overflowed_chunks[policy],
+                    unit="Count",
+                    dimensions=[{"Name": "Policy", "Value": policy}],
+                )
+        overflowed_chunks = collections.Counter(overflow_stats.chunks)
+        cw.publish_metric(
+            "AudioSecondsDropped",
+            overflow_stats.dropped_seconds - dropped_audio_seconds,
+            unit="Seconds",
+        )
+        dropped_audio_seconds = overflow_stats.dropped_seconds
 
+        gpu_text = f"{gpu_usage:.2f}MB" if gpu_usage is not None else "n/a"
         log.info(
-            f"Published metrics: GPU {gpu_usage:.2f}MB, "
+            f"Published metrics: GPU {gpu_text}, "
             f"active connections {active_connections}, "
             f"audio duration {total_audio_duration:.2f} sec"
         )
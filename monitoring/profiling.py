@@ -0,0 +1,260 @@
+# monitoring/profiling.py
+
+import asyncio
+import collections
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from core.logging import log
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Parts of the server memory growth is attributed to, by source path
+MEMORY_AREAS = (
+    ("src/client.py", "client"),
+    ("src/buffering_strategy/", "buffering_strategy"),
+    ("src/asr/", "asr"),
+    ("src/vad/", "vad"),
+    ("src/", "server"),
+    ("core/", "server"),
+    ("monitoring/", "server"),
+)
+
+
+def frame_name(code):
+    return f"{os.path.relpath(code.co_filename, ROOT)}:{code.co_name}"
+
+
+def sample_stacks(seconds, interval, limit):
+    """
+    Samples the stacks of all the threads but the calling one every
+    `interval` seconds for `seconds`.
+
+    Returns:
+        dict: The number of samples, the functions most often found running
+              and the most frequent stacks (thread name first, then callers
+              before callees).
+    """
+    own_thread = threading.get_ident()
+    thread_names = {}
+    functions = collections.Counter()
+    stacks = collections.Counter()
+    samples = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        samples += 1
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            if thread_id not in thread_names:
+                thread_names = {
+                    thread.ident: thread.name
+                    for thread in threading.enumerate()
+                }
+            functions[frame_name(frame.f_code)] += 1
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return {
+        "samples": samples,
+        "functions": [
+            {"function": name, "samples": count, "fraction": count / samples}
+            for name, count in functions.most_common(limit)
+        ],
+        "stacks": [
+            {"stack": stack, "samples": count}
+            for stack, count in stacks.most_common(limit)
+        ],
+    }
+
+
+def profile_stats(profile, sort, limit):
+    """Returns the `limit` functions of a cProfile capture with most time."""
+    stats = pstats.Stats(profile).stats
+    index = {"cumulative": 3, "total": 2}[sort]
+    rows = sorted(stats.items(), key=lambda item: item[1][index], reverse=True)
+    return {
+        "total_calls": sum(row[1] for row in stats.values()),
+        "functions": [
+            {
+                "function": f"{os.path.relpath(filename, ROOT)}:{line}"
+                f"({name})",
+                "calls": calls,
+                "total_seconds": total_time,
+                "cumulative_seconds": cumulative_time,
+            }
+            for (filename, line, name), (
+                _,
+                calls,
+                total_time,
+                cumulative_time,
+                _,
+            ) in rows[:limit]
+        ],
+    }
+
+
+class Profiler:
+    """
+    Captures a profile of the running server for a number of seconds, in the
+    background.
+
+    Modes:
+        - "sampling": a thread samples the stacks of every thread (the event
+          loop and the executors running the models) every
+          `sample_interval` seconds. Cheap enough for a node under load.
+        - "cprofile": cProfile traces every call made on the event loop's
+          thread. Exact call counts, but slows the loop down noticeably.
+    """
+
+    MODES = ("sampling", "cprofile")
+    SORTS = ("cumulative", "total")
+    MAX_SECONDS = 300
+
+    def __init__(self, sample_interval=0.005):
+        self.sample_interval = sample_interval
+        self.task = None
+        self.capture = None
+        self.result = None
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self, seconds, mode="sampling", sort="cumulative", limit=30):
+        """
+        Starts a capture; its result is then returned by `status`.
+
+        Raises:
+            ValueError: For invalid parameters.
+            RuntimeError: When a capture is already running.
+        """
+        if not 0 < seconds <= self.MAX_SECONDS:
+            raise ValueError(
+                f"seconds must be between 0 and {self.MAX_SECONDS}"
+            )
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {', '.join(self.MODES)}")
+        if sort not in self.SORTS:
+            raise ValueError(f"sort must be one of {', '.join(self.SORTS)}")
+        if self.running:
+            raise RuntimeError("A profile is already being captured")
+        self.capture = {
+            "mode": mode,
+            "seconds": seconds,
+            "started": time.time(),
+        }
+        self.result = None
+        self.task = asyncio.create_task(
+            self._capture(seconds, mode, sort, limit)
+        )
+
+    async def _capture(self, seconds, mode, sort, limit):
+        log.info("Profile started", mode=mode, seconds=seconds)
+        if mode == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+            self.result = await asyncio.to_thread(
+                profile_stats, profile, sort, limit
+            )
+        else:
+            self.result = await asyncio.to_thread(
+                sample_stacks, seconds, self.sample_interval, limit
+            )
+        log.info("Profile captured", mode=mode, seconds=seconds)
+
+    def status(self):
+        if self.capture is None:
+            return {"state": "idle"}
+        if self.running:
+            return {"state": "running", **self.capture}
+        error = self.task.exception() if not self.task.cancelled() else None
+        if self.result is None:
+            return {"state": "failed", **self.capture, "error": repr(error)}
+        return {"state": "done", **self.capture, "result": self.result}
+
+
+def memory_area(traceback):
+    """
+    The part of the server the most recent of `traceback`'s frames in the
+    repository belongs to, "other" when there is none.
+    """
+    for frame in reversed(traceback):
+        path = os.path.relpath(frame.filename, ROOT)
+        for prefix, area in MEMORY_AREAS:
+            if path.startswith(prefix):
+                return area
+    return "other"
+
+
+class MemorySnapshots:
+    """
+    tracemalloc snapshots of the server, each one compared to the previous
+    one so that the memory growth between them is attributed to the clients,
+    the buffering strategies, the ASR and VAD wrappers or the rest of the
+    server (see MEMORY_AREAS). Allocations made by libraries count for the
+    code of the repository that called them, looking up to `nframes`
+    frames.
+
+    Tracing starts with the first snapshot and slows down allocations until
+    `stop` is called.
+    """
+
+    def __init__(self, nframes=16):
+        self.nframes = nframes
+        self.previous = None
+
+    def snapshot(self, limit=20):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self.previous = None
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        previous, self.previous = self.previous, snapshot
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        report = {
+            "state": "tracing",
+            "traced_bytes": current_bytes,
+            "peak_bytes": peak_bytes,
+        }
+        if previous is None:
+            return report
+
+        areas = collections.Counter()
+        stats = snapshot.compare_to(previous, "traceback")
+        for stat in stats:
+            areas[memory_area(stat.traceback)] += stat.size_diff
+        report["areas"] = dict(areas)
+        report["top"] = [
+            {
+                "area": memory_area(stat.traceback),
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "traceback": [
+                    f"{os.path.relpath(frame.filename, ROOT)}:{frame.lineno}"
+                    for frame in reversed(stat.traceback)
+                ][:5],
+            }
+            for stat in stats[:limit]
+        ]
+        return report
+
+    def stop(self):
+        tracemalloc.stop()
+        self.previous = None
+        return {"state": "stopped"}
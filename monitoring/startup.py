@@ -0,0 +1,77 @@
+# monitoring/startup.py
+
+import contextlib
+import threading
+import time
+
+from core.logging import log
+from monitoring.metrics import get_metric_publisher
+
+
+class StartupReport:
+    """
+    Time spent starting the server, broken down into phases such as
+    importing a backend, loading a model and warming it up.
+
+    Phases can run several times (one load per pool instance) and from
+    worker threads: their durations and counts are summed. Models loaded
+    later, when the pool grows or the model is swapped, keep adding to the
+    same phases.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                seconds, count = self.phases.get(name, (0.0, 0))
+                self.phases[name] = (seconds + elapsed, count + 1)
+
+    def publish(self):
+        """
+        Logs the phases and the total startup time, and publishes them as
+        the StartupSeconds metric, with a Phase dimension.
+        """
+        total = time.monotonic() - self.started
+        with self._lock:
+            phases = dict(self.phases)
+        log.info(
+            "Startup time",
+            total_seconds=round(total, 3),
+            **{
+                f"{name}_seconds": round(seconds, 3)
+                for name, (seconds, _) in phases.items()
+            },
+        )
+        cw = get_metric_publisher()
+        for name, (seconds, _) in phases.items():
+            cw.publish_metric(
+                "StartupSeconds",
+                seconds,
+                unit="Seconds",
+                dimensions=[{"Name": "Phase", "Value": name}],
+            )
+        cw.publish_metric(
+            "StartupSeconds",
+            total,
+            unit="Seconds",
+            dimensions=[{"Name": "Phase", "Value": "total"}],
+        )
+
+
+_startup_report = None
+
+
+def get_startup_report():
+    global _startup_report
+    if _startup_report is None:
+        _startup_report = StartupReport()
+    return _startup_report
@@ -0,0 +1,161 @@
+import asyncio
+import hmac
+import json
+import urllib.parse
+from http import HTTPStatus
+
+from core.config import ADMIN_API_KEY
+from core.consts import TRUTH_VALUES
+from core.logging import log
+from monitoring.profiling import MemorySnapshots, Profiler
+
+
+class AdminInterface:
+    """
+    Guarded HTTP routes served on the WebSocket port for operating a running
+    server.
+
+    The routes are answered from the `process_request` hook of the WebSocket
+    server, so they need no extra listener. Every request must carry the
+    `ADMIN_API_KEY` in the `X-Admin-Key` header; when no key is configured
+    the admin routes are disabled and answer 404.
+
+    `/status` is answered without a key: it only holds the load of the
+    server, for the gateway (see src.gateway) and load balancers.
+
+    Routes:
+        /status: Connected sessions, ASR pool size, idle and busy instances,
+                 callers waiting for one, and whether new sessions are
+                 admitted.
+        /admin/model_status: The state of the ASR model pool generations.
+        /admin/swap_model: Starts a hot swap of the ASR model. Query
+                           parameters: `asr_type` and `asr_args` (a JSON
+                           string), both defaulting to the current ones.
+        /admin/profile: Starts profiling the server in the background. Query
+                        parameters: `seconds` (default: 10), `mode`
+                        ("sampling" or "cprofile", see Profiler), `sort`
+                        ("cumulative" or "total", for cprofile) and `limit`
+                        (default: 30).
+        /admin/profile_result: The state of the last profile, with its
+                               statistics once it is done.
+        /admin/memory_snapshot: Takes a tracemalloc snapshot and returns the
+                                memory growth since the previous one, by
+                                area (see MemorySnapshots). The first one
+                                starts tracing, `stop=1` stops it. Query
+                                parameter: `limit` (default: 20).
+    """
+
+    PREFIX = "/admin/"
+    STATUS_PATH = "/status"
+
+    def __init__(self, server, api_key=ADMIN_API_KEY):
+        self.server = server
+        self.api_key = api_key
+        self.profiler = Profiler()
+        self.memory_snapshots = MemorySnapshots()
+        self.routes = {
+            "model_status": self.model_status,
+            "swap_model": self.swap_model,
+            "profile": self.profile,
+            "profile_result": self.profile_result,
+            "memory_snapshot": self.memory_snapshot,
+        }
+
+    async def process_request(self, path, request_headers):
+        """
+        Hook for `websockets.serve`: returns an HTTP response for the admin
+        routes and None for everything else, which lets the WebSocket
+        handshake proceed.
+        """
+        parsed_url = urllib.parse.urlparse(path)
+        if parsed_url.path == self.STATUS_PATH:
+            return self.response(HTTPStatus.OK, self.load_status())
+        if not parsed_url.path.startswith(self.PREFIX):
+            return None
+
+        route_path = parsed_url.path[len(self.PREFIX) :]  # noqa: E203
+        route = self.routes.get(route_path)
+        if route is None or not self.api_key:
+            return self.response(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+        admin_key = request_headers.get("X-Admin-Key", "")
+        if not hmac.compare_digest(admin_key, self.api_key):
+            log.info("Invalid admin key", path=parsed_url.path)
+            return self.response(
+                HTTPStatus.UNAUTHORIZED, {"error": "Invalid admin key"}
+            )
+
+        params = {
+            key: values[0]
+            for key, values in urllib.parse.parse_qs(parsed_url.query).items()
+        }
+        log.info("Admin request", path=parsed_url.path, params=params)
+        try:
+            status, body = await route(params)
+        except ValueError as e:
+            status, body = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        return self.response(status, body)
+
+    @staticmethod
+    def response(status, body):
+        headers = [("Content-Type", "application/json")]
+        return status, headers, json.dumps(body).encode() + b"\n"
+
+    def load_status(self):
+        asr_pipeline = self.server.asr_pipeline
+        admission_controller = self.server.admission_controller
+        return {
+            "sessions": len(self.server.connected_clients),
+            "pool_size": asr_pipeline.size,
+            "idle": asr_pipeline.idle_count,
+            "in_use": asr_pipeline.in_use,
+            "waiting": asr_pipeline.waiting,
+            "accepting": (
+                admission_controller is None
+                or admission_controller.has_capacity()
+            ),
+        }
+
+    async def model_status(self, params):
+        return HTTPStatus.OK, self.server.asr_pipeline.status()
+
+    async def swap_model(self, params):
+        asr_pipeline = self.server.asr_pipeline
+        asr_type = params.get("asr_type", asr_pipeline.asr_type)
+        if "asr_args" in params:
+            try:
+                asr_args = json.loads(params["asr_args"])
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Error parsing asr_args: {e}")
+        else:
+            asr_args = asr_pipeline.model_kwargs
+
+        try:
+            asr_pipeline.start_swap(asr_type, asr_args)
+        except RuntimeError as e:
+            return HTTPStatus.CONFLICT, {"error": str(e)}
+        return HTTPStatus.ACCEPTED, asr_pipeline.status()
+
+    async def profile(self, params):
+        try:
+            self.profiler.start(
+                float(params.get("seconds", 10)),
+                mode=params.get("mode", "sampling"),
+                sort=params.get("sort", "cumulative"),
+                limit=int(params.get("limit", 30)),
+            )
+        except RuntimeError as e:
+            return HTTPStatus.CONFLICT, {"error": str(e)}
+        return HTTPStatus.ACCEPTED, self.profiler.status()
+
+    async def profile_result(self, params):
+        return HTTPStatus.OK, self.profiler.status()
+
+    async def memory_snapshot(self, params):
+        if params.get("stop", "").lower() in TRUTH_VALUES:
+            return HTTPStatus.OK, self.memory_snapshots.stop()
+        # Snapshots of a large heap take a while: off the event loop
+        report = await asyncio.to_thread(
+            self.memory_snapshots.snapshot, int(params.get("limit", 20))
+        )
+        return HTTPStatus.OK, report
@@ -0,0 +1,211 @@
+import asyncio
+import collections
+import time
+
+from core.config import API_KEY_LIMITS
+from core.consts import (
+    CLOSE_CODE_AUDIO_RATE_LIMIT,
+    CLOSE_CODE_OVER_CAPACITY,
+    CLOSE_CODE_SESSION_LIMIT,
+)
+from core.logging import log
+from monitoring.metrics import get_metric_publisher
+
+
+class AdmissionController:
+    """
+    Decides whether a new session can be accepted, so that load is shed at
+    connect time instead of degrading every session already running.
+
+    Capacity: every session streams one second of audio per second and each
+    second of audio costs `rtf` seconds of model time, so the estimated load
+    of N sessions is N * rtf model-seconds per second. The ASR pool provides
+    up to `pool.max_size` model-seconds per second once the autoscaler has
+    grown it, of which `target_utilization` is used. `rtf` is `expected_rtf`
+    when given, otherwise the real-time factor measured by the pool
+    (`default_rtf` until the first measurement). Sessions are not limited by
+    capacity without `limit_capacity`, nor while `rtf` is unknown: without
+    `expected_rtf` or `default_rtf`, until the pool measured a decode.
+
+    Per API key limits: number of concurrent sessions and seconds of audio
+    received per minute, both optional. `API_KEY_LIMITS` overrides them for
+    specific keys.
+
+    Attributes:
+        active_sessions (int): Number of admitted sessions.
+        sessions_per_key (Counter): Admitted sessions for each API key.
+    """
+
+    RATE_WINDOW_SECONDS = 60
+
+    def __init__(
+        self,
+        asr_pipeline,
+        target_utilization=0.8,
+        expected_rtf=None,
+        default_rtf=None,
+        limit_capacity=True,
+        queue_timeout_seconds=0,
+        max_sessions_per_key=None,
+        audio_seconds_per_minute_per_key=None,
+        key_limits=API_KEY_LIMITS,
+    ):
+        self.asr_pipeline = asr_pipeline
+        self.target_utilization = target_utilization
+        self.expected_rtf = expected_rtf
+        self.default_rtf = default_rtf
+        self.limit_capacity = limit_capacity
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.max_sessions_per_key = max_sessions_per_key
+        self.audio_seconds_per_minute_per_key = (
+            audio_seconds_per_minute_per_key
+        )
+        self.key_limits = key_limits or {}
+        self.active_sessions = 0
+        self.sessions_per_key = collections.Counter()
+        self._audio_per_key = collections.defaultdict(collections.deque)
+        self._audio_total_per_key = collections.Counter()
+        self._session_ended = asyncio.Condition()
+
+    @property
+    def rtf(self):
+        if self.expected_rtf is not None:
+            return self.expected_rtf
+        measured = getattr(self.asr_pipeline, "real_time_factor", None)
+        return self.default_rtf if measured is None else measured
+
+    @property
+    def capacity(self):
+        """Model-seconds per second available to the sessions."""
+        max_size = getattr(
+            self.asr_pipeline, "max_size", self.asr_pipeline.size
+        )
+        return max_size * self.target_utilization
+
+    def estimated_load(self, sessions=None):
+        if sessions is None:
+            sessions = self.active_sessions
+        rtf = self.rtf
+        return None if rtf is None else sessions * rtf
+
+    def has_capacity(self):
+        if not self.limit_capacity:
+            return True
+        load = self.estimated_load(self.active_sessions + 1)
+        return load is None or load <= self.capacity
+
+    def _limit(self, api_key, name, default):
+        return self.key_limits.get(api_key, {}).get(name, default)
+
+    async def admit(self, api_key):
+        """
+        Admits a new session for `api_key`, waiting up to
+        `queue_timeout_seconds` for capacity to free up.
+
+        Returns:
+            None if the session is admitted, otherwise the (code, reason) to
+            close the WebSocket with. Admitted sessions must be released with
+            `release`.
+        """
+        max_sessions = self._limit(
+            api_key, "max_sessions", self.max_sessions_per_key
+        )
+
+        def key_at_limit():
+            return (
+                max_sessions is not None
+                and self.sessions_per_key[api_key] >= max_sessions
+            )
+
+        if key_at_limit():
+            return self._reject(
+                CLOSE_CODE_SESSION_LIMIT, "Too many sessions for API key"
+            )
+
+        if not self.has_capacity():
+            if self.queue_timeout_seconds <= 0:
+                return self._reject(
+                    CLOSE_CODE_OVER_CAPACITY, "Server at capacity"
+                )
+            try:
+                async with self._session_ended:
+                    await asyncio.wait_for(
+                        self._session_ended.wait_for(
+                            lambda: self.has_capacity() or key_at_limit()
+                        ),
+                        self.queue_timeout_seconds,
+                    )
+                    # Other sessions of the key may have been admitted
+                    # while this one waited
+                    if key_at_limit():
+                        return self._reject(
+                            CLOSE_CODE_SESSION_LIMIT,
+                            "Too many sessions for API key",
+                        )
+                    self._admit(api_key)
+                    return None
+            except asyncio.TimeoutError:
+                return self._reject(
+                    CLOSE_CODE_OVER_CAPACITY, "Server at capacity"
+                )
+
+        self._admit(api_key)
+        return None
+
+    def _admit(self, api_key):
+        self.active_sessions += 1
+        self.sessions_per_key[api_key] += 1
+
+    async def release(self, api_key):
+        self.active_sessions -= 1
+        self.sessions_per_key[api_key] -= 1
+        if self.sessions_per_key[api_key] <= 0:
+            del self.sessions_per_key[api_key]
+            self._audio_per_key.pop(api_key, None)
+            self._audio_total_per_key.pop(api_key, None)
+        async with self._session_ended:
+            self._session_ended.notify_all()
+
+    def consume_audio(self, api_key, seconds):
+        """
+        Accounts `seconds` of audio received for `api_key`.
+
+        Returns:
+            None if the key is within its rate limit, otherwise the
+            (code, reason) to close the WebSocket with.
+        """
+        limit = self._limit(
+            api_key,
+            "audio_seconds_per_minute",
+            self.audio_seconds_per_minute_per_key,
+        )
+        if limit is None:
+            return None
+
+        now = time.monotonic()
+        window = self._audio_per_key[api_key]
+        window.append((now, seconds))
+        self._audio_total_per_key[api_key] += seconds
+        while window[0][0] < now - self.RATE_WINDOW_SECONDS:
+            self._audio_total_per_key[api_key] -= window.popleft()[1]
+        if self._audio_total_per_key[api_key] > limit:
+            return self._reject(
+                CLOSE_CODE_AUDIO_RATE_LIMIT, "Audio rate limit exceeded"
+            )
+        return None
+
+    def _reject(self, code, reason):
+        log.info(
+            "Session rejected",
+            reason=reason,
+            active_sessions=self.active_sessions,
+            estimated_load=self.estimated_load(),
+            capacity=self.capacity,
+        )
+        get_metric_publisher().publish_metric(
+            "SessionsRejected",
+            1,
+            unit="Count",
+            dimensions=[{"Name": "Reason", "Value": reason}],
+        )
+        return code, reason
@@ -1,13 +1,17 @@
-from .faster_whisper_asr import FasterWhisperASR
-from .whisper_asr import WhisperASR
+from src.registry import BackendRegistry
+
+ASR_BACKENDS = BackendRegistry("ASR", "voicestreamai.asr")
+ASR_BACKENDS.register("whisper", "src.asr.whisper_asr:WhisperASR")
+ASR_BACKENDS.register(
+    "faster_whisper", "src.asr.faster_whisper_asr:FasterWhisperASR"
+)
 
 
 class ASRFactory:
+    @staticmethod
+    def get_asr_class(asr_type):
+        return ASR_BACKENDS.get(asr_type)
+
     @staticmethod
     def create_asr_pipeline(asr_type, **kwargs):
-        if asr_type == "whisper":
-            return WhisperASR(**kwargs)
-        if asr_type == "faster_whisper":
-            return FasterWhisperASR(**kwargs)
-        else:
-            raise ValueError(f"Unknown ASR pipeline type: {asr_type}")
+        return ASR_BACKENDS.create(asr_type, **kwargs)
@@ -1,4 +1,17 @@
 class ASRInterface:
+    # Memory of the weights and of one decode, see ModelFootprint.estimate.
+    # Backends override them with the figures of their default model.
+    WEIGHTS_MEMORY_BYTES = 3.0 * 1024**3
+    WORKER_MEMORY_BYTES = 0.6 * 1024**3
+
+    @classmethod
+    def get_weights_memory_bytes(cls):
+        return cls.WEIGHTS_MEMORY_BYTES
+
+    @classmethod
+    def get_worker_memory_bytes(cls):
+        return cls.WORKER_MEMORY_BYTES
+
     async def transcribe(self, client):
         """
         Transcribe the given audio data.
@@ -7,7 +20,19 @@ class ASRInterface:
                        including the buffer
         :return: The transcription structure, see for example the
                  faster_whisper_asr.py file.
+
+        Pipelines decoding segment by segment may also pass each segment
+        (with "text", "start", "end" and "words") to `client.on_segment`,
+        when the client has one, on the event loop as soon as it is decoded.
         """
         raise NotImplementedError(
             "This method should be implemented by subclasses."
         )
+
+    def warmup(self, audio_seconds=1.0):
+        """
+        Runs a throwaway inference on `audio_seconds` of audio so that the
+        first real request does not pay for lazy initialization. Called from
+        a worker thread right after the model is loaded, and to measure the
+        memory used by a decode; the default implementation does nothing.
+        """
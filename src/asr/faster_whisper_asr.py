@@ -1,5 +1,8 @@
+import asyncio
+import functools
 import os
 
+import numpy as np
 from faster_whisper import WhisperModel
 
 from src.audio_utils import save_audio_to_file
@@ -111,17 +114,74 @@ language_codes = {
 
 
 class FasterWhisperASR(ASRInterface):
+    # Estimates for the default model in FP16, used when the footprint is
+    # not measured (see measure_model_footprint): the weights, and the
+    # activations and CUDA workspace of one concurrent decode.
+    WEIGHTS_MEMORY_BYTES = 3.0 * 1024**3
+    WORKER_MEMORY_BYTES = 0.6 * 1024**3
+
     def __init__(self, **kwargs):
         model_size = kwargs.get("model_size", "openai/whisper-large-v3-turbo")
-        # Run on GPU with FP16
+        # Run on GPU with FP16. With `num_workers` (per device in
+        # `device_index`) the same weights serve that many concurrent
+        # transcriptions, see ASRModelPool's shared model mode.
         self.asr_pipeline = WhisperModel(
-            model_size, device="cuda", compute_type="float16"
+            model_size,
+            device="cuda",
+            compute_type="float16",
+            device_index=kwargs.get("device_index", 0),
+            num_workers=kwargs.get("num_workers", 1),
         )
 
+    def _decode(self, file_path, language, stop_event=None, on_segment=None):
+        segments, info = self.asr_pipeline.transcribe(
+            file_path, word_timestamps=True, language=language
+        )
+        # The transcription will actually run here, one 30 second window at a
+        # time: stop between windows once nobody waits for the result.
+        decoded = []
+        for segment in segments:
+            decoded.append(segment)
+            if on_segment is not None:
+                on_segment(self.segment_result(segment))
+            if stop_event is not None and stop_event.is_set():
+                break
+        return decoded, info
 
     @staticmethod
-    def get_model_memory_bytes():
-        return 3.6 * 1024**3 # 4 GB
+    def word_results(words):
+        return [
+            {
+                "word": w.word,
+                "start": w.start,
+                "end": w.end,
+                "probability": w.probability,
+            }
+            for w in words
+        ]
+
+    @classmethod
+    def segment_result(cls, segment):
+        return {
+            "text": segment.text.strip(),
+            "start": segment.start,
+            "end": segment.end,
+            "words": cls.word_results(segment.words),
+        }
+
+    def warmup(self, audio_seconds=1.0):
+        # Faint noise at 16kHz, decoded like real requests
+        audio = np.random.default_rng(0).normal(
+            0, 0.01, int(16000 * audio_seconds)
+        )
+        segments, _ = self.asr_pipeline.transcribe(
+            audio.astype(np.float32), word_timestamps=True
+        )
+        list(segments)
+
+    @classmethod
+    def get_model_memory_bytes(cls):
+        return cls.WEIGHTS_MEMORY_BYTES + cls.WORKER_MEMORY_BYTES
 
     async def transcribe(self, client):
         file_path = await save_audio_to_file(
@@ -133,12 +193,28 @@ class FasterWhisperASR(ASRInterface):
             if client.config["language"] is None
             else language_codes.get(client.config["language"].lower())
         )
-        segments, info = self.asr_pipeline.transcribe(
-            file_path, word_timestamps=True, language=language
-        )
-
-        segments = list(segments)  # The transcription will actually run here.
-        os.remove(file_path)
+        # Decode in a worker thread so that the event loop keeps serving the
+        # other clients and the other instances of the pool decode in
+        # parallel.
+        loop = asyncio.get_running_loop()
+        # Clients streaming segments get each one as soon as it is decoded,
+        # on the event loop
+        on_segment = getattr(client, "on_segment", None)
+        if on_segment is not None:
+            on_segment = functools.partial(
+                loop.call_soon_threadsafe, on_segment
+            )
+        try:
+            segments, info = await loop.run_in_executor(
+                None,
+                self._decode,
+                file_path,
+                language,
+                getattr(client, "session_closed", None),
+                on_segment,
+            )
+        finally:
+            os.remove(file_path)
 
         flattened_words = [
             word for segment in segments for word in segment.words
@@ -148,14 +224,6 @@ class FasterWhisperASR(ASRInterface):
             "language": info.language,
             "language_probability": info.language_probability,
             "text": " ".join([s.text.strip() for s in segments]),
-            "words": [
-                {
-                    "word": w.word,
-                    "start": w.start,
-                    "end": w.end,
-                    "probability": w.probability,
-                }
-                for w in flattened_words
-            ],
+            "words": self.word_results(flattened_words),
         }
         return to_return
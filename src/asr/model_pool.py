@@ -1,55 +1,738 @@
-import math
 import asyncio
-import pynvml
+import gc
+import math
+import time
 
 from core.logging import log
+from monitoring.memory import get_memory_sampler
+from monitoring.metrics import get_metric_publisher
+from monitoring.startup import get_startup_report
+
 from .asr_factory import ASRFactory
-from .faster_whisper_asr import FasterWhisperASR
+
+# Largest pool computed from the free memory when --pool-max-size is not set
+MAX_POOL_SIZE = 32
 
 
 def get_available_gpu_memory_bytes():
-    try:
-        pynvml.nvmlInit()
-        handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-        mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-        available_memory = mem_info.free
-        pynvml.nvmlShutdown()
-        return available_memory
-    except Exception as e:
-        log.error(f"Error getting available GPU memory: {e}")
-        return 0
+    return get_memory_sampler().free_bytes()
 
 
-def compute_model_pool_size():
-    available_memory = get_available_gpu_memory_bytes()
-    model_memory_bytes = FasterWhisperASR.get_model_memory_bytes()
+def gpu_memory_unreadable():
+    """
+    Whether the models run on a GPU while the memory sampler, without NVML,
+    reads the host memory from /proc instead.
+    """
+    if get_memory_sampler().source == "nvml":
+        return False
+    import torch
+
+    return torch.cuda.is_available()
+
+
+class ModelFootprint:
+    """
+    Memory used by one model: its weights, and the activations and workspace
+    of one decode running on it.
+    """
+
+    # Measured values below this are failed measurements, e.g. memory freed
+    # by another process during the warmup
+    MIN_MEASURED_BYTES = 32 * 1024**2
+
+    def __init__(self, weights_bytes, worker_bytes):
+        self.weights_bytes = weights_bytes
+        self.worker_bytes = worker_bytes
+
+    @property
+    def instance_bytes(self):
+        return self.weights_bytes + self.worker_bytes
+
+    def is_plausible(self):
+        return (
+            min(self.weights_bytes, self.worker_bytes)
+            >= self.MIN_MEASURED_BYTES
+        )
+
+    @classmethod
+    def estimate(cls, asr_type="faster_whisper"):
+        """The built-in estimates of the `asr_type` backend."""
+        asr_class = ASRFactory.get_asr_class(asr_type)
+        return cls(
+            asr_class.get_weights_memory_bytes(),
+            asr_class.get_worker_memory_bytes(),
+        )
+
+
+def measure_model_footprint(asr_type, model_kwargs, audio_seconds=30):
+    """
+    Loads one model instance and decodes `audio_seconds` of audio with it,
+    measuring the memory taken by the weights and the peak memory of the
+    decode. The memory of the whole device is sampled, so other processes
+    allocating at the same time distort the result.
+
+    Returns:
+        tuple: The ModelFootprint, None when it could not be measured, and
+               the loaded, warmed up instance.
+    """
+    sampler = get_memory_sampler()
+    before = sampler.used_bytes()
+    model_instance = ASRFactory.create_asr_pipeline(asr_type, **model_kwargs)
+    loaded = sampler.used_bytes()
+    with get_startup_report().phase("asr_warmup"):
+        with sampler.track_peak() as usage:
+            model_instance.warmup(audio_seconds)
+    footprint = ModelFootprint(
+        max(0, loaded - before), max(0, usage["peak"] - loaded)
+    )
+    log.info(
+        "Measured ASR model memory",
+        asr_type=asr_type,
+        model_kwargs=model_kwargs,
+        audio_seconds=audio_seconds,
+        weights_bytes=footprint.weights_bytes,
+        worker_bytes=footprint.worker_bytes,
+        memory_source=sampler.source,
+    )
+    if gpu_memory_unreadable():
+        log.error(
+            "GPU memory cannot be read without NVML, using the estimated "
+            "ASR model memory"
+        )
+        return None, model_instance
+    if not footprint.is_plausible():
+        log.warning(
+            "Measured ASR model memory is implausibly small, using the "
+            "estimated ASR model memory"
+        )
+        return None, model_instance
+    return footprint, model_instance
+
+
+def compute_model_pool_size(
+    shared_model=False,
+    footprint=None,
+    safety_margin=0.1,
+    max_size=None,
+    asr_type="faster_whisper",
+):
+    """
+    Number of pool slots that fit in the free memory, keeping
+    `safety_margin` of it free, at most `max_size` (MAX_POOL_SIZE by
+    default).
+
+    With a measured `footprint`, the measured instance is expected to still
+    be loaded: it counts as one slot and the free memory is used for the
+    others. Without one, or when it is implausibly small, the built-in
+    estimates of the `asr_type` backend are used. When the memory of the GPU
+    cannot be read, the pool is not sized from the host memory: `max_size`
+    slots are used, or a single one.
+    """
+    if gpu_memory_unreadable():
+        log.error(
+            "GPU memory cannot be read without NVML, not sizing the model "
+            "pool from memory",
+            pool_size=max_size or 1,
+        )
+        return max_size or 1
+    if max_size is None:
+        max_size = MAX_POOL_SIZE
+    if footprint is not None and not footprint.is_plausible():
+        log.warning(
+            "Measured ASR model memory is implausibly small, using the "
+            "estimated ASR model memory",
+            weights_bytes=footprint.weights_bytes,
+            worker_bytes=footprint.worker_bytes,
+        )
+        footprint = None
 
+    available_memory = get_available_gpu_memory_bytes()
     log.info("Available GPU memory", available_memory=available_memory)
+    usable_memory = available_memory * (1 - safety_margin)
+
+    measured = footprint is not None
+    if measured:
+        slot_bytes = (
+            footprint.worker_bytes
+            if shared_model
+            else footprint.instance_bytes
+        )
+        pool_size = 1 + math.floor(usable_memory / slot_bytes)
+    else:
+        footprint = ModelFootprint.estimate(asr_type)
+        if shared_model:
+            # The weights are loaded once, each worker only adds activations
+            pool_size = math.floor(
+                (usable_memory - footprint.weights_bytes)
+                / footprint.worker_bytes
+            )
+        else:
+            pool_size = math.floor(usable_memory / footprint.instance_bytes)
+    final_pool_size = min(max(1, pool_size), max_size)
+    log.info(
+        "Computed model pool size",
+        pool_size=pool_size,
+        final_pool_size=final_pool_size,
+        measured=measured,
+    )
+
+    return final_pool_size
 
-    # available_memory *= 0.9
 
-    pool_size = math.floor(available_memory / model_memory_bytes)
-    log.info("Computed model pool size", pool_size=pool_size, final_pool_size=max(1, pool_size))
+class SharedModelWorker:
+    """
+    A worker slot of the model shared by an `ASRModelPool` in shared model
+    mode. Each slot is a distinct object handed out by the pool, while the
+    transcriptions all run on the same weights.
+    """
 
-    return max(1, pool_size)
+    def __init__(self, model):
+        self.model = model
+
+    async def transcribe(self, client):
+        return await self.model.transcribe(client)
 
 
 class ASRModelPool:
-    def __init__(self, pool_size: int, asr_type: str, model_kwargs: dict):
-        self.pool = asyncio.Queue(maxsize=pool_size)
+    """
+    A pool of ASR model instances shared by all the connected clients.
+
+    The pool starts with `pool_size` instances and can be resized at runtime
+    between `min_size` and `max_size` with `grow` and `shrink`, see
+    `ASRPoolAutoscaler`. When the bounds are omitted the pool has a fixed
+    size.
+
+    With `shared_model`, the instances are worker slots of a single
+    faster-whisper model loaded with one CTranslate2 worker per slot
+    (`max_size` in total, spread over the GPUs of `device_index`): the
+    weights are in memory once and every slot only costs the activations of
+    one decode. The model is loaded with the first slot and freed with the
+    last one.
+
+    `footprint` is the ModelFootprint used to decide whether one more slot
+    fits in memory, the built-in estimates of the backend by default (only
+    looked up when needed). `preloaded_instance`,
+    typically the instance `measure_model_footprint` loaded, is used as the
+    first instance instead of loading a new one (not in shared model mode).
+
+    Attributes:
+        size (int): Number of model instances currently owned by the pool.
+        in_use (int): Number of instances currently acquired by clients.
+        waiting (int): Number of callers currently waiting for an instance.
+        last_saturated (float): `time.monotonic()` of the last moment in which
+                                no instance was idle.
+        real_time_factor (float): Moving average of the decode time per second
+                                  of audio, None until the first decode is
+                                  recorded.
+        queue_wait (float): Moving average of the time spent waiting in
+                            `acquire`, None until the first acquisition.
+    """
+
+    RTF_SMOOTHING = 0.1
+    WAIT_SMOOTHING = 0.1
+
+    def __init__(
+        self,
+        pool_size: int,
+        asr_type: str,
+        model_kwargs: dict,
+        min_size: int = None,
+        max_size: int = None,
+        shared_model: bool = False,
+        footprint: ModelFootprint = None,
+        preloaded_instance=None,
+    ):
+        if shared_model and asr_type != "faster_whisper":
+            raise ValueError(
+                "The shared model mode requires the faster_whisper ASR"
+            )
+        self.asr_type = asr_type
+        self.model_kwargs = model_kwargs
+        self.min_size = pool_size if min_size is None else min_size
+        self.max_size = pool_size if max_size is None else max_size
+        self.pool = asyncio.Queue()
+        self.size = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.last_saturated = time.monotonic()
+        self.real_time_factor = None
+        self.queue_wait = None
+        self.shared_model = shared_model
+        self._footprint = footprint
+        self._shared_instance = None
+        self._preloaded_instance = None if shared_model else preloaded_instance
+        self._wait_time_total = 0.0
+        self._wait_count = 0
         for _ in range(pool_size):
-            model_instance = ASRFactory.create_asr_pipeline(asr_type, **model_kwargs)
-            self.pool.put_nowait(model_instance)
+            self.pool.put_nowait(self._create_instance())
+            self.size += 1
+
+    def _create_instance(self):
+        if self._preloaded_instance is not None:
+            model_instance = self._preloaded_instance
+            self._preloaded_instance = None
+            return model_instance
+
+        if not self.shared_model:
+            model_instance = ASRFactory.create_asr_pipeline(
+                self.asr_type, **self.model_kwargs
+            )
+            with get_startup_report().phase("asr_warmup"):
+                model_instance.warmup()
+            return model_instance
+
+        if self._shared_instance is None:
+            device_index = self.model_kwargs.get("device_index", 0)
+            devices = (
+                len(device_index) if isinstance(device_index, list) else 1
+            )
+            model_kwargs = dict(
+                self.model_kwargs,
+                num_workers=math.ceil(self.max_size / devices),
+            )
+            model_instance = ASRFactory.create_asr_pipeline(
+                self.asr_type, **model_kwargs
+            )
+            with get_startup_report().phase("asr_warmup"):
+                model_instance.warmup()
+            self._shared_instance = model_instance
+        return SharedModelWorker(self._shared_instance)
 
     async def acquire(self):
-        return await self.pool.get()
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            model_instance = await self.pool.get()
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - start
+        self._wait_time_total += wait
+        self._wait_count += 1
+        if self.queue_wait is None:
+            self.queue_wait = wait
+        else:
+            self.queue_wait += self.WAIT_SMOOTHING * (wait - self.queue_wait)
+        self.in_use += 1
+        if self.pool.empty():
+            self.last_saturated = time.monotonic()
+        return model_instance
+
+    def try_acquire(self):
+        """
+        Returns an idle instance without waiting, or None if there is none or
+        other callers are already waiting for one.
+        """
+        if self.waiting > 0 or self.pool.empty():
+            return None
+        model_instance = self.pool.get_nowait()
+        self.in_use += 1
+        if self.pool.empty():
+            self.last_saturated = time.monotonic()
+        return model_instance
 
     def release(self, model_instance):
+        self.in_use -= 1
         self.pool.put_nowait(model_instance)
 
+    @property
+    def idle_count(self):
+        return self.pool.qsize()
+
+    def pop_wait_stats(self):
+        """
+        Returns the mean time spent waiting in `acquire` since the previous
+        call, together with the number of acquisitions it covers, and resets
+        the counters.
+        """
+        count = self._wait_count
+        mean_wait = self._wait_time_total / count if count else 0.0
+        self._wait_time_total = 0.0
+        self._wait_count = 0
+        return mean_wait, count
+
+    def record_decode(self, audio_duration, decode_time):
+        """
+        Records the time an instance took to transcribe `audio_duration`
+        seconds of audio.
+        """
+        if audio_duration <= 0:
+            return
+        rtf = decode_time / audio_duration
+        if self.real_time_factor is None:
+            self.real_time_factor = rtf
+        else:
+            self.real_time_factor += self.RTF_SMOOTHING * (
+                rtf - self.real_time_factor
+            )
+
+    @property
+    def footprint(self):
+        if self._footprint is None:
+            self._footprint = ModelFootprint.estimate(self.asr_type)
+        return self._footprint
+
+    def has_memory_for_instance(self, headroom=0.1):
+        if self.shared_model and self._shared_instance is not None:
+            needed = self.footprint.worker_bytes
+        else:
+            needed = self.footprint.instance_bytes
+        return get_available_gpu_memory_bytes() >= needed * (1 + headroom)
+
+    async def grow(self):
+        """
+        Loads one more model instance, off the event loop, and makes it
+        available to the clients. Returns False if the pool is at `max_size`.
+        """
+        if self.size >= self.max_size:
+            return False
+        loop = asyncio.get_running_loop()
+        model_instance = await loop.run_in_executor(
+            None, self._create_instance
+        )
+        self.size += 1
+        self.pool.put_nowait(model_instance)
+        self._emit_resize(+1)
+        return True
+
+    def shrink(self, force=False):
+        """
+        Retires one idle model instance. Returns False if the pool is at
+        `min_size` (unless `force` is set) or every instance is in use.
+        """
+        if self.size <= self.min_size and not force:
+            return False
+        try:
+            model_instance = self.pool.get_nowait()
+        except asyncio.QueueEmpty:
+            return False
+        self._retire(model_instance)
+        return True
+
+    async def retire_next_released(self):
+        """
+        Waits for an instance to be idle and retires it, regardless of
+        `min_size`. The wait is queued together with the clients' requests.
+        """
+        self.waiting += 1
+        try:
+            model_instance = await self.pool.get()
+        finally:
+            self.waiting -= 1
+        self._retire(model_instance)
+
+    def close(self):
+        """
+        Retires every idle instance. Used to free a pool that no longer
+        serves requests once all of its instances have been released.
+        """
+        while self.shrink(force=True):
+            pass
+
+    def _retire(self, model_instance):
+        self.size -= 1
+        del model_instance
+        if self.size == 0:
+            self._shared_instance = None
+        gc.collect()
+        self._emit_resize(-1)
+
+    def _emit_resize(self, delta):
+        log.info(
+            "ASR model pool resized",
+            delta=delta,
+            pool_size=self.size,
+            min_size=self.min_size,
+            max_size=self.max_size,
+        )
+        cw = get_metric_publisher()
+        cw.publish_metric("ASRPoolSize", self.size, unit="Count")
+        cw.publish_metric("ASRPoolResize", delta, unit="Count")
+
     async def __aenter__(self):
         self._instance = await self.acquire()
         return self._instance
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         self.release(self._instance)
+
+
+class ASRPoolAutoscaler:
+    """
+    Grows and shrinks an `ASRModelPool` according to the observed load.
+
+    A new instance is added when the mean wait in `acquire` stays above
+    `grow_wait_seconds` for `sustain_intervals` consecutive evaluations and
+    the GPU has room for it. An instance is retired once at least one
+    instance has been idle for `idle_cooldown_seconds`. Any two resizes are
+    at least `resize_cooldown_seconds` apart, which together with the two
+    different criteria keeps the pool from oscillating.
+    """
+
+    def __init__(
+        self,
+        pool,
+        grow_wait_seconds=0.5,
+        sustain_intervals=3,
+        idle_cooldown_seconds=600,
+        resize_cooldown_seconds=60,
+        memory_headroom=0.1,
+    ):
+        self.pool = pool
+        self.grow_wait_seconds = grow_wait_seconds
+        self.sustain_intervals = sustain_intervals
+        self.idle_cooldown_seconds = idle_cooldown_seconds
+        self.resize_cooldown_seconds = resize_cooldown_seconds
+        self.memory_headroom = memory_headroom
+        self.high_wait_intervals = 0
+        self.last_resize = time.monotonic()
+
+    async def step(self):
+        """
+        Runs one evaluation and resizes the pool if needed.
+
+        Returns:
+            int: +1 if an instance was added, -1 if one was retired, 0
+                 otherwise.
+        """
+        pool = self.pool
+        if getattr(pool, "swapping", False):
+            # The generation being replaced must not be resized
+            return 0
+        now = time.monotonic()
+        mean_wait, _ = pool.pop_wait_stats()
+        if mean_wait > self.grow_wait_seconds or (
+            pool.waiting > 0 and pool.idle_count == 0
+        ):
+            self.high_wait_intervals += 1
+        else:
+            self.high_wait_intervals = 0
+
+        if now - self.last_resize < self.resize_cooldown_seconds:
+            return 0
+
+        if (
+            self.high_wait_intervals >= self.sustain_intervals
+            and pool.size < pool.max_size
+        ):
+            if not pool.has_memory_for_instance(self.memory_headroom):
+                log.info(
+                    "Not growing ASR model pool: not enough GPU memory",
+                    pool_size=pool.size,
+                )
+                return 0
+            if await pool.grow():
+                self.high_wait_intervals = 0
+                self.last_resize = time.monotonic()
+                return 1
+            return 0
+
+        if (
+            pool.size > pool.min_size
+            and now - pool.last_saturated >= self.idle_cooldown_seconds
+        ):
+            if pool.shrink():
+                self.last_resize = now
+                # The remaining instances must stay idle for a whole new
+                # cool-down before another one is retired.
+                pool.last_saturated = now
+                return -1
+        return 0
+
+    async def run(self, interval=10):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.step()
+            except Exception as e:
+                log.error(f"Error autoscaling ASR model pool: {e}")
+
+
+class ASRPoolManager:
+    """
+    Serves model instances from successive generations of `ASRModelPool` so
+    that the ASR model can be swapped without dropping the connected clients.
+
+    The manager exposes the same `acquire`/`release` interface as the pool.
+    Any other attribute (size, wait statistics, grow/shrink) is read from the
+    current generation.
+
+    `swap` builds the new generation next to the current one, one instance at
+    a time: whenever the free GPU memory minus `memory_headroom` cannot fit
+    one more instance, an instance of the old generation is retired as soon
+    as it is released. New requests move to the new generation once it has at
+    least as many warmed up instances as the old one has left; the old
+    generation then only serves the requests already queued on it, and it is
+    freed as soon as it has no instance in use.
+
+    When the swap fails before the switch, the new generation is freed and
+    the old one regrows the instances it retired. After the switch, the new
+    generation keeps serving with the instances it has; `swap_error` then
+    tells it is smaller than the old one was, see `status`.
+    """
+
+    def __init__(self, pool, memory_headroom=0.1):
+        self.current = pool
+        self.generation = 0
+        self.memory_headroom = memory_headroom
+        self.draining = []
+        self.swap_task = None
+        self.swap_error = None
+        self._owners = {}
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+    @property
+    def swapping(self):
+        return self.swap_task is not None and not self.swap_task.done()
+
+    async def acquire(self):
+        pool = self.current
+        model_instance = await pool.acquire()
+        self._owners[id(model_instance)] = pool
+        return model_instance
+
+    def try_acquire(self):
+        pool = self.current
+        model_instance = pool.try_acquire()
+        if model_instance is not None:
+            self._owners[id(model_instance)] = pool
+        return model_instance
+
+    def release(self, model_instance):
+        pool = self._owners.pop(id(model_instance))
+        pool.release(model_instance)
+        self._free_if_drained(pool)
+
+    def start_swap(self, asr_type, model_kwargs):
+        """
+        Starts `swap` in the background. Raises RuntimeError if a swap is
+        already in progress.
+        """
+        if self.swapping:
+            raise RuntimeError("A model swap is already in progress")
+        self.swap_task = asyncio.create_task(self.swap(asr_type, model_kwargs))
+        self.swap_task.add_done_callback(self._log_swap_result)
+        return self.swap_task
+
+    @staticmethod
+    def _log_swap_result(task):
+        if task.cancelled():
+            log.warning("ASR model swap cancelled")
+        elif task.exception() is not None:
+            log.error(f"Error swapping ASR model: {task.exception()}")
+
+    async def swap(self, asr_type, model_kwargs):
+        old_pool = self.current
+        target_size = old_pool.size
+        retired = 0
+        self.swap_error = None
+        log.info(
+            "Building new ASR model pool generation",
+            generation=self.generation + 1,
+            asr_type=asr_type,
+            model_kwargs=model_kwargs,
+            pool_size=target_size,
+        )
+        new_pool = ASRModelPool(
+            0,
+            asr_type,
+            model_kwargs,
+            min_size=old_pool.min_size,
+            max_size=max(target_size, old_pool.max_size),
+            shared_model=old_pool.shared_model,
+            # The measured footprint only holds for the same model
+            footprint=(
+                old_pool._footprint
+                if (asr_type, model_kwargs)
+                == (old_pool.asr_type, old_pool.model_kwargs)
+                else None
+            ),
+        )
+        try:
+            while new_pool.size < target_size:
+                if not new_pool.has_memory_for_instance(self.memory_headroom):
+                    if old_pool.size == 0:
+                        raise RuntimeError(
+                            "Not enough GPU memory for the new model"
+                        )
+                    if old_pool.size == 1 and self.current is old_pool:
+                        # Retiring the last old instance: new requests must
+                        # wait for the new model rather than for the old one.
+                        log.warning(
+                            "Not enough GPU memory to run both generations: "
+                            "requests will wait while the new model loads"
+                        )
+                        self._switch(new_pool)
+                    await old_pool.retire_next_released()
+                    retired += 1
+                await new_pool.grow()
+                if self.current is old_pool and new_pool.size >= old_pool.size:
+                    self._switch(new_pool)
+            if self.current is old_pool:
+                self._switch(new_pool)
+        except BaseException as e:
+            self.swap_error = {
+                "error": repr(e),
+                "switched": self.current is new_pool,
+                "pool_size": new_pool.size,
+                "target_pool_size": target_size,
+            }
+            if self.current is old_pool:
+                new_pool.close()
+                await self._regrow(old_pool, retired)
+                self.swap_error["pool_size"] = old_pool.size
+            raise
+        finally:
+            self._free_if_drained(old_pool)
+
+    async def _regrow(self, pool, count):
+        """
+        Loads back `count` instances retired from `pool` by a failed swap.
+        """
+        for _ in range(count):
+            try:
+                if not await pool.grow():
+                    break
+            except Exception as e:
+                log.error(f"Error regrowing the ASR model pool: {e}")
+                break
+        log.info(
+            "Restored the ASR model pool after a failed swap",
+            generation=self.generation,
+            pool_size=pool.size,
+        )
+
+    def _switch(self, pool):
+        self.draining.append(self.current)
+        self.current = pool
+        self.generation += 1
+        log.info(
+            "Switched to new ASR model pool generation",
+            generation=self.generation,
+            pool_size=pool.size,
+        )
+        get_metric_publisher().publish_metric(
+            "ASRPoolGeneration", self.generation, unit="Count"
+        )
+
+    def _free_if_drained(self, pool):
+        if pool not in self.draining or pool.in_use > 0 or pool.waiting > 0:
+            return
+        pool.close()
+        self.draining.remove(pool)
+        log.info("Freed drained ASR model pool generation")
+
+    def status(self):
+        return {
+            "generation": self.generation,
+            "swapping": self.swapping,
+            "asr_type": self.current.asr_type,
+            "model_kwargs": self.current.model_kwargs,
+            "pool_size": self.current.size,
+            "shared_model": self.current.shared_model,
+            "in_use": self.current.in_use,
+            "draining_generations": len(self.draining),
+            "draining_in_use": sum(p.in_use for p in self.draining),
+            "swap_error": self.swap_error,
+        }
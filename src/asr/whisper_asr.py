@@ -1,3 +1,4 @@
+import asyncio
 import os
 
 import torch
@@ -9,6 +10,10 @@ from .asr_interface import ASRInterface
 
 
 class WhisperASR(ASRInterface):
+    # whisper-large-v3 in FP32
+    WEIGHTS_MEMORY_BYTES = 6.2 * 1024**3
+    WORKER_MEMORY_BYTES = 1.0 * 1024**3
+
     def __init__(self, **kwargs):
         device = "cuda" if torch.cuda.is_available() else "cpu"
         model_name = kwargs.get("model_name", "openai/whisper-large-v3")
@@ -24,14 +29,20 @@ class WhisperASR(ASRInterface):
         )
 
         if client.config["language"] is not None:
-            to_return = self.asr_pipeline(
-                file_path,
-                generate_kwargs={"language": client.config["language"]},
-            )["text"]
+            kwargs = {
+                "generate_kwargs": {"language": client.config["language"]}
+            }
         else:
-            to_return = self.asr_pipeline(file_path)["text"]
-
-        os.remove(file_path)
+            kwargs = {}
+
+        # Run the pipeline in a worker thread to keep the event loop free
+        loop = asyncio.get_running_loop()
+        try:
+            to_return = await loop.run_in_executor(
+                None, lambda: self.asr_pipeline(file_path, **kwargs)["text"]
+            )
+        finally:
+            os.remove(file_path)
 
         to_return = {
             "language": "UNSUPPORTED_BY_HUGGINGFACE_WHISPER",
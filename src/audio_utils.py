@@ -1,6 +1,11 @@
+import bisect
 import os
 import wave
 
+# Sampling rate of the WAV files written for VAD and ASR, whatever the rate
+# of the client: the timestamps of their results count samples at this rate
+WAV_SAMPLING_RATE = 16000
+
 
 async def save_audio_to_file(
     audio_data, file_name, audio_dir="audio_files", audio_format="wav"
@@ -22,7 +27,101 @@ async def save_audio_to_file(
     with wave.open(file_path, "wb") as wav_file:
         wav_file.setnchannels(1)  # Assuming mono audio
         wav_file.setsampwidth(2)
-        wav_file.setframerate(16000)
+        wav_file.setframerate(WAV_SAMPLING_RATE)
         wav_file.writeframes(audio_data)
 
     return file_path
+
+
+def speech_regions(
+    vad_segments, duration, padding_seconds=0.2, min_gap_seconds=1.0
+):
+    """
+    Pads each VAD segment by `padding_seconds` on both sides, within
+    `duration`, and merges the padded segments separated by less than
+    `min_gap_seconds`, or overlapping ones with a gap of 0.
+
+    :param vad_segments: VAD results, with "start" and "end" in seconds.
+    :param duration: Duration of the audio, in seconds.
+    :return: The merged regions, as [start, end] lists in seconds.
+    """
+    merged = []
+    for segment in vad_segments:
+        start = max(0.0, segment["start"] - padding_seconds)
+        end = min(duration, segment["end"] + padding_seconds)
+        if merged and start - merged[-1][1] < min_gap_seconds:
+            merged[-1][1] = max(merged[-1][1], end)
+        elif end > start:
+            merged.append([start, end])
+    return merged
+
+
+def compact_speech(
+    audio_data,
+    vad_segments,
+    sampling_rate=WAV_SAMPLING_RATE,
+    samples_width=2,
+    padding_seconds=0.2,
+    min_gap_seconds=1.0,
+):
+    """
+    Cuts the audio down to its speech regions.
+
+    Each VAD segment is padded by `padding_seconds` on both sides; regions
+    separated by less than `min_gap_seconds` are kept together with the
+    silence between them, longer gaps are removed (see `speech_regions`).
+
+    :param audio_data: The audio data, as bytes.
+    :param vad_segments: VAD results, with "start" and "end" in seconds.
+    :return: The compacted audio and the regions it is made of, as
+             (compacted start, original start) pairs in seconds, to be given
+             to `restore_timestamps`.
+    """
+    bytes_per_second = sampling_rate * samples_width
+    merged = speech_regions(
+        vad_segments,
+        len(audio_data) / bytes_per_second,
+        padding_seconds=padding_seconds,
+        min_gap_seconds=min_gap_seconds,
+    )
+
+    compacted = bytearray()
+    regions = []
+    for start, end in merged:
+        first_byte = int(start * sampling_rate) * samples_width
+        last_byte = int(end * sampling_rate) * samples_width
+        regions.append((len(compacted) / bytes_per_second, start))
+        compacted += audio_data[first_byte:last_byte]
+    return compacted, regions
+
+
+def restore_timestamps(words, regions):
+    """
+    Maps word timestamps of audio compacted by `compact_speech` back to the
+    timeline of the original audio.
+
+    :param words: Words with "start" and "end" in seconds of compacted audio.
+    :param regions: The regions returned by `compact_speech`.
+    :return: Copies of the words with their original timestamps.
+    """
+    if not regions:
+        return words
+    compacted_starts = [compacted for compacted, _ in regions]
+
+    def original_time(time, index):
+        compacted_start, original_start = regions[max(0, index)]
+        return original_start + time - compacted_start
+
+    restored = []
+    for word in words:
+        start_index = bisect.bisect_right(compacted_starts, word["start"]) - 1
+        # A word ending exactly at a cut belongs to the region before it
+        end_index = bisect.bisect_left(compacted_starts, word["end"]) - 1
+        restored.append(
+            dict(
+                word,
+                start=original_time(word["start"], start_index),
+                end=original_time(word["end"], end_index),
+            )
+        )
+    return restored
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+import wave
+
+from core.logging import log
+from src.audio_utils import speech_regions
+from src.client import Client
+
+
+class BatchTranscriber:
+    """
+    Transcribes recordings offline with the same VAD pipeline and ASR model
+    pool as the server.
+
+    Each file is read in windows of `window_seconds`; VAD splits every window
+    into utterances of at most `max_utterance_seconds`, which are transcribed
+    by all the instances of the pool in parallel. Segments padded by
+    `padding_seconds` are merged where they overlap, so that no audio is
+    transcribed twice, and the speech still going on at the end of a
+    window is carried over to the next one rather than cut mid-word.
+    Results are written as JSON lines as soon as they are ready, with
+    timestamps relative to the start of the file, so they are not
+    necessarily in file order: use "file" and "start" to sort them.
+
+    The models are fed 16 kHz audio (see `save_audio_to_file`), so only mono,
+    16-bit, 16 kHz WAV files are accepted; other files are skipped with an
+    error.
+    """
+
+    SAMPLING_RATE = 16000
+    SAMPLES_WIDTH = 2
+
+    def __init__(
+        self,
+        vad_pipeline,
+        asr_pipeline,
+        output,
+        window_seconds=300,
+        max_utterance_seconds=30,
+        padding_seconds=0.2,
+        language=None,
+        max_pending_utterances=None,
+    ):
+        self.vad_pipeline = vad_pipeline
+        self.asr_pipeline = asr_pipeline
+        self.output = output
+        self.window_seconds = window_seconds
+        self.max_utterance_seconds = max_utterance_seconds
+        self.padding_seconds = padding_seconds
+        self.language = language
+        # Enough queued utterances to keep every instance busy, without
+        # holding whole recordings in memory.
+        self.pending = asyncio.Semaphore(
+            max_pending_utterances or 2 * max(1, asr_pipeline.size)
+        )
+        self.tasks = set()
+        self.utterances = 0
+        self.audio_seconds = 0.0
+
+    @staticmethod
+    def list_audio_files(paths):
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, files in sorted(os.walk(path)):
+                    for file_name in sorted(files):
+                        if file_name.lower().endswith(".wav"):
+                            yield os.path.join(root, file_name)
+            else:
+                yield path
+
+    def make_client(self, audio, language=None):
+        client = Client(
+            f"batch_{uuid.uuid4()}", self.SAMPLING_RATE, self.SAMPLES_WIDTH
+        )
+        client.config["language"] = language
+        client.scratch_buffer = bytearray(audio)
+        return client
+
+    async def run(self, paths):
+        start = time.perf_counter()
+        for file_path in self.list_audio_files(paths):
+            try:
+                await self.transcribe_file(file_path)
+            except (wave.Error, ValueError, OSError) as e:
+                log.error(f"Skipping {file_path}: {e}")
+        await asyncio.gather(*self.tasks)
+        elapsed = time.perf_counter() - start
+        log.info(
+            "Batch transcription done",
+            utterances=self.utterances,
+            audio_seconds=self.audio_seconds,
+            elapsed_seconds=elapsed,
+            speed=self.audio_seconds / elapsed if elapsed > 0 else None,
+        )
+
+    async def transcribe_file(self, file_path):
+        with wave.open(file_path, "rb") as wav_file:
+            if (
+                wav_file.getnchannels() != 1
+                or wav_file.getsampwidth() != self.SAMPLES_WIDTH
+                or wav_file.getframerate() != self.SAMPLING_RATE
+            ):
+                raise ValueError("expected a mono, 16-bit, 16 kHz WAV file")
+
+            log.info("Transcribing file", file=file_path)
+            bytes_per_second = self.SAMPLING_RATE * self.SAMPLES_WIDTH
+            window_frames = int(self.window_seconds * self.SAMPLING_RATE)
+            window_start = 0.0
+            carry = b""
+            while True:
+                audio = wav_file.readframes(window_frames)
+                final = len(audio) < window_frames * self.SAMPLES_WIDTH
+                self.audio_seconds += len(audio) / bytes_per_second
+                audio = carry + audio
+                if not audio:
+                    break
+                carry = await self.transcribe_window(
+                    file_path, audio, window_start, final
+                )
+                window_start += (len(audio) - len(carry)) / bytes_per_second
+                if final:
+                    break
+
+    async def transcribe_window(
+        self, file_path, audio, window_start, final=True
+    ):
+        """
+        Transcribes the speech of a window starting `window_start` seconds
+        into the file.
+
+        Returns:
+            bytes: The end of the window to transcribe with the next one,
+                   from the start of the speech still going on at its end,
+                   unless it is `final`.
+        """
+        bytes_per_second = self.SAMPLING_RATE * self.SAMPLES_WIDTH
+        window_duration = len(audio) / bytes_per_second
+        vad_results = await self.vad_pipeline.detect_activity(
+            self.make_client(audio)
+        )
+        # Overlapping padded segments are merged, so that the audio they
+        # share is only transcribed once
+        regions = speech_regions(
+            vad_results,
+            window_duration,
+            padding_seconds=self.padding_seconds,
+            min_gap_seconds=0.0,
+        )
+        for index, (start, end) in enumerate(regions):
+            open_ended = (
+                not final
+                and index == len(regions) - 1
+                and end >= window_duration
+            )
+            while end - start > 0:
+                if open_ended and end - start <= self.max_utterance_seconds:
+                    # The speech goes on in the next window
+                    return audio[self.byte_offset(start) :]  # noqa: E203
+                utterance_end = min(end, start + self.max_utterance_seconds)
+                first_byte = self.byte_offset(start)
+                last_byte = self.byte_offset(utterance_end)
+                await self.pending.acquire()
+                task = asyncio.create_task(
+                    self.transcribe_utterance(
+                        file_path,
+                        window_start + start,
+                        audio[first_byte:last_byte],
+                    )
+                )
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+                start = utterance_end
+        return b""
+
+    def byte_offset(self, seconds):
+        return int(seconds * self.SAMPLING_RATE) * self.SAMPLES_WIDTH
+
+    async def transcribe_utterance(self, file_path, offset, audio):
+        try:
+            client = self.make_client(audio, self.language)
+            model_instance = await self.asr_pipeline.acquire()
+            try:
+                transcription = await model_instance.transcribe(client)
+            finally:
+                self.asr_pipeline.release(model_instance)
+        except Exception as e:
+            log.error(f"Error transcribing {file_path} at {offset:.2f}s: {e}")
+            return
+        finally:
+            self.pending.release()
+
+        self.utterances += 1
+        duration = len(audio) / (self.SAMPLING_RATE * self.SAMPLES_WIDTH)
+        words = transcription["words"]
+        if isinstance(words, list):
+            words = [
+                dict(w, start=w["start"] + offset, end=w["end"] + offset)
+                for w in words
+            ]
+        result = dict(
+            transcription,
+            file=file_path,
+            start=offset,
+            end=offset + duration,
+            words=words,
+        )
+        self.output.write(json.dumps(result) + "\n")
+        self.output.flush()
+
+
+async def transcribe_files(
+    paths, output_path, vad_pipeline, asr_pipeline, **kwargs
+):
+    """
+    Transcribes the WAV files and directories in `paths`, appending the
+    results to the JSON lines file `output_path`. See BatchTranscriber.
+    """
+    with open(output_path, "a") as output:
+        await BatchTranscriber(
+            vad_pipeline, asr_pipeline, output, **kwargs
+        ).run(paths)
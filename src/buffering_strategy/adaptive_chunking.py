@@ -0,0 +1,140 @@
+import asyncio
+
+from core.logging import log
+from monitoring.metrics import get_metric_publisher
+
+
+class ChunkLengthController:
+    """
+    Adapts the chunk length and offset of SilenceAtEndOfChunk to the load of
+    the ASR model pool.
+
+    Short chunks give the lowest latency but cost more decodes per second of
+    audio; long chunks amortize the fixed cost of a decode. The controller
+    moves a single level between 0 (`min_chunk_length_seconds` and
+    `min_chunk_offset_seconds`) and 1 (the maximums) by `step` at every
+    evaluation:
+        - up, when clients wait for an instance, or when the moving averages
+          of the queue wait or of the real-time factor (decode time per
+          second of audio) are above `max_queue_wait_seconds` and
+          `max_real_time_factor`;
+        - down, when an instance is idle and both averages are below half of
+          their maximum.
+    The band in between keeps the level from oscillating. It starts at 1,
+    until the decodes have been measured.
+
+    Attributes:
+        level (float): Current position between the bounds.
+        chunk_length_seconds (float): Chunk length for the current level.
+        chunk_offset_seconds (float): Chunk offset for the current level.
+    """
+
+    def __init__(
+        self,
+        pool,
+        min_chunk_length_seconds=1.5,
+        max_chunk_length_seconds=8.0,
+        min_chunk_offset_seconds=0.1,
+        max_chunk_offset_seconds=0.5,
+        max_queue_wait_seconds=0.25,
+        max_real_time_factor=0.5,
+        step=0.1,
+    ):
+        if not 0 < min_chunk_length_seconds <= max_chunk_length_seconds:
+            raise ValueError("Invalid chunk length bounds")
+        if not 0 <= min_chunk_offset_seconds <= max_chunk_offset_seconds:
+            raise ValueError("Invalid chunk offset bounds")
+        self.pool = pool
+        self.min_chunk_length_seconds = min_chunk_length_seconds
+        self.max_chunk_length_seconds = max_chunk_length_seconds
+        self.min_chunk_offset_seconds = min_chunk_offset_seconds
+        self.max_chunk_offset_seconds = max_chunk_offset_seconds
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+        self.max_real_time_factor = max_real_time_factor
+        self.step_size = step
+        self.level = 1.0
+
+    @property
+    def chunk_length_seconds(self):
+        return self.min_chunk_length_seconds + self.level * (
+            self.max_chunk_length_seconds - self.min_chunk_length_seconds
+        )
+
+    @property
+    def chunk_offset_seconds(self):
+        return self.min_chunk_offset_seconds + self.level * (
+            self.max_chunk_offset_seconds - self.min_chunk_offset_seconds
+        )
+
+    def step(self):
+        """
+        Runs one evaluation and publishes the chosen values.
+
+        Returns:
+            int: +1 if the chunks were lengthened, -1 if they were shortened,
+                 0 otherwise.
+        """
+        pool = self.pool
+        queue_wait = pool.queue_wait or 0.0
+        real_time_factor = pool.real_time_factor or 0.0
+        if (
+            pool.waiting > 0
+            or queue_wait > self.max_queue_wait_seconds
+            or real_time_factor > self.max_real_time_factor
+        ):
+            direction = 1
+        elif (
+            pool.idle_count > 0
+            and pool.real_time_factor is not None
+            and queue_wait < self.max_queue_wait_seconds / 2
+            and real_time_factor < self.max_real_time_factor / 2
+        ):
+            direction = -1
+        else:
+            direction = 0
+
+        level = min(1.0, max(0.0, self.level + direction * self.step_size))
+        if level == self.level:
+            direction = 0
+        else:
+            self.level = level
+            log.info(
+                "Adapted chunk length",
+                chunk_length_seconds=self.chunk_length_seconds,
+                chunk_offset_seconds=self.chunk_offset_seconds,
+                queue_wait=queue_wait,
+                real_time_factor=real_time_factor,
+            )
+
+        cw = get_metric_publisher()
+        cw.publish_metric(
+            "ChunkLengthSeconds", self.chunk_length_seconds, unit="Seconds"
+        )
+        cw.publish_metric(
+            "ChunkOffsetSeconds", self.chunk_offset_seconds, unit="Seconds"
+        )
+        return direction
+
+    async def run(self, interval=5):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.step()
+            except Exception as e:
+                log.error(f"Error adapting the chunk length: {e}")
+
+
+_chunk_length_controller = None
+
+
+def set_chunk_length_controller(controller):
+    """
+    Makes the strategies with `adaptive_chunking` follow `controller`, or
+    their static settings again if it is None.
+    """
+    global _chunk_length_controller
+    _chunk_length_controller = controller
+
+
+def get_chunk_length_controller():
+    return _chunk_length_controller
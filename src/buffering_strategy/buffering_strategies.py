@@ -1,12 +1,26 @@
 import asyncio
-import json
+import collections
+import functools
 import os
 import time
 
-from core.logging import log
-from monitoring.metrics import get_metric_publisher
+import numpy as np
+
+from core.config import get_bool_from_env, get_int_from_env
+from core.logging import hot_path_log, log
+from monitoring.metrics import get_metric_publisher, overflow_stats
+from src.audio_utils import (
+    WAV_SAMPLING_RATE,
+    compact_speech,
+    restore_timestamps,
+)
+from src.result_encoding import encode_transcription
+
+from .adaptive_chunking import get_chunk_length_controller
 from .buffering_strategy_interface import BufferingStrategyInterface
 
+OVERFLOW_POLICIES = ("coalesce", "block", "drop_oldest")
+
 
 class SilenceAtEndOfChunk(BufferingStrategyInterface):
     """
@@ -17,12 +31,55 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
     the end of each chunk, and initiating the transcription process for the
     chunk.
 
+    Chunks go through a per-client pipeline: VAD runs on them one at a time,
+    in order, and every chunk ending an utterance is transcribed in the
+    background while the next chunks go through VAD. Up to
+    `max_chunks_in_flight` chunks can be queued for VAD or waiting for their
+    transcription to be sent. Transcriptions carry a `sequence_number` and
+    are sent strictly in order.
+
+    When the pipeline is full, `overflow_policy` decides what happens to the
+    new audio:
+        - "coalesce": it stays in the client buffer and goes through VAD
+          with the audio arriving after it, as one larger chunk.
+        - "block": same, and the server stops reading from the WebSocket
+          until a chunk leaves the pipeline (see `wait_for_capacity`).
+        - "drop_oldest": the oldest chunk still waiting for VAD (or, if there
+          is none, the buffered audio) is discarded.
+
     Attributes:
         client (Client): The client instance associated with this buffering
                          strategy.
         chunk_length_seconds (float): Length of each audio chunk in seconds.
         chunk_offset_seconds (float): Offset time in seconds to be considered
                                       for processing audio chunks.
+        adaptive_chunking (bool): Whether the chunk length and offset follow
+                                  the server's ChunkLengthController, when
+                                  one is running, instead of the values
+                                  above.
+        max_chunks_in_flight (int): Size of the per-client pipeline.
+        overflow_policy (str): One of OVERFLOW_POLICIES.
+        overflows (Counter): Number of chunks held back or dropped because
+                             the pipeline was full, per policy action
+                             ("coalesced", "blocked", "dropped"). The
+                             server totals are in
+                             `monitoring.metrics.overflow_stats`.
+        speculative (bool): Whether to start transcribing as soon as VAD sees
+                            speech ending, before the trailing silence of
+                            `chunk_offset_seconds` is confirmed, when an ASR
+                            model is idle.
+        speculative_min_silence_seconds (float): Trailing silence that
+                                                 triggers a speculative
+                                                 transcription.
+        compact_speech (bool): Whether to cut the audio down to its VAD
+                               segments before transcribing it.
+        compact_padding_seconds (float): Audio kept around each segment.
+        compact_min_gap_seconds (float): Shorter silences between segments
+                                         are kept.
+        stream_segments (bool): Whether each segment of an utterance is sent
+                                as soon as the ASR model decoded it, before
+                                the transcription of the whole utterance
+                                (see `send_segments`).
     """
 
     def __init__(self, client, **kwargs):
@@ -33,7 +90,12 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
             client (Client): The client instance associated with this buffering
                              strategy.
             **kwargs: Additional keyword arguments, including
-                      'chunk_length_seconds' and 'chunk_offset_seconds'.
+                      'chunk_length_seconds', 'chunk_offset_seconds',
+                      'adaptive_chunking', 'max_chunks_in_flight',
+                      'overflow_policy', 'speculative',
+                      'speculative_min_silence_seconds', 'compact_speech',
+                      'compact_padding_seconds', 'compact_min_gap_seconds'
+                      and 'stream_segments'.
         """
         self.client = client
 
@@ -50,6 +112,7 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
         if not self.chunk_offset_seconds:
             self.chunk_offset_seconds = kwargs.get("chunk_offset_seconds")
         self.chunk_offset_seconds = float(self.chunk_offset_seconds)
+        self.adaptive_chunking = kwargs.get("adaptive_chunking", True)
 
         self.error_if_not_realtime = os.environ.get("ERROR_IF_NOT_REALTIME")
         if not self.error_if_not_realtime:
@@ -57,7 +120,60 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
                 "error_if_not_realtime", False
             )
 
+        self.max_chunks_in_flight = get_int_from_env(
+            "BUFFERING_MAX_CHUNKS_IN_FLIGHT"
+        ) or int(kwargs.get("max_chunks_in_flight", 2))
+        self.max_chunks_in_flight = max(1, self.max_chunks_in_flight)
+        self.overflow_policy = os.environ.get(
+            "BUFFERING_OVERFLOW_POLICY"
+        ) or kwargs.get("overflow_policy", "coalesce")
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy: {self.overflow_policy}"
+            )
+        self.overflows = collections.Counter()
+        # Whether the client buffer holds a chunk already counted as
+        # coalesced or blocked
+        self.holding_overflow = False
+
+        self.speculative = get_bool_from_env(
+            "BUFFERING_SPECULATIVE"
+        ) or kwargs.get("speculative", False)
+        self.speculative_min_silence_seconds = float(
+            kwargs.get("speculative_min_silence_seconds", 0.0)
+        )
+        # (task, end of its last speech segment) of the running speculative
+        # transcription. VAD times are compared with each other: they are
+        # not in seconds of client audio unless it is sampled at 16 kHz.
+        self.speculation = None
+
+        self.compact_speech = kwargs.get("compact_speech", False)
+        self.compact_padding_seconds = float(
+            kwargs.get("compact_padding_seconds", 0.2)
+        )
+        self.compact_min_gap_seconds = float(
+            kwargs.get("compact_min_gap_seconds", 1.0)
+        )
+        self.stream_segments = get_bool_from_env(
+            "BUFFERING_STREAM_SEGMENTS"
+        ) or kwargs.get("stream_segments", False)
+
+        # Chunks waiting for VAD, and the number of chunks in the pipeline
+        self.pending_chunks = collections.deque()
+        self.chunks_in_flight = 0
+        self.capacity_available = asyncio.Event()
+        self.capacity_available.set()
+        self.next_sequence_number = 0
+        # Task sending the last transcription, awaited by the next one
+        self.last_delivery = None
+        # Audio of the utterances being transcribed
+        self.utterance_bytes = 0
+
+        # Set while the VAD stage is running
         self.processing_flag = False
+        # Tasks working for the client, cancelled by `close`
+        self.tasks = set()
+        self.closed = False
 
     def process_audio(self, websocket, vad_pipeline, asr_pipeline):
         """
@@ -65,126 +181,738 @@ class SilenceAtEndOfChunk(BufferingStrategyInterface):
         asynchronous processing.
 
         This method checks if the length of the audio buffer exceeds the chunk
-        length and, if so, it schedules asynchronous processing of the audio.
+        length and, if so, it queues the audio in the client pipeline and
+        schedules its asynchronous processing.
 
         Args:
             websocket: The WebSocket connection for sending transcriptions.
             vad_pipeline: The voice activity detection pipeline.
             asr_pipeline: The automatic speech recognition pipeline.
         """
+        self.update_chunk_settings()
         chunk_length_in_bytes = (
             self.chunk_length_seconds
             * self.client.sampling_rate
             * self.client.samples_width
         )
-        if len(self.client.buffer) > chunk_length_in_bytes:
-            if self.processing_flag:
-                if self.error_if_not_realtime:
-                    exit(
-                        "Error in realtime processing: tried processing a new "
-                        "chunk while the previous one was still being processed"
-                    )
+        if self.closed or len(self.client.buffer) <= chunk_length_in_bytes:
+            return
+        self.queue_chunk(websocket, vad_pipeline, asr_pipeline)
+
+    def flush(self, websocket, vad_pipeline, asr_pipeline):
+        """
+        Transcribes the audio buffered so far without waiting for the end of
+        a chunk or for trailing silence, e.g. at the end of the stream. The
+        flush is queued even when the pipeline is full.
+        """
+        if self.closed:
+            return
+        self.queue_chunk(
+            websocket, vad_pipeline, asr_pipeline, final=True, force=True
+        )
+
+    def queue_chunk(
+        self, websocket, vad_pipeline, asr_pipeline, final=False, force=False
+    ):
+        """
+        Moves the client buffer to the pipeline, applying the overflow policy
+        when it is full unless `force` is set. The utterance of a `final`
+        chunk is transcribed whatever its trailing silence.
 
-                log.info(
-                    "Dropping incoming audio data: previous chunk is still being processed",
-                    client_id=self.client.client_id
+        Returns:
+            bool: Whether the buffer was queued.
+        """
+        if self.chunks_in_flight >= self.max_chunks_in_flight and not force:
+            if self.error_if_not_realtime:
+                exit(
+                    "Error in realtime processing: tried processing a new "
+                    "chunk while the previous one was still being processed"
                 )
-                self.client.buffer.clear()
-                return
+            if not self.handle_overflow():
+                return False
+        else:
+            self.chunks_in_flight += 1
+            if self.chunks_in_flight >= self.max_chunks_in_flight:
+                self.capacity_available.clear()
 
-            self.client.scratch_buffer += self.client.buffer
-            self.client.buffer.clear()
+        self.pending_chunks.append((bytes(self.client.buffer), final))
+        self.client.buffer.clear()
+        self.holding_overflow = False
+        if not self.processing_flag:
             self.processing_flag = True
             # Schedule the processing in a separate task
-            asyncio.create_task(
-                self.process_audio_async(websocket, vad_pipeline, asr_pipeline)
+            self.create_task(
+                self.process_chunks(websocket, vad_pipeline, asr_pipeline)
             )
+        return True
+
+    def update_chunk_settings(self):
+        """
+        Takes the chunk length and offset chosen by the ChunkLengthController
+        for the next chunk, with `adaptive_chunking`.
+        """
+        controller = get_chunk_length_controller()
+        if self.adaptive_chunking and controller is not None:
+            self.chunk_length_seconds = controller.chunk_length_seconds
+            self.chunk_offset_seconds = controller.chunk_offset_seconds
+
+    def memory_bytes(self):
+        return self.utterance_bytes + sum(
+            len(audio) for audio, _ in self.pending_chunks
+        )
+
+    def has_pending_work(self):
+        return self.chunks_in_flight > 0 or bool(self.pending_chunks)
+
+    def create_task(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def close(self):
+        """
+        Stops the work of a disconnected client: queued chunks are dropped,
+        tasks waiting for VAD or for an ASR model are cancelled, which
+        withdraws them from the pool queue, and decodes already running are
+        abandoned (see `transcribe`).
+        """
+        self.closed = True
+        self.pending_chunks.clear()
+        # A speculation owns its model: it stops with the decode
+        self.speculation = None
+        self.capacity_available.set()
+        if self.tasks:
+            log.info(
+                "Cancelling the work of a disconnected client",
+                client_id=self.client.client_id,
+                tasks=len(self.tasks),
+            )
+            get_metric_publisher().publish_metric(
+                "AbandonedTasks", len(self.tasks), unit="Count"
+            )
+        for task in self.tasks:
+            task.cancel()
+
+    def handle_overflow(self):
+        """
+        Applies the overflow policy to the client buffer when the pipeline is
+        full.
+
+        Returns:
+            bool: Whether the buffer should be queued, in the slot of a
+                  dropped chunk.
+        """
+        if self.overflow_policy != "drop_oldest":
+            # Called for every message while the pipeline is full: the
+            # held-back chunk is only counted once
+            if not self.holding_overflow:
+                self.holding_overflow = True
+                action = (
+                    "coalesced"
+                    if self.overflow_policy == "coalesce"
+                    else "blocked"
+                )
+                self.overflows[action] += 1
+                overflow_stats.chunks[self.overflow_policy] += 1
+            return False
+
+        self.overflows["dropped"] += 1
+        overflow_stats.chunks[self.overflow_policy] += 1
+        if self.pending_chunks:
+            dropped, _ = self.pending_chunks.popleft()
+            queue_buffer = True
+        else:
+            dropped = bytes(self.client.buffer)
+            self.client.buffer.clear()
+            queue_buffer = False
+        dropped_seconds = len(dropped) / (
+            self.client.sampling_rate * self.client.samples_width
+        )
+        overflow_stats.dropped_seconds += dropped_seconds
+        hot_path_log.info(
+            "Dropping audio data: client pipeline is full",
+            client_id=self.client.client_id,
+            dropped_seconds=dropped_seconds,
+        )
+        return queue_buffer
+
+    def finish_chunk(self, websocket, vad_pipeline, asr_pipeline):
+        """
+        Frees the pipeline slot of a chunk and picks up the audio that was
+        held back while the pipeline was full.
+        """
+        self.chunks_in_flight -= 1
+        self.capacity_available.set()
+        self.process_audio(websocket, vad_pipeline, asr_pipeline)
 
-    async def process_audio_async(self, websocket, vad_pipeline, asr_pipeline):
+    async def wait_for_capacity(self):
+        """
+        Waits until the pipeline has room for a new chunk, when the overflow
+        policy is "block".
+        """
+        if self.overflow_policy == "block":
+            await self.capacity_available.wait()
+
+    async def process_chunks(self, websocket, vad_pipeline, asr_pipeline):
+        """
+        Runs the queued chunks through VAD, in order.
+        """
+        try:
+            while self.pending_chunks:
+                audio, final = self.pending_chunks.popleft()
+                self.client.scratch_buffer += audio
+                try:
+                    ended_utterance = await self.process_audio_async(
+                        websocket, vad_pipeline, asr_pipeline, final=final
+                    )
+                except Exception as e:
+                    log.error(f"Error processing audio chunk: {e}")
+                    ended_utterance = False
+                if not ended_utterance:
+                    self.finish_chunk(websocket, vad_pipeline, asr_pipeline)
+        finally:
+            self.processing_flag = False
+
+    async def process_audio_async(
+        self, websocket, vad_pipeline, asr_pipeline, final=False
+    ):
         """
         Asynchronously process audio for activity detection and transcription.
 
-        This method performs heavy processing, including voice activity
-        detection and transcription of the audio data. It sends the
-        transcription results through the WebSocket connection.
+        This method runs voice activity detection on the scratch buffer and,
+        when the utterance has ended, schedules its transcription, which is
+        sent through the WebSocket connection once the transcriptions of the
+        previous utterances have been sent.
 
         Args:
             websocket (Websocket): The WebSocket connection for sending
                                    transcriptions.
             vad_pipeline: The voice activity detection pipeline.
             asr_pipeline: The automatic speech recognition pipeline.
+            final (bool): Whether the utterance ends with the scratch buffer,
+                          whatever its trailing silence.
+
+        Returns:
+            bool: Whether a transcription was scheduled. Its task then frees
+                  the pipeline slot of the chunk.
         """
         start = time.perf_counter()
         vad_results = await vad_pipeline.detect_activity(self.client)
         end = time.perf_counter()
         time_diff = end - start
-        log.info("Time taken for vad", time_diff=time_diff)
+        hot_path_log.info("Time taken for vad", time_diff=time_diff)
 
         if len(vad_results) == 0:
-            log.info("VAD did not detect any speech")
-            self.client.scratch_buffer.clear()
-            self.client.buffer.clear()
-            self.processing_flag = False
-            return
+            hot_path_log.info("VAD did not detect any speech")
+            self.discard_speculation()
+            self.client.clear_scratch_buffer()
+            return False
 
+        buffer_duration = len(self.client.scratch_buffer) / (
+            self.client.sampling_rate * self.client.samples_width
+        )
         last_segment_should_end_before = (
-            len(self.client.scratch_buffer)
-            / (self.client.sampling_rate * self.client.samples_width)
-        ) - self.chunk_offset_seconds
-        if vad_results[-1]["end"] < last_segment_should_end_before:
+            buffer_duration - self.chunk_offset_seconds
+        )
+        speech_end = vad_results[-1]["end"]
+        if self.speculation is not None and speech_end > self.speculation[1]:
+            # The utterance went on after the speculative transcription
+            self.discard_speculation()
 
-            # transcription = await asr_pipeline.transcribe(self.client)
+        if final or speech_end < last_segment_should_end_before:
+            sequence_number = self.next_sequence_number
+            self.next_sequence_number += 1
+            utterance, regions = self.utterance(
+                f"seq{sequence_number}", vad_results
+            )
+            self.utterance_bytes += len(utterance.scratch_buffer)
+            self.last_delivery = self.create_task(
+                self.transcribe_and_send(
+                    websocket,
+                    vad_pipeline,
+                    asr_pipeline,
+                    utterance,
+                    regions,
+                    buffer_duration,
+                    sequence_number,
+                    start,
+                    self.speculation,
+                    self.last_delivery,
+                )
+            )
+            self.speculation = None
+            self.client.clear_scratch_buffer()
+            self.client.increment_file_counter()
+            return True
 
-            model_instance = await asr_pipeline.acquire()
-            try:
-                transcription = await model_instance.transcribe(self.client)
-            finally:
-                asr_pipeline.release(model_instance)
+        if (
+            self.speculative
+            and self.speculation is None
+            and buffer_duration - speech_end
+            > self.speculative_min_silence_seconds
+        ):
+            self.start_speculation(asr_pipeline, vad_results)
+        return False
 
-            if transcription["text"] != "":
-                end = time.perf_counter()
-                time_diff = end - start
-                formatted_processing_time = f"{time_diff:.4f}"
-                audio_duration = len(self.client.scratch_buffer) / (
-                    self.client.sampling_rate * self.client.samples_width
-                )
+    def utterance(self, tag, vad_results):
+        """
+        Returns a snapshot of the client to transcribe the scratch buffer
+        with, holding only its speech regions when `compact_speech` is set,
+        and the regions to restore the word timestamps with.
+        """
+        if not self.compact_speech:
+            return self.client.snapshot(tag), None
+        audio, regions = compact_speech(
+            self.client.scratch_buffer,
+            vad_results,
+            # The VAD timeline, not the client's sampling rate
+            sampling_rate=WAV_SAMPLING_RATE,
+            samples_width=self.client.samples_width,
+            padding_seconds=self.compact_padding_seconds,
+            min_gap_seconds=self.compact_min_gap_seconds,
+        )
+        return self.client.snapshot(tag, audio), regions
 
-                transcription["processing_time"] = formatted_processing_time
-                transcription["audio_duration"] = audio_duration
-                json_transcription = json.dumps(transcription)
-                await websocket.send(json_transcription)
+    async def transcribe_and_send(
+        self,
+        websocket,
+        vad_pipeline,
+        asr_pipeline,
+        utterance,
+        regions,
+        audio_duration,
+        sequence_number,
+        start,
+        speculation,
+        previous_delivery,
+    ):
+        """
+        Transcribes an utterance, using its speculative transcription if any,
+        and sends the result after the one of the previous utterance.
 
-                log.info(
-                    "Time taken processing",
-                    processing_time=formatted_processing_time,
-                    audio_duration=audio_duration
+        With `stream_segments` (and no speculative transcription), the
+        segments decoded by ASR pipelines supporting it are sent while the
+        rest of the utterance is decoded.
+        """
+        segments, segment_sender = None, None
+        try:
+            if self.stream_segments and speculation is None:
+                segments = asyncio.Queue()
+                # Called on the event loop by the ASR pipeline, see
+                # FasterWhisperASR
+                utterance.on_segment = segments.put_nowait
+                segment_sender = self.create_task(
+                    self.send_segments(
+                        websocket,
+                        segments,
+                        regions,
+                        sequence_number,
+                        start,
+                        previous_delivery,
+                    )
+                )
+            try:
+                transcription = await self.speculative_transcription(
+                    speculation
+                )
+                if transcription is None:
+                    transcription = await self.transcribe(
+                        asr_pipeline,
+                        utterance,
+                        regions=regions,
+                        audio_duration=audio_duration,
+                    )
+            except BaseException:
+                if segment_sender is not None:
+                    segment_sender.cancel()
+                raise
+            if segment_sender is not None:
+                segments.put_nowait(None)
+                await segment_sender
+                transcription["final"] = True
+            if previous_delivery is not None:
+                await asyncio.wait([previous_delivery])
+            if transcription["text"] != "":
+                await self.send_transcription(
+                    websocket,
+                    transcription,
+                    audio_duration,
+                    sequence_number,
+                    start,
                 )
+        except Exception as e:
+            log.error(
+                f"Error transcribing utterance {sequence_number}: {e}",
+                client_id=self.client.client_id,
+            )
+        finally:
+            self.utterance_bytes -= len(utterance.scratch_buffer)
+            self.finish_chunk(websocket, vad_pipeline, asr_pipeline)
 
-                cw = get_metric_publisher()
-                cw.publish_metric(
-                    "ChunkProcessingTime",
-                    float(formatted_processing_time),
-                    unit="Seconds",
+    async def send_segments(
+        self,
+        websocket,
+        segments,
+        regions,
+        sequence_number,
+        start,
+        previous_delivery,
+    ):
+        """
+        Sends the segments of an utterance put in the `segments` queue, until
+        None, once the previous utterance is delivered. They carry the
+        `sequence_number` of the utterance, their `segment_index` and
+        `"final": false`; the transcription of the whole utterance follows
+        with `"final": true`.
+        """
+        if previous_delivery is not None:
+            await asyncio.wait([previous_delivery])
+        segment_index = 0
+        while (segment := await segments.get()) is not None:
+            if segment["text"] == "":
+                continue
+            if regions is not None:
+                segment["words"] = restore_timestamps(
+                    segment["words"], regions
                 )
-                cw.publish_metric(
-                    "TranscriptionLength",
-                    len(transcription["text"]),
-                    unit="None",
+                bounds = restore_timestamps([segment], regions)[0]
+                segment["start"], segment["end"] = (
+                    bounds["start"],
+                    bounds["end"],
                 )
-                if audio_duration > 0:
-                    cw.publish_metric(
-                        "TranscriptionSpeed",
-                        len(transcription["text"]) / audio_duration,
-                        unit="None",
-                    )
-                    processing_eff = float(formatted_processing_time) / audio_duration
-                    cw.publish_metric(
-                        "ProcessingEfficiency",
-                        processing_eff,
-                        unit="None",
-                    )
+            segment["processing_time"] = f"{time.perf_counter() - start:.4f}"
+            segment["sequence_number"] = sequence_number
+            segment["segment_index"] = segment_index
+            segment["final"] = False
+            if self.client.channel is not None:
+                segment["channel"] = self.client.channel
+            await websocket.send(
+                encode_transcription(segment, self.client.result_encoding)
+            )
+            segment_index += 1
 
-            self.client.scratch_buffer.clear()
-            self.client.increment_file_counter()
+    async def send_transcription(
+        self, websocket, transcription, audio_duration, sequence_number, start
+    ):
+        end = time.perf_counter()
+        time_diff = end - start
+        formatted_processing_time = f"{time_diff:.4f}"
 
-        self.processing_flag = False
+        transcription["processing_time"] = formatted_processing_time
+        transcription["audio_duration"] = audio_duration
+        transcription["sequence_number"] = sequence_number
+        if self.client.channel is not None:
+            transcription["channel"] = self.client.channel
+        await websocket.send(
+            encode_transcription(transcription, self.client.result_encoding)
+        )
+
+        hot_path_log.info(
+            "Time taken processing",
+            processing_time=formatted_processing_time,
+            audio_duration=audio_duration,
+        )
+
+        cw = get_metric_publisher()
+        cw.publish_metric(
+            "ChunkProcessingTime",
+            float(formatted_processing_time),
+            unit="Seconds",
+        )
+        cw.publish_metric(
+            "TranscriptionLength",
+            len(transcription["text"]),
+            unit="None",
+        )
+        if audio_duration > 0:
+            cw.publish_metric(
+                "TranscriptionSpeed",
+                len(transcription["text"]) / audio_duration,
+                unit="None",
+            )
+            processing_eff = float(formatted_processing_time) / audio_duration
+            cw.publish_metric(
+                "ProcessingEfficiency",
+                processing_eff,
+                unit="None",
+            )
+
+    async def transcribe(
+        self,
+        asr_pipeline,
+        client,
+        model_instance=None,
+        regions=None,
+        audio_duration=None,
+    ):
+        """
+        Transcribes the scratch buffer of `client` with an instance of the
+        ASR model pool, waiting for one unless `model_instance` is given.
+
+        When the scratch buffer was compacted, `regions` maps the word
+        timestamps back to the original audio, whose `audio_duration` is
+        what the decode time is accounted against.
+
+        Decodes run on worker threads and can not be interrupted by
+        cancelling the task: a cancelled decode keeps its model until it
+        returns (early, for ASR pipelines checking `client.session_closed`)
+        and its time is published as wasted.
+        """
+        if audio_duration is None:
+            audio_duration = len(client.scratch_buffer) / (
+                client.sampling_rate * client.samples_width
+            )
+        if model_instance is None:
+            model_instance = await asr_pipeline.acquire()
+        decode_start = time.perf_counter()
+        decode = asyncio.ensure_future(model_instance.transcribe(client))
+        try:
+            transcription = await asyncio.shield(decode)
+        except asyncio.CancelledError:
+            decode.add_done_callback(
+                functools.partial(
+                    self.release_abandoned_decode,
+                    asr_pipeline,
+                    model_instance,
+                    decode_start,
+                )
+            )
+            raise
+        except Exception:
+            asr_pipeline.release(model_instance)
+            raise
+        asr_pipeline.record_decode(
+            audio_duration, time.perf_counter() - decode_start
+        )
+        asr_pipeline.release(model_instance)
+        if regions is not None and isinstance(
+            transcription.get("words"), list
+        ):
+            transcription["words"] = restore_timestamps(
+                transcription["words"], regions
+            )
+        return transcription
+
+    @staticmethod
+    def release_abandoned_decode(
+        asr_pipeline, model_instance, decode_start, decode
+    ):
+        asr_pipeline.release(model_instance)
+        if not decode.cancelled() and decode.exception() is not None:
+            log.error(f"Abandoned decode failed: {decode.exception()}")
+        get_metric_publisher().publish_metric(
+            "WastedDecodeSeconds",
+            time.perf_counter() - decode_start,
+            unit="Seconds",
+        )
+
+    def start_speculation(self, asr_pipeline, vad_results):
+        """
+        Starts transcribing the current scratch buffer in the background if
+        an ASR model is idle, betting that the utterance is over.
+        """
+        model_instance = asr_pipeline.try_acquire()
+        if model_instance is None:
+            return
+        utterance, regions = self.utterance(
+            f"speculative_{self.client.file_counter}", vad_results
+        )
+        audio_duration = len(self.client.scratch_buffer) / (
+            self.client.sampling_rate * self.client.samples_width
+        )
+        task = asyncio.create_task(
+            self.transcribe(
+                asr_pipeline,
+                utterance,
+                model_instance,
+                regions=regions,
+                audio_duration=audio_duration,
+            )
+        )
+        # Retrieve the exception of discarded speculations
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self.speculation = (task, vad_results[-1]["end"])
+
+    def discard_speculation(self):
+        """
+        Forgets the speculative transcription. A decode already running can
+        not be interrupted: it completes on its worker thread, releases its
+        model and its result is dropped.
+        """
+        if self.speculation is None:
+            return
+        self.speculation = None
+        get_metric_publisher().publish_metric(
+            "SpeculativeTranscriptionsDiscarded", 1, unit="Count"
+        )
+
+    async def speculative_transcription(self, speculation):
+        """
+        Returns the result of a speculative transcription once the end of the
+        utterance is confirmed, or None if there is no usable one.
+        """
+        if speculation is None:
+            return None
+        task, _ = speculation
+        try:
+            transcription = await task
+        except Exception as e:
+            log.error(f"Speculative transcription failed: {e}")
+            return None
+        get_metric_publisher().publish_metric(
+            "SpeculativeTranscriptionsUsed", 1, unit="Count"
+        )
+        return transcription
+
+
+class VADEndpointing(SilenceAtEndOfChunk):
+    """
+    A buffering strategy that ends an utterance as soon as it is followed by
+    `min_silence_ms` of silence, instead of waiting for a whole chunk.
+
+    The incoming audio goes through a cheap energy detector, frame by frame:
+    frames louder than `energy_threshold_db` (dBFS) are speech. Once speech
+    was seen, the buffered audio is sent down the pipeline of
+    SilenceAtEndOfChunk (VAD, then ASR) as a final chunk when:
+        - the trailing silence reaches `min_silence_ms`,
+        - the buffer reaches `max_utterance_seconds`,
+        - no audio arrived for `idle_flush_seconds`, e.g. when the client
+          stops streaming during a pause,
+        - the client sends `{"type": "end_of_stream"}` (see `flush`).
+    Leading silence is not kept beyond `pre_roll_ms`.
+
+    Attributes:
+        min_silence_ms (float): Trailing silence ending an utterance.
+        energy_threshold_db (float): Frame energy above which it is speech.
+        frame_ms (float): Length of the frames of the energy detector.
+        idle_flush_seconds (float): Time without audio after which the
+                                    buffered speech is transcribed, 0 to
+                                    disable it.
+        max_utterance_seconds (float): Longer utterances are cut.
+        pre_roll_ms (float): Silence kept before the start of speech.
+    """
+
+    def __init__(self, client, **kwargs):
+        """
+        Initialize the VADEndpointing buffering strategy.
+
+        Args:
+            client (Client): The client instance associated with this buffering
+                             strategy.
+            **kwargs: 'min_silence_ms', 'energy_threshold_db', 'frame_ms',
+                      'idle_flush_seconds', 'max_utterance_seconds' and
+                      'pre_roll_ms', and the keyword arguments of
+                      SilenceAtEndOfChunk except the chunk length and offset.
+        """
+        self.min_silence_ms = float(kwargs.get("min_silence_ms", 500))
+        self.energy_threshold_db = float(
+            kwargs.get("energy_threshold_db", -45)
+        )
+        self.frame_ms = float(kwargs.get("frame_ms", 20))
+        self.idle_flush_seconds = float(kwargs.get("idle_flush_seconds", 1.0))
+        self.max_utterance_seconds = float(
+            kwargs.get("max_utterance_seconds", 15)
+        )
+        self.pre_roll_ms = float(kwargs.get("pre_roll_ms", 300))
+        kwargs.setdefault("chunk_length_seconds", self.max_utterance_seconds)
+        kwargs.setdefault("chunk_offset_seconds", 0)
+        kwargs["adaptive_chunking"] = False
+        super().__init__(client, **kwargs)
+
+        self.frame_bytes = (
+            int(self.frame_ms / 1000 * client.sampling_rate)
+            * client.samples_width
+        )
+        self.idle_timer = None
+        self.reset_detector()
+
+    def reset_detector(self):
+        # Bytes of the client buffer that went through the detector
+        self.analyzed_bytes = 0
+        self.speech_seen = False
+        self.trailing_silence_ms = 0.0
+
+    def process_audio(self, websocket, vad_pipeline, asr_pipeline):
+        """
+        Runs the new audio through the energy detector and queues the
+        utterance once it has ended.
+        """
+        if self.closed:
+            return
+        self.cancel_idle_timer()
+        self.detect_speech()
+        buffer_seconds = len(self.client.buffer) / (
+            self.client.sampling_rate * self.client.samples_width
+        )
+        if self.speech_seen and (
+            self.trailing_silence_ms >= self.min_silence_ms
+            or buffer_seconds >= self.max_utterance_seconds
+        ):
+            self.end_utterance(websocket, vad_pipeline, asr_pipeline)
+        elif self.speech_seen and self.idle_flush_seconds > 0:
+            self.idle_timer = asyncio.get_running_loop().call_later(
+                self.idle_flush_seconds,
+                self.end_utterance,
+                websocket,
+                vad_pipeline,
+                asr_pipeline,
+            )
+
+    def detect_speech(self):
+        buffer = self.client.buffer
+        if self.analyzed_bytes > len(buffer):
+            # The buffer was dropped by the overflow policy
+            self.reset_detector()
+        end = self.analyzed_bytes + (
+            (len(buffer) - self.analyzed_bytes)
+            // self.frame_bytes
+            * self.frame_bytes
+        )
+        if end == self.analyzed_bytes:
+            return
+        frames = np.frombuffer(
+            bytes(buffer[self.analyzed_bytes : end]), dtype=np.int16  # noqa
+        ).reshape(-1, self.frame_bytes // self.client.samples_width)
+        rms = np.sqrt(np.mean((frames / 32768.0) ** 2, axis=1))
+        energies_db = 20 * np.log10(np.maximum(rms, 1e-10))
+        for energy_db in energies_db:
+            if energy_db > self.energy_threshold_db:
+                self.speech_seen = True
+                self.trailing_silence_ms = 0.0
+            else:
+                self.trailing_silence_ms += self.frame_ms
+        self.analyzed_bytes = end
+
+        if not self.speech_seen:
+            pre_roll_bytes = (
+                int(self.pre_roll_ms / self.frame_ms) * self.frame_bytes
+            )
+            excess = self.analyzed_bytes - pre_roll_bytes
+            if excess > 0:
+                del buffer[:excess]
+                self.analyzed_bytes -= excess
+
+    def end_utterance(self, websocket, vad_pipeline, asr_pipeline):
+        self.idle_timer = None
+        if self.closed or not self.speech_seen:
+            return
+        queued = self.queue_chunk(
+            websocket, vad_pipeline, asr_pipeline, final=True
+        )
+        if queued or not self.client.buffer:
+            self.reset_detector()
+
+    def flush(self, websocket, vad_pipeline, asr_pipeline):
+        self.cancel_idle_timer()
+        super().flush(websocket, vad_pipeline, asr_pipeline)
+        self.reset_detector()
+
+    def cancel_idle_timer(self):
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def close(self):
+        self.cancel_idle_timer()
+        super().close()
@@ -1,4 +1,4 @@
-from .buffering_strategies import SilenceAtEndOfChunk
+from .buffering_strategies import SilenceAtEndOfChunk, VADEndpointing
 
 
 class BufferingStrategyFactory:
@@ -26,7 +26,8 @@ class BufferingStrategyFactory:
 
         Args:
             type (str): The type of buffering strategy to create. Currently
-                        supports 'silence_at_end_of_chunk'.
+                        supports 'silence_at_end_of_chunk' and
+                        'vad_endpointing'.
             client (Client): The client instance to be associated with the
                              buffering strategy.
             **kwargs: Additional keyword arguments specific to the buffering
@@ -45,5 +46,7 @@ class BufferingStrategyFactory:
         """
         if type == "silence_at_end_of_chunk":
             return SilenceAtEndOfChunk(client, **kwargs)
+        elif type == "vad_endpointing":
+            return VADEndpointing(client, **kwargs)
         else:
             raise ValueError(f"Unknown buffering strategy type: {type}")
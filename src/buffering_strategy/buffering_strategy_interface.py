@@ -13,6 +13,10 @@ class BufferingStrategyInterface:
     Methods:
         process_audio: Process audio data. This method should be implemented
                        by subclasses.
+        wait_for_capacity: Wait until more audio can be accepted.
+        flush: Transcribe the buffered audio right away.
+        memory_bytes: Audio held by the strategy.
+        close: Stop the work of a disconnected client.
     """
 
     def process_audio(self, websocket, vad_pipeline, asr_pipeline):
@@ -39,3 +43,36 @@ class BufferingStrategyInterface:
         raise NotImplementedError(
             "This method should be implemented by subclasses."
         )
+
+    async def wait_for_capacity(self):
+        """
+        Waits until the strategy can accept more audio. The server does not
+        read from the WebSocket in the meantime, which applies backpressure
+        to the client. Strategies that never block don't override it.
+        """
+
+    def flush(self, websocket, vad_pipeline, asr_pipeline):
+        """
+        Called when the client ends its stream: the strategy should
+        transcribe the audio it buffered instead of waiting for more.
+        """
+
+    def memory_bytes(self):
+        """
+        Returns the bytes of audio the strategy holds besides the client
+        buffers, e.g. queued chunks, for the session memory budget.
+        """
+        return 0
+
+    def has_pending_work(self):
+        """
+        Returns whether audio the client already sent is still queued or
+        being transcribed, so that a session waiting on it is not idle.
+        """
+        return False
+
+    def close(self):
+        """
+        Called when the client disconnects: the strategy must stop the work
+        it scheduled for the client and release its buffers.
+        """
@@ -1,8 +1,15 @@
 # isort: skip_file
 
+import copy
+import threading
+import time
+
+import numpy as np
+
 from src.buffering_strategy.buffering_strategy_factory import (
     BufferingStrategyFactory,
 )
+from src.result_encoding import negotiate_result_encoding
 
 
 class Client:
@@ -23,12 +30,39 @@ class Client:
                              client.
         sampling_rate (int): The sampling rate of the audio data in Hz.
         samples_width (int): The width of each audio sample in bits.
+        api_key (str): The API key the client connected with, if any.
+        result_encoding (dict): How transcriptions are serialized for this
+                                client, see src.result_encoding.
+        vad_state: Streaming state kept by stateful VAD pipelines for the
+                   scratch buffer, reset when it is cleared.
+        session_closed (threading.Event): Set when the client disconnects, so
+                                          that work running on worker
+                                          threads can stop early. Shared
+                                          with the snapshots of the client.
+        channel (int): Index of the channel this client transcribes, for the
+                       channel clients of a multi-channel session; None
+                       otherwise.
+        channel_clients (list): With `"channels": N` (N > 1) in the config,
+                                one client per channel. The interleaved
+                                audio received by this client is split
+                                between them and each runs its own
+                                buffering strategy.
+        last_audio_time (float): `time.monotonic()` of the last audio
+                                 received, or of the connection.
     """
 
-    def __init__(self, client_id, sampling_rate, samples_width):
+    MAX_CHANNELS = 8
+
+    def __init__(self, client_id, sampling_rate, samples_width, api_key=None):
         self.client_id = client_id
+        self.api_key = api_key
         self.buffer = bytearray()
         self.scratch_buffer = bytearray()
+        self.vad_state = None
+        self.session_closed = threading.Event()
+        self.channel = None
+        self.channel_clients = []
+        self.last_audio_time = time.monotonic()
         self.config = {
             "language": None,
             "processing_strategy": "silence_at_end_of_chunk",
@@ -41,38 +75,192 @@ class Client:
         self.total_samples = 0
         self.sampling_rate = sampling_rate
         self.samples_width = samples_width
+        self.result_encoding = negotiate_result_encoding(None)
+        self.buffering_strategy = None
+        self._buffering_strategy_config = None
+        self.update_buffering_strategy()
+
+    def update_buffering_strategy(self):
+        """
+        Creates the buffering strategy of the config, closing the previous
+        one. The strategy is kept when its name and arguments are unchanged.
+        """
+        strategy_config = (
+            self.config["processing_strategy"],
+            copy.deepcopy(self.config["processing_args"]),
+        )
+        if strategy_config == self._buffering_strategy_config:
+            return
+        if self.buffering_strategy is not None:
+            self.buffering_strategy.close()
         self.buffering_strategy = (
             BufferingStrategyFactory.create_buffering_strategy(
-                self.config["processing_strategy"],
-                self,
-                **self.config["processing_args"],
+                strategy_config[0], self, **strategy_config[1]
             )
         )
+        self._buffering_strategy_config = strategy_config
 
     def update_config(self, config_data):
+        """
+        Applies a config message. Raises ValueError, leaving the config
+        unchanged, for an unsupported number of channels.
+        """
+        channels = config_data.get("channels", self.config.get("channels", 1))
+        try:
+            channels = int(channels)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid number of channels: {channels!r}")
+        if not 1 <= channels <= self.MAX_CHANNELS:
+            raise ValueError(f"Unsupported number of channels: {channels}")
+
         self.config.update(config_data)
-        self.buffering_strategy = (
-            BufferingStrategyFactory.create_buffering_strategy(
-                self.config["processing_strategy"],
-                self,
-                **self.config["processing_args"],
-            )
+        self.result_encoding = negotiate_result_encoding(
+            self.config.get("result_encoding")
+        )
+        self.update_buffering_strategy()
+        if channels == 1:
+            channels = 0
+        if channels == len(self.channel_clients):
+            # Same layout: the channels keep their audio and their work
+            for channel_client in self.channel_clients:
+                channel_client.update_config(self.channel_config())
+            return
+        for channel_client in self.channel_clients:
+            channel_client.stop_processing()
+        self.channel_clients = [
+            self.make_channel_client(channel) for channel in range(channels)
+        ]
+
+    def channel_config(self):
+        return {
+            key: value
+            for key, value in self.config.items()
+            if key != "channels"
+        }
+
+    def make_channel_client(self, channel):
+        channel_client = Client(
+            f"{self.client_id}_ch{channel}",
+            self.sampling_rate,
+            self.samples_width,
+            api_key=self.api_key,
         )
+        channel_client.channel = channel
+        channel_client.session_closed = self.session_closed
+        channel_client.update_config(self.channel_config())
+        return channel_client
 
     def append_audio_data(self, audio_data):
+        self.last_audio_time = time.monotonic()
         self.buffer.extend(audio_data)
-        self.total_samples += len(audio_data) / self.samples_width
+        if not self.channel_clients:
+            self.total_samples += len(audio_data) / self.samples_width
+            return
+
+        # Split the complete frames between the channels, a trailing partial
+        # frame waits for the next message.
+        channels = len(self.channel_clients)
+        frame_bytes = channels * self.samples_width
+        usable = len(self.buffer) - len(self.buffer) % frame_bytes
+        frames = np.frombuffer(
+            bytes(self.buffer[:usable]), dtype=f"<i{self.samples_width}"
+        ).reshape(-1, channels)
+        del self.buffer[:usable]
+        self.total_samples += len(frames)
+        for channel, channel_client in enumerate(self.channel_clients):
+            channel_client.append_audio_data(frames[:, channel].tobytes())
+
+    def memory_bytes(self):
+        """
+        Bytes of audio held for this session: its buffers and the audio held
+        by its buffering strategy, for every channel.
+        """
+        return (
+            len(self.buffer)
+            + len(self.scratch_buffer)
+            + self.buffering_strategy.memory_bytes()
+            + sum(c.memory_bytes() for c in self.channel_clients)
+        )
+
+    def has_pending_work(self):
+        """
+        Whether audio of this session, on any channel, is still queued or
+        being transcribed.
+        """
+        return self.buffering_strategy.has_pending_work() or any(
+            c.has_pending_work() for c in self.channel_clients
+        )
 
     def clear_buffer(self):
         self.buffer.clear()
 
+    def clear_scratch_buffer(self):
+        self.scratch_buffer.clear()
+        self.vad_state = None
+
     def increment_file_counter(self):
         self.file_counter += 1
 
     def get_file_name(self):
         return f"{self.client_id}_{self.file_counter}.wav"
 
+    def snapshot(self, tag, audio=None):
+        """
+        Returns a shallow copy of the client holding a copy of the scratch
+        buffer (or `audio`), so that it can be transcribed in the background
+        while this client keeps buffering. `tag` keeps the file names of the
+        copy apart from the ones of this client.
+        """
+        snapshot = copy.copy(self)
+        snapshot.client_id = f"{self.client_id}_{tag}"
+        snapshot.scratch_buffer = bytearray(
+            self.scratch_buffer if audio is None else audio
+        )
+        return snapshot
+
     def process_audio(self, websocket, vad_pipeline, asr_pipeline):
+        if self.channel_clients:
+            # The channels are cut at the same sample, so that their chunks
+            # go through VAD and ASR side by side.
+            for channel_client in self.channel_clients:
+                channel_client.process_audio(
+                    websocket, vad_pipeline, asr_pipeline
+                )
+            return
         self.buffering_strategy.process_audio(
             websocket, vad_pipeline, asr_pipeline
         )
+
+    def flush(self, websocket, vad_pipeline, asr_pipeline):
+        if self.channel_clients:
+            for channel_client in self.channel_clients:
+                channel_client.flush(websocket, vad_pipeline, asr_pipeline)
+            return
+        self.buffering_strategy.flush(websocket, vad_pipeline, asr_pipeline)
+
+    async def wait_for_capacity(self):
+        if self.channel_clients:
+            for channel_client in self.channel_clients:
+                await channel_client.wait_for_capacity()
+            return
+        await self.buffering_strategy.wait_for_capacity()
+
+    def stop_processing(self):
+        """
+        Stops the work of the buffering strategies and releases the buffers,
+        without ending the session, e.g. for channel clients replaced by a
+        config update.
+        """
+        for channel_client in self.channel_clients:
+            channel_client.stop_processing()
+        self.buffering_strategy.close()
+        self.buffer.clear()
+        self.clear_scratch_buffer()
+
+    def close(self):
+        """
+        Stops the processing of the client once it disconnected and
+        releases its buffers.
+        """
+        self.session_closed.set()
+        self.stop_processing()
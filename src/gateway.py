@@ -0,0 +1,257 @@
+import asyncio
+import json
+import ssl
+import urllib
+
+import websockets
+
+from core.consts import CLOSE_CODE_OVER_CAPACITY
+from core.logging import log
+from src.admin import AdminInterface
+
+# Close codes that cannot be sent in a close frame, and the ones sent instead
+RESERVED_CLOSE_CODES = {1005: 1000, 1006: 1011, 1015: 1011}
+
+
+async def fetch_status(uri, timeout=1.0):
+    """
+    Reads the load a backend reports on its `/status` route (see
+    AdminInterface).
+
+    Args:
+        uri (str): WebSocket URI of the backend, e.g. "ws://gpu-1:8765".
+        timeout (float): Seconds to wait for the connection and the response.
+
+    Returns:
+        dict: The status of the backend.
+    """
+    parsed_url = urllib.parse.urlparse(uri)
+    secure = parsed_url.scheme == "wss"
+    port = parsed_url.port or (443 if secure else 80)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(
+            parsed_url.hostname, port, ssl=True if secure else None
+        ),
+        timeout,
+    )
+    try:
+        writer.write(
+            f"GET {AdminInterface.STATUS_PATH} HTTP/1.1\r\n"
+            f"Host: {parsed_url.netloc}\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line = head.split(b"\r\n", 1)[0].split()
+    if len(status_line) < 2 or status_line[1] != b"200":
+        raise ValueError(f"Unexpected status response: {head[:100]!r}")
+    return json.loads(body)
+
+
+class Backend:
+    """
+    A `Server` node sessions are routed to.
+
+    Attributes:
+        uri (str): WebSocket URI of the node, without path.
+        status (dict): The last status reported by the node, None before the
+                       first successful poll.
+        healthy (bool): Whether new sessions are routed to the node.
+        failures (int): Consecutive failed polls or connections.
+        routed (int): Sessions routed to the node since its last poll.
+    """
+
+    def __init__(self, uri):
+        self.uri = uri.rstrip("/")
+        self.status = None
+        self.healthy = True
+        self.failures = 0
+        self.routed = 0
+
+    @property
+    def load(self):
+        """
+        Callers waiting for a model minus the free models, counting every
+        session routed since the last poll as taking a free model.
+        """
+        if self.status is None:
+            return self.routed
+        return self.status["waiting"] - self.status["idle"] + self.routed
+
+    @property
+    def accepting(self):
+        return self.status is None or self.status["accepting"]
+
+    def sort_key(self):
+        sessions = 0 if self.status is None else self.status["sessions"]
+        return (not self.accepting, self.load, sessions + self.routed)
+
+
+class Gateway:
+    """
+    Accepts the client WebSockets and proxies each session to one of several
+    backend `Server` nodes, so that the nodes can be scaled out behind a
+    single address.
+
+    Every `poll_interval` seconds (see `run`) the gateway reads the `/status`
+    of each node. A new session goes to the healthy node with the lowest
+    load: callers waiting for a model minus idle models (see
+    `Backend.load`), preferring the nodes still admitting sessions. A node
+    is marked unhealthy when a connection to it fails, or after
+    `unhealthy_after` consecutive failed polls, and gets sessions again once
+    a poll succeeds. When the connection to the chosen node fails, the next
+    one is tried; when no node is left the client is closed with
+    CLOSE_CODE_OVER_CAPACITY.
+
+    The session's path and query parameters (including the API key) are
+    passed on unchanged, and the close code of either side is passed on to
+    the other one.
+    """
+
+    def __init__(
+        self,
+        backend_uris,
+        host="localhost",
+        port=8765,
+        poll_interval=1.0,
+        unhealthy_after=2,
+        certfile=None,
+        keyfile=None,
+        transport_options=None,
+    ):
+        if not backend_uris:
+            raise ValueError("The gateway needs at least one backend")
+        self.backends = [Backend(uri) for uri in backend_uris]
+        self.host = host
+        self.port = port
+        self.poll_interval = poll_interval
+        self.unhealthy_after = unhealthy_after
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.transport_options = transport_options or {}
+
+    async def poll_backend(self, backend):
+        try:
+            status = await fetch_status(backend.uri, self.poll_interval)
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
+            backend.failures += 1
+            if backend.healthy and backend.failures >= self.unhealthy_after:
+                backend.healthy = False
+                log.warning(
+                    "Backend unhealthy", backend=backend.uri, error=str(e)
+                )
+            return
+        if not backend.healthy:
+            log.info("Backend healthy", backend=backend.uri)
+        backend.status = status
+        backend.healthy = True
+        backend.failures = 0
+        backend.routed = 0
+
+    async def poll(self):
+        await asyncio.gather(
+            *(self.poll_backend(backend) for backend in self.backends)
+        )
+
+    async def run(self, interval=None):
+        interval = interval or self.poll_interval
+        while True:
+            await self.poll()
+            await asyncio.sleep(interval)
+
+    def rank_backends(self):
+        """Returns the healthy backends, least loaded first."""
+        return sorted(
+            (backend for backend in self.backends if backend.healthy),
+            key=Backend.sort_key,
+        )
+
+    async def connect_backend(self, path):
+        for backend in self.rank_backends():
+            try:
+                backend_websocket = await websockets.connect(
+                    backend.uri + path, **self.transport_options
+                )
+            except (
+                OSError,
+                asyncio.TimeoutError,
+                websockets.InvalidHandshake,
+            ) as e:
+                backend.failures += 1
+                backend.healthy = False
+                log.warning(
+                    "Backend connection failed",
+                    backend=backend.uri,
+                    error=str(e),
+                )
+                continue
+            backend.routed += 1
+            return backend, backend_websocket
+        return None, None
+
+    async def handle_websocket(self, websocket):
+        backend, backend_websocket = await self.connect_backend(websocket.path)
+        if backend is None:
+            await websocket.close(
+                code=CLOSE_CODE_OVER_CAPACITY, reason="No backend available"
+            )
+            return
+        log.info("Session routed", backend=backend.uri)
+
+        to_backend = asyncio.create_task(
+            self.forward(websocket, backend_websocket)
+        )
+        to_client = asyncio.create_task(
+            self.forward(backend_websocket, websocket)
+        )
+        try:
+            await asyncio.wait(
+                [to_backend, to_client], return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            to_backend.cancel()
+            to_client.cancel()
+            await asyncio.gather(to_backend, to_client, return_exceptions=True)
+            await backend_websocket.close()
+
+    @staticmethod
+    async def forward(source, destination):
+        """
+        Sends the messages of `source` to `destination` until one of them is
+        closed, then closes the other one with the same code.
+        """
+        try:
+            async for message in source:
+                await destination.send(message)
+        except websockets.ConnectionClosed:
+            pass
+        closed, other = (
+            (source, destination)
+            if source.close_code is not None
+            else (destination, source)
+        )
+        code = closed.close_code or 1000
+        await other.close(
+            RESERVED_CLOSE_CODES.get(code, code), closed.close_reason or ""
+        )
+
+    def start(self):
+        ssl_context = None
+        if self.certfile:
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_context.load_cert_chain(
+                certfile=self.certfile, keyfile=self.keyfile
+            )
+        log.info(
+            f"Gateway ready to accept connections on {self.host}:{self.port}",
+            backends=[backend.uri for backend in self.backends],
+        )
+        return websockets.serve(
+            self.handle_websocket,
+            self.host,
+            self.port,
+            ssl=ssl_context,
+            **self.transport_options,
+        )
@@ -3,8 +3,31 @@ import asyncio
 import json
 
 from core.logging import log
+from monitoring.loop_lag import LoopLagWatchdog
 from monitoring.metrics import publish_metrics_loop
-from src.asr.model_pool import compute_model_pool_size, ASRModelPool
+from monitoring.startup import get_startup_report
+from src.admission import AdmissionController
+from src.asr.model_pool import (
+    ASRModelPool,
+    ASRPoolAutoscaler,
+    ASRPoolManager,
+    compute_model_pool_size,
+    measure_model_footprint,
+)
+from src.batch import transcribe_files
+from src.buffering_strategy.adaptive_chunking import (
+    ChunkLengthController,
+    set_chunk_length_controller,
+)
+from src.gateway import Gateway
+from src.recorder import SessionRecorder
+from src.session_memory import SessionMemoryManager
+from src.transport import (
+    TRANSPORT_PROFILES,
+    get_transport_options,
+    install_event_loop_policy,
+    split_transport_options,
+)
 from src.vad.vad_factory import VADFactory
 
 from .server import Server
@@ -19,7 +42,7 @@ def parse_args():
         "--vad-type",
         type=str,
         default="pyannote",
-        help="Type of VAD pipeline to use (e.g., 'pyannote')",
+        help="Type of VAD pipeline to use (e.g., 'pyannote', 'silero')",
     )
     parser.add_argument(
         "--vad-args",
@@ -74,28 +97,413 @@ def parse_args():
         default=5,
         help="Interval (in seconds) to publish metrics to CloudWatch",
     )
+    parser.add_argument(
+        "--pool-mode",
+        type=str,
+        default="instances",
+        choices=["instances", "shared"],
+        help="'instances' loads one faster-whisper model per pool slot, "
+        "'shared' loads the weights once and serves every slot with a "
+        "CTranslate2 worker of that model",
+    )
+    parser.add_argument(
+        "--pool-measure-seconds",
+        type=float,
+        default=30,
+        help="Length of the warmup decode used to measure the memory of the "
+        "ASR model before sizing the pool; use the longest chunk clients "
+        "send. 0 uses built-in estimates instead",
+    )
+    parser.add_argument(
+        "--pool-memory-margin",
+        type=float,
+        default=0.1,
+        help="Fraction of the free GPU memory left unused when sizing the "
+        "pool",
+    )
+    parser.add_argument(
+        "--pool-min-size",
+        type=int,
+        default=None,
+        help="Minimum number of ASR model instances. Enables the elastic "
+        "pool when lower than --pool-max-size. default: fit to GPU memory",
+    )
+    parser.add_argument(
+        "--pool-max-size",
+        type=int,
+        default=None,
+        help="Maximum number of ASR model instances. default: fit to GPU "
+        "memory, up to 32",
+    )
+    parser.add_argument(
+        "--pool-grow-wait-seconds",
+        type=float,
+        default=0.5,
+        help="Mean wait for a model instance above which the elastic pool "
+        "grows",
+    )
+    parser.add_argument(
+        "--pool-sustain-intervals",
+        type=int,
+        default=3,
+        help="Consecutive evaluations the wait must stay above the threshold "
+        "before the elastic pool grows",
+    )
+    parser.add_argument(
+        "--pool-idle-cooldown-seconds",
+        type=float,
+        default=600,
+        help="Time an instance must be idle before the elastic pool retires "
+        "one",
+    )
+    parser.add_argument(
+        "--pool-resize-cooldown-seconds",
+        type=float,
+        default=60,
+        help="Minimum time between two resizes of the elastic pool",
+    )
+    parser.add_argument(
+        "--pool-scale-interval",
+        type=float,
+        default=10,
+        help="Interval (in seconds) between elastic pool evaluations",
+    )
+    parser.add_argument(
+        "--swap-memory-headroom",
+        type=float,
+        default=0.1,
+        help="Fraction of a model's memory that must stay free when loading "
+        "a new model during a hot swap; old models are retired to make room",
+    )
+    parser.add_argument(
+        "--adaptive-chunking",
+        action="store_true",
+        help="Adapt the chunk length and offset of the sessions to the load "
+        "of the ASR model pool, within the bounds below",
+    )
+    parser.add_argument(
+        "--chunk-length-bounds",
+        type=float,
+        nargs=2,
+        default=[1.5, 8.0],
+        metavar=("MIN", "MAX"),
+        help="Chunk length range (in seconds) of --adaptive-chunking",
+    )
+    parser.add_argument(
+        "--chunk-offset-bounds",
+        type=float,
+        nargs=2,
+        default=[0.1, 0.5],
+        metavar=("MIN", "MAX"),
+        help="Chunk offset range (in seconds) of --adaptive-chunking",
+    )
+    parser.add_argument(
+        "--chunk-max-queue-wait",
+        type=float,
+        default=0.25,
+        help="Mean wait (in seconds) for an ASR model above which "
+        "--adaptive-chunking lengthens the chunks",
+    )
+    parser.add_argument(
+        "--chunk-max-rtf",
+        type=float,
+        default=0.5,
+        help="Mean real-time factor of the decodes above which "
+        "--adaptive-chunking lengthens the chunks",
+    )
+    parser.add_argument(
+        "--admission-control",
+        action="store_true",
+        help="Reject new sessions beyond the estimated throughput of the ASR "
+        "pool, see --admission-target-utilization",
+    )
+    parser.add_argument(
+        "--admission-target-utilization",
+        type=float,
+        default=0.8,
+        help="Fraction of the ASR pool throughput that admitted sessions may "
+        "use; new sessions are rejected beyond it",
+    )
+    parser.add_argument(
+        "--admission-expected-rtf",
+        type=float,
+        default=None,
+        help="Expected model time per second of session audio. default: the "
+        "real-time factor measured by the ASR pool, sessions are not limited "
+        "until the first decode",
+    )
+    parser.add_argument(
+        "--admission-queue-timeout",
+        type=float,
+        default=0,
+        help="Seconds a new session may wait for capacity before being "
+        "rejected. default: reject immediately",
+    )
+    parser.add_argument(
+        "--max-sessions-per-key",
+        type=int,
+        default=None,
+        help="Maximum concurrent sessions per API key. default: unlimited",
+    )
+    parser.add_argument(
+        "--max-audio-seconds-per-minute-per-key",
+        type=float,
+        default=None,
+        help="Maximum seconds of audio per minute per API key. default: "
+        "unlimited",
+    )
+    parser.add_argument(
+        "--transport-profile",
+        type=str,
+        default="default",
+        choices=sorted(TRANSPORT_PROFILES),
+        help="WebSocket transport profile, see src/transport.py",
+    )
+    parser.add_argument(
+        "--transport-args",
+        type=str,
+        default="{}",
+        help="JSON string of options overriding the transport profile, e.g. "
+        '\'{"max_queue": 8, "uvloop": false}\'',
+    )
+    parser.add_argument(
+        "--record-sessions",
+        type=str,
+        default=None,
+        help="Directory in which to record the audio frames and config "
+        "messages of the sessions, for benchmark.replay. Disabled by default",
+    )
+    parser.add_argument(
+        "--record-fraction",
+        type=float,
+        default=1.0,
+        help="Fraction of the sessions recorded with --record-sessions",
+    )
+    parser.add_argument(
+        "--max-session-memory-mb",
+        type=float,
+        default=64,
+        help="Audio a session may hold (buffers, queued chunks and "
+        "utterances being transcribed) before it is closed. 0 disables it",
+    )
+    parser.add_argument(
+        "--max-total-session-memory-mb",
+        type=float,
+        default=0,
+        help="Audio all the sessions together may hold; the largest sessions "
+        "are closed to stay under it. 0 disables it",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=300,
+        help="Seconds without audio after which a session is closed. "
+        "0 disables it",
+    )
+    parser.add_argument(
+        "--session-sweep-interval",
+        type=float,
+        default=10,
+        help="Interval (in seconds) between the idle and total memory checks",
+    )
+    parser.add_argument(
+        "--loop-lag-threshold",
+        type=float,
+        default=0.25,
+        help="Seconds the event loop can be blocked before the stack of the "
+        "blocking code is logged. 0 disables the event loop watchdog",
+    )
+    parser.add_argument(
+        "--loop-lag-interval",
+        type=float,
+        default=0.1,
+        help="Interval (in seconds) between the event loop lag measurements",
+    )
+
+    subparsers = parser.add_subparsers(
+        dest="command",
+        title="commands",
+        description="Without a command the WebSocket server is started",
+    )
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Transcribe WAV files offline with the ASR model pool",
+        description="Splits mono 16-bit 16 kHz WAV files with VAD and "
+        "transcribes the utterances on all the instances of the ASR model "
+        "pool in parallel, writing one JSON line per utterance with "
+        "timestamps relative to the start of its file.",
+    )
+    batch_parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="WAV files or directories containing WAV files",
+    )
+    batch_parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="JSON lines file the results are appended to",
+    )
+    batch_parser.add_argument(
+        "--language",
+        type=str,
+        default=None,
+        help="Language of the recordings. default: detected",
+    )
+    batch_parser.add_argument(
+        "--window-seconds",
+        type=float,
+        default=300,
+        help="Length of the audio read and passed to VAD at once",
+    )
+    batch_parser.add_argument(
+        "--max-utterance-seconds",
+        type=float,
+        default=30,
+        help="Longer speech segments are split",
+    )
+    gateway_parser = subparsers.add_parser(
+        "gateway",
+        help="Route the sessions to several WebSocket servers",
+        description="Accepts the client WebSockets on --host and --port and "
+        "proxies each session to the backend server reporting the least "
+        "load on its /status route. No model is loaded: the VAD and ASR "
+        "options are ignored.",
+    )
+    gateway_parser.add_argument(
+        "--backends",
+        type=lambda value: [uri for uri in value.split(",") if uri],
+        required=True,
+        help="Comma separated WebSocket URIs of the backend servers, e.g. "
+        "ws://gpu-1:8765,ws://gpu-2:8765",
+    )
+    gateway_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Interval (in seconds) between the status polls of the backends",
+    )
+    gateway_parser.add_argument(
+        "--unhealthy-after",
+        type=int,
+        default=2,
+        help="Consecutive failed polls after which no session is routed to a "
+        "backend",
+    )
     return parser.parse_args()
 
 
 def main():
+    startup_report = get_startup_report()
     args = parse_args()
 
     try:
         vad_args = json.loads(args.vad_args)
         asr_args = json.loads(args.asr_args)
+        transport_args = json.loads(args.transport_args)
     except json.JSONDecodeError as e:
         log.info(f"Error parsing JSON arguments: {e}")
         return
 
+    use_uvloop, transport_options = split_transport_options(
+        get_transport_options(args.transport_profile, transport_args)
+    )
+    use_uvloop = install_event_loop_policy(use_uvloop)
+    log.info(
+        "Transport profile",
+        profile=args.transport_profile,
+        uvloop=use_uvloop,
+        options=transport_options,
+    )
+
+    if args.command == "gateway":
+        gateway = Gateway(
+            args.backends,
+            host=args.host,
+            port=args.port,
+            poll_interval=args.poll_interval,
+            unhealthy_after=args.unhealthy_after,
+            certfile=args.certfile,
+            keyfile=args.keyfile,
+            transport_options=transport_options,
+        )
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(gateway.poll())
+        loop.run_until_complete(gateway.start())
+        loop.create_task(gateway.run())
+        log.info("Awaaz gateway is running")
+        loop.run_forever()
+        return
+
     # VAD
     vad_pipeline = VADFactory.create_vad_pipeline(args.vad_type, **vad_args)
 
     # ASR
-    pool_size = compute_model_pool_size()
-    log.info("Initializing ASR model pool", pool_size=pool_size)
-    asr_model_pool = ASRModelPool(pool_size=pool_size, asr_type=args.asr_type, model_kwargs=asr_args)
+    shared_model = args.pool_mode == "shared"
+    footprint, measured_instance = None, None
+    if args.pool_measure_seconds > 0:
+        footprint, measured_instance = measure_model_footprint(
+            args.asr_type, asr_args, audio_seconds=args.pool_measure_seconds
+        )
+    pool_size = compute_model_pool_size(
+        shared_model=shared_model,
+        footprint=footprint,
+        safety_margin=args.pool_memory_margin,
+        max_size=args.pool_max_size,
+        asr_type=args.asr_type,
+    )
+    if shared_model:
+        # Loaded without the workers of the shared model
+        measured_instance = None
+    min_pool_size = args.pool_min_size or pool_size
+    max_pool_size = max(args.pool_max_size or pool_size, min_pool_size)
+    log.info(
+        "Initializing ASR model pool",
+        pool_size=min_pool_size,
+        max_pool_size=max_pool_size,
+        pool_mode=args.pool_mode,
+    )
+    asr_model_pool = ASRPoolManager(
+        ASRModelPool(
+            pool_size=min_pool_size,
+            asr_type=args.asr_type,
+            model_kwargs=asr_args,
+            min_size=min_pool_size,
+            max_size=max_pool_size,
+            shared_model=shared_model,
+            footprint=footprint,
+            preloaded_instance=measured_instance,
+        ),
+        memory_headroom=args.swap_memory_headroom,
+    )
     # asr_pipeline = ASRFactory.create_asr_pipeline(args.asr_type, **asr_args)
 
+    if args.command == "batch":
+        asyncio.run(
+            transcribe_files(
+                args.inputs,
+                args.output,
+                vad_pipeline,
+                asr_model_pool,
+                window_seconds=args.window_seconds,
+                max_utterance_seconds=args.max_utterance_seconds,
+                language=args.language,
+            )
+        )
+        return
+
+    admission_controller = AdmissionController(
+        asr_model_pool,
+        limit_capacity=args.admission_control,
+        target_utilization=args.admission_target_utilization,
+        expected_rtf=args.admission_expected_rtf,
+        queue_timeout_seconds=args.admission_queue_timeout,
+        max_sessions_per_key=args.max_sessions_per_key,
+        audio_seconds_per_minute_per_key=(
+            args.max_audio_seconds_per_minute_per_key
+        ),
+    )
+
     server = Server(
         vad_pipeline,
         asr_model_pool,
@@ -105,14 +513,68 @@ def main():
         samples_width=2,
         certfile=args.certfile,
         keyfile=args.keyfile,
+        admission_controller=admission_controller,
+        transport_options=transport_options,
+        recorder=(
+            SessionRecorder(args.record_sessions, args.record_fraction)
+            if args.record_sessions
+            else None
+        ),
+    )
+
+    server.session_memory = SessionMemoryManager(
+        server,
+        max_session_bytes=(
+            int(args.max_session_memory_mb * 1024**2)
+            if args.max_session_memory_mb > 0
+            else None
+        ),
+        max_total_bytes=(
+            int(args.max_total_session_memory_mb * 1024**2)
+            if args.max_total_session_memory_mb > 0
+            else None
+        ),
+        idle_timeout_seconds=args.idle_timeout or None,
     )
 
     loop = asyncio.get_event_loop()
 
     loop.run_until_complete(server.start())
     loop.create_task(publish_metrics_loop(server, interval=args.cw_interval))
+    if args.loop_lag_threshold > 0:
+        loop_lag_watchdog = LoopLagWatchdog(
+            interval=args.loop_lag_interval,
+            threshold_seconds=args.loop_lag_threshold,
+            publish_interval=args.cw_interval,
+        )
+        loop.create_task(loop_lag_watchdog.run())
+    loop.create_task(
+        server.session_memory.run(interval=args.session_sweep_interval)
+    )
+    if max_pool_size > min_pool_size:
+        autoscaler = ASRPoolAutoscaler(
+            asr_model_pool,
+            grow_wait_seconds=args.pool_grow_wait_seconds,
+            sustain_intervals=args.pool_sustain_intervals,
+            idle_cooldown_seconds=args.pool_idle_cooldown_seconds,
+            resize_cooldown_seconds=args.pool_resize_cooldown_seconds,
+        )
+        loop.create_task(autoscaler.run(interval=args.pool_scale_interval))
+    if args.adaptive_chunking:
+        chunk_length_controller = ChunkLengthController(
+            asr_model_pool,
+            min_chunk_length_seconds=args.chunk_length_bounds[0],
+            max_chunk_length_seconds=args.chunk_length_bounds[1],
+            min_chunk_offset_seconds=args.chunk_offset_bounds[0],
+            max_chunk_offset_seconds=args.chunk_offset_bounds[1],
+            max_queue_wait_seconds=args.chunk_max_queue_wait,
+            max_real_time_factor=args.chunk_max_rtf,
+        )
+        set_chunk_length_controller(chunk_length_controller)
+        loop.create_task(chunk_length_controller.run())
 
     log.info("Awaaz service is running")
+    startup_report.publish()
     asyncio.get_event_loop().run_forever()
 
 
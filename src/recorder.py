@@ -0,0 +1,186 @@
+import gzip
+import json
+import os
+import queue
+import random
+import struct
+import threading
+import time
+import uuid
+
+from core.logging import log
+from monitoring.metrics import get_metric_publisher
+
+# Record kinds
+SESSION_OPEN = 0
+CONFIG = 1
+AUDIO = 2
+SESSION_CLOSE = 3
+
+# kind, session id, arrival time (time.time()), payload length
+RECORD_HEADER = struct.Struct("<B16sdI")
+
+
+class SessionRecorder:
+    """
+    Records the traffic of the sessions, to replay it later against a server
+    (see benchmark.replay).
+
+    Every audio frame and config message is recorded with its arrival time.
+    The server only queues the records: a writer thread appends them to a
+    gzip archive, `sessions-<start time>-<pid>.rec.gz` in `directory`. When
+    the queue is full, records are dropped and counted rather than slowing
+    the server down; the writer publishes the count as the
+    RecorderDroppedRecords metric every `METRICS_INTERVAL_SECONDS`.
+
+    Records are a RECORD_HEADER followed by the payload: JSON with the audio
+    format for SESSION_OPEN, the message text for CONFIG, the raw frame for
+    AUDIO and nothing for SESSION_CLOSE.
+
+    Attributes:
+        path (str): The archive being written.
+        fraction (float): Fraction of the sessions that are recorded.
+        dropped_records (int): Records dropped because the queue was full.
+    """
+
+    FLUSH_INTERVAL_SECONDS = 1.0
+    METRICS_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, directory, fraction=1.0, max_queued_records=10000):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(
+            directory,
+            f"sessions-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+            ".rec.gz",
+        )
+        self.fraction = fraction
+        self.dropped_records = 0
+        self._published_dropped_records = 0
+        self.sessions = {}
+        self._queue = queue.Queue(max_queued_records)
+        self._writer = threading.Thread(
+            target=self._write_records, name="session-recorder", daemon=True
+        )
+        self._writer.start()
+        log.info("Recording sessions", path=self.path, fraction=fraction)
+
+    def open_session(self, session_id, sampling_rate, samples_width):
+        """
+        Starts recording a session, if it is part of the sampled fraction.
+        """
+        if random.random() >= self.fraction:
+            return
+        self.sessions[session_id] = uuid.UUID(session_id).bytes
+        self._record(
+            session_id,
+            SESSION_OPEN,
+            json.dumps(
+                {
+                    "sampling_rate": sampling_rate,
+                    "samples_width": samples_width,
+                }
+            ).encode(),
+        )
+
+    def record_message(self, session_id, message):
+        if session_id not in self.sessions:
+            return
+        if isinstance(message, bytes):
+            self._record(session_id, AUDIO, message)
+        else:
+            self._record(session_id, CONFIG, message.encode())
+
+    def close_session(self, session_id):
+        if session_id not in self.sessions:
+            return
+        self._record(session_id, SESSION_CLOSE, b"")
+        del self.sessions[session_id]
+
+    def close(self):
+        """
+        Writes the queued records and closes the archive.
+        """
+        self._queue.put(None)
+        self._writer.join()
+
+    def _record(self, session_id, kind, payload):
+        try:
+            self._queue.put_nowait(
+                (kind, self.sessions[session_id], time.time(), payload)
+            )
+        except queue.Full:
+            self.dropped_records += 1
+
+    def publish_dropped_records(self):
+        """
+        Publishes the records dropped since the last call, if any. Called
+        from the writer thread, off the event loop.
+        """
+        dropped_records = self.dropped_records
+        delta = dropped_records - self._published_dropped_records
+        if delta <= 0:
+            return
+        self._published_dropped_records = dropped_records
+        get_metric_publisher().publish_metric(
+            "RecorderDroppedRecords", delta, unit="Count"
+        )
+
+    def _write_records(self):
+        last_flush = last_publish = time.monotonic()
+        with gzip.open(self.path, "ab") as archive:
+            while True:
+                try:
+                    record = self._queue.get(
+                        timeout=self.FLUSH_INTERVAL_SECONDS
+                    )
+                except queue.Empty:
+                    record = False
+                if record is None:
+                    self.publish_dropped_records()
+                    return
+                if record:
+                    kind, session_bytes, arrival_time, payload = record
+                    archive.write(
+                        RECORD_HEADER.pack(
+                            kind, session_bytes, arrival_time, len(payload)
+                        )
+                    )
+                    archive.write(payload)
+                # Make the records readable while the server runs, without
+                # flushing the compressor for every frame.
+                now = time.monotonic()
+                if (
+                    self._queue.empty()
+                    and now - last_flush >= self.FLUSH_INTERVAL_SECONDS
+                ):
+                    archive.flush()
+                    last_flush = now
+                if now - last_publish >= self.METRICS_INTERVAL_SECONDS:
+                    self.publish_dropped_records()
+                    last_publish = now
+
+
+def read_records(path):
+    """
+    Reads an archive written by SessionRecorder. A truncated last record,
+    from a server that did not shut down cleanly, is ignored.
+
+    Yields:
+        tuple: (kind, session id, arrival time, payload)
+    """
+    with gzip.open(path, "rb") as archive:
+        while True:
+            try:
+                header = archive.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                kind, session_bytes, arrival_time, length = (
+                    RECORD_HEADER.unpack(header)
+                )
+                payload = archive.read(length)
+            except EOFError:
+                return
+            if len(payload) < length:
+                return
+            session_id = str(uuid.UUID(bytes=session_bytes))
+            yield kind, session_id, arrival_time, payload
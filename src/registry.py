@@ -0,0 +1,85 @@
+import importlib
+from importlib.metadata import entry_points
+
+from core.logging import log
+from monitoring.startup import get_startup_report
+
+
+class BackendRegistry:
+    """
+    Named backends (ASR or VAD pipelines), imported on first use so that
+    the server only pays for the heavy imports (torch, transformers,
+    pyannote, ...) of the backends it actually runs.
+
+    Backends are registered as "module:attribute" strings, or as the class
+    itself. Third-party packages can add backends through the
+    `entry_point_group` entry points, e.g. in their pyproject.toml:
+
+        [project.entry-points."voicestreamai.asr"]
+        my_asr = "my_package.asr:MyASR"
+
+    Built-in names take precedence over entry points. Imports are timed in
+    the startup report, as "<kind>_import".
+    """
+
+    def __init__(self, kind, entry_point_group):
+        self.kind = kind
+        self.entry_point_group = entry_point_group
+        self._targets = {}
+        self._backends = {}
+        self._entry_points_loaded = False
+
+    def register(self, name, target):
+        self._targets[name] = target
+        self._backends.pop(name, None)
+
+    def names(self):
+        self._load_entry_points()
+        return sorted(self._targets)
+
+    def get(self, name):
+        """
+        Returns the backend class registered as `name`, importing it if
+        needed.
+
+        Raises:
+            ValueError: If no backend is registered as `name`.
+        """
+        if name in self._backends:
+            return self._backends[name]
+        if name not in self._targets:
+            self._load_entry_points()
+        if name not in self._targets:
+            raise ValueError(f"Unknown {self.kind} pipeline type: {name}")
+
+        target = self._targets[name]
+        with get_startup_report().phase(f"{self.kind.lower()}_import"):
+            if isinstance(target, str):
+                module_name, attribute = target.split(":")
+                backend = getattr(
+                    importlib.import_module(module_name), attribute
+                )
+            elif hasattr(target, "load"):
+                backend = target.load()
+            else:
+                backend = target
+        self._backends[name] = backend
+        return backend
+
+    def create(self, name, **kwargs):
+        backend = self.get(name)
+        with get_startup_report().phase(f"{self.kind.lower()}_load"):
+            return backend(**kwargs)
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        for entry_point in entry_points(group=self.entry_point_group):
+            if entry_point.name in self._targets:
+                log.warning(
+                    f"Ignoring {self.kind} backend {entry_point.name} from "
+                    f"{entry_point.value}: the name is already registered"
+                )
+                continue
+            self._targets[entry_point.name] = entry_point
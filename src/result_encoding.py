@@ -0,0 +1,98 @@
+import msgpack
+import orjson
+
+WORD_FIELDS = ("word", "start", "end", "probability")
+ROUNDED_FIELDS = ("language_probability", "audio_duration")
+
+DEFAULT_RESULT_ENCODING = {
+    "format": "json",
+    "words": "objects",
+    "float_precision": None,
+}
+
+
+def negotiate_result_encoding(requested):
+    """
+    Builds the result encoding of a client from the one it requested in its
+    config message, falling back to the defaults for anything unsupported.
+
+    Args:
+        requested (dict): May contain "format" ("json" or "msgpack"), "words"
+                          ("objects" or "columnar") and "float_precision"
+                          (number of decimals, or None to keep all of them).
+
+    Returns:
+        dict: The encoding that will be used, to be acknowledged to the
+              client.
+    """
+    encoding = dict(DEFAULT_RESULT_ENCODING)
+    requested = requested or {}
+
+    if requested.get("format") == "msgpack":
+        encoding["format"] = "msgpack"
+
+    if requested.get("words") == "columnar":
+        encoding["words"] = "columnar"
+
+    precision = requested.get("float_precision")
+    if isinstance(precision, int) and not isinstance(precision, bool):
+        encoding["float_precision"] = max(0, precision)
+
+    return encoding
+
+
+def _columnar_words(words, precision):
+    columns = {field: [] for field in WORD_FIELDS}
+    for word in words:
+        for field in WORD_FIELDS:
+            columns[field].append(word[field])
+    if precision is not None:
+        for field in WORD_FIELDS[1:]:
+            columns[field] = [round(v, precision) for v in columns[field]]
+    return columns
+
+
+def _rounded_words(words, precision):
+    return [
+        {
+            "word": word["word"],
+            "start": round(word["start"], precision),
+            "end": round(word["end"], precision),
+            "probability": round(word["probability"], precision),
+        }
+        for word in words
+    ]
+
+
+def encode_transcription(transcription, encoding=None):
+    """
+    Serializes a transcription for the WebSocket.
+
+    With the "columnar" words layout the list of word objects is replaced by
+    one list per field (`{"word": [...], "start": [...], ...}`), which avoids
+    repeating the keys for every word.
+
+    Returns:
+        str for JSON (a text frame), bytes for MessagePack (a binary frame).
+    """
+    encoding = encoding or DEFAULT_RESULT_ENCODING
+    precision = encoding.get("float_precision")
+    columnar = encoding.get("words") == "columnar"
+
+    if columnar or precision is not None:
+        transcription = dict(transcription)
+    words = transcription.get("words")
+    if isinstance(words, list):
+        if columnar:
+            transcription["words"] = _columnar_words(words, precision)
+        elif precision is not None:
+            transcription["words"] = _rounded_words(words, precision)
+
+    if precision is not None:
+        for field in ROUNDED_FIELDS:
+            if isinstance(transcription.get(field), float):
+                transcription[field] = round(transcription[field], precision)
+
+    if encoding.get("format") == "msgpack":
+        return msgpack.packb(transcription, use_bin_type=True)
+    return orjson.dumps(transcription).decode()
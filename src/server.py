@@ -1,14 +1,16 @@
 import json
 import logging
 import ssl
-import uuid
 import urllib
+import uuid
 
 import websockets
 from asgi_correlation_id import correlation_id
 
 from core.auth import validate_api_key
+from core.consts import CLOSE_CODE_INVALID_API_KEY, CLOSE_CODE_INVALID_CONFIG
 from core.logging import log
+from src.admin import AdminInterface
 from src.client import Client
 
 
@@ -29,6 +31,14 @@ class Server:
         samples_width (int): The width of each audio sample in bits.
         connected_clients (dict): A dictionary mapping client IDs to Client
                                   objects.
+        admission_controller: Optional AdmissionController deciding whether
+                              new sessions are accepted.
+        transport_options (dict): Keyword arguments for websockets.serve,
+                                  see src.transport.
+        recorder: Optional SessionRecorder capturing the sessions' traffic.
+        session_memory: Optional SessionMemoryManager enforcing the memory
+                        budget of the sessions.
+        websockets (dict): WebSocket of each connected client, by client id.
     """
 
     def __init__(
@@ -41,6 +51,10 @@ class Server:
         samples_width=2,
         certfile=None,
         keyfile=None,
+        admission_controller=None,
+        transport_options=None,
+        recorder=None,
+        session_memory=None,
     ):
         self.vad_pipeline = vad_pipeline
         self.asr_pipeline = asr_pipeline
@@ -51,18 +65,60 @@ class Server:
         self.certfile = certfile
         self.keyfile = keyfile
         self.connected_clients = {}
+        self.websockets = {}
+        self.admission_controller = admission_controller
+        self.transport_options = transport_options or {}
+        self.recorder = recorder
+        self.session_memory = session_memory
+        self.admin = AdminInterface(self)
 
     async def handle_audio(self, client, websocket):
         while True:
             message = await websocket.recv()
+            if self.recorder is not None:
+                self.recorder.record_message(client.client_id, message)
 
             if isinstance(message, bytes):
                 client.append_audio_data(message)
+                if self.admission_controller is not None:
+                    rejection = self.admission_controller.consume_audio(
+                        client.api_key,
+                        len(message)
+                        / (client.sampling_rate * client.samples_width),
+                    )
+                    if rejection is not None:
+                        await websocket.close(*rejection)
+                        return
+                if self.session_memory is not None:
+                    rejection = self.session_memory.check_session(client)
+                    if rejection is not None:
+                        await websocket.close(*rejection)
+                        return
             elif isinstance(message, str):
                 config = json.loads(message)
                 if config.get("type") == "config":
-                    client.update_config(config["data"])
+                    try:
+                        client.update_config(config["data"])
+                    except ValueError as e:
+                        await websocket.close(
+                            code=CLOSE_CODE_INVALID_CONFIG, reason=str(e)
+                        )
+                        return
                     log.info(f"Updated config: {client.config}")
+                    if "result_encoding" in config["data"]:
+                        await websocket.send(
+                            json.dumps(
+                                {
+                                    "type": "config_ack",
+                                    "result_encoding": client.result_encoding,
+                                }
+                            )
+                        )
+                    continue
+                if config.get("type") == "end_of_stream":
+                    client.flush(
+                        websocket, self.vad_pipeline, self.asr_pipeline
+                    )
                     continue
             else:
                 log.info(f"Unexpected message type from {client.client_id}")
@@ -71,6 +127,7 @@ class Server:
             client.process_audio(
                 websocket, self.vad_pipeline, self.asr_pipeline
             )
+            await client.wait_for_capacity()
 
     async def handle_websocket(self, websocket):
         new_correlation_id = str(uuid.uuid4())
@@ -79,26 +136,49 @@ class Server:
 
         parsed_url = urllib.parse.urlparse(websocket.path)
         query_params = urllib.parse.parse_qs(parsed_url.query)
-        log.info("Query params are", query_params=query_params)
+        log.info(
+            "Query params are",
+            query_params={
+                name: values
+                for name, values in query_params.items()
+                if name != "AWAAZ_API_KEY"
+            },
+        )
 
         api_keys = query_params.get("AWAAZ_API_KEY", None)
         api_key = None
         if isinstance(api_keys, list) and len(api_keys) > 0:
             api_key = api_keys[0]
 
-        log.debug(f"API key is", api_key=api_key)
         if not api_key:
-            await websocket.close(code=4001, reason="Missing API Key")
+            await websocket.close(
+                code=CLOSE_CODE_INVALID_API_KEY, reason="Missing API Key"
+            )
             return
 
         if not await validate_api_key(api_key):
             log.debug("Invalid API Key")
-            await websocket.close(code=4001, reason="Invalid API Key")
+            await websocket.close(
+                code=CLOSE_CODE_INVALID_API_KEY, reason="Invalid API Key"
+            )
             return
 
+        if self.admission_controller is not None:
+            rejection = await self.admission_controller.admit(api_key)
+            if rejection is not None:
+                await websocket.close(*rejection)
+                return
+
         client_id = str(uuid.uuid4())
-        client = Client(client_id, self.sampling_rate, self.samples_width)
+        client = Client(
+            client_id, self.sampling_rate, self.samples_width, api_key=api_key
+        )
         self.connected_clients[client_id] = client
+        self.websockets[client_id] = websocket
+        if self.recorder is not None:
+            self.recorder.open_session(
+                client_id, self.sampling_rate, self.samples_width
+            )
 
         log.info("Client connected", client_id=client_id)
 
@@ -107,7 +187,13 @@ class Server:
         except websockets.ConnectionClosed as e:
             log.info(f"Connection closed", client_id=client_id, error=e)
         finally:
+            client.close()
             del self.connected_clients[client_id]
+            del self.websockets[client_id]
+            if self.recorder is not None:
+                self.recorder.close_session(client_id)
+            if self.admission_controller is not None:
+                await self.admission_controller.release(api_key)
 
     def start(self):
         if self.certfile:
@@ -130,7 +216,12 @@ class Server:
             # and port. Ensure the secure flag is set to True if using a secure
             # WebSocket protocol (wss://)
             return websockets.serve(
-                self.handle_websocket, self.host, self.port, ssl=ssl_context
+                self.handle_websocket,
+                self.host,
+                self.port,
+                ssl=ssl_context,
+                process_request=self.admin.process_request,
+                **self.transport_options,
             )
         else:
             log.info(
@@ -138,5 +229,9 @@ class Server:
                 f"{self.host}:{self.port}"
             )
             return websockets.serve(
-                self.handle_websocket, self.host, self.port
+                self.handle_websocket,
+                self.host,
+                self.port,
+                process_request=self.admin.process_request,
+                **self.transport_options,
             )
@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+from core.consts import CLOSE_CODE_IDLE_TIMEOUT, CLOSE_CODE_MEMORY_LIMIT
+from core.logging import log
+from monitoring.metrics import get_metric_publisher
+
+
+class SessionMemoryManager:
+    """
+    Keeps the memory held by the sessions bounded.
+
+    Every session accounts the audio it holds (see `Client.memory_bytes`):
+    its buffers, the chunks queued in its pipeline and the utterances being
+    transcribed. Three limits are enforced, each optional:
+        - `max_session_bytes`: a session holding more is closed with
+          CLOSE_CODE_MEMORY_LIMIT as soon as it receives audio (see
+          `check_session`).
+        - `max_total_bytes`: when all the sessions together hold more, the
+          sessions holding the most are closed with CLOSE_CODE_MEMORY_LIMIT
+          until the total fits again.
+        - `idle_timeout_seconds`: sessions that did not send audio for that
+          long are closed with CLOSE_CODE_IDLE_TIMEOUT, unless audio they
+          sent is still queued or being transcribed (e.g. held back by the
+          "block" overflow policy).
+    The last two are checked by `sweep`, every `interval` seconds in `run`,
+    which also publishes the memory totals.
+
+    Attributes:
+        total_bytes (int): Memory held by the sessions at the last sweep.
+        evicted_sessions (int): Sessions closed for memory.
+        idle_sessions (int): Sessions closed for being idle.
+    """
+
+    def __init__(
+        self,
+        server,
+        max_session_bytes=None,
+        max_total_bytes=None,
+        idle_timeout_seconds=None,
+    ):
+        self.server = server
+        self.max_session_bytes = max_session_bytes
+        self.max_total_bytes = max_total_bytes
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.total_bytes = 0
+        self.evicted_sessions = 0
+        self.idle_sessions = 0
+
+    def check_session(self, client):
+        """
+        Returns:
+            None if the session is within its budget, otherwise the
+            (code, reason) to close the WebSocket with.
+        """
+        if self.max_session_bytes is None:
+            return None
+        memory_bytes = client.memory_bytes()
+        if memory_bytes <= self.max_session_bytes:
+            return None
+        self.evicted_sessions += 1
+        log.info(
+            "Closing session over its memory budget",
+            client_id=client.client_id,
+            memory_bytes=memory_bytes,
+        )
+        get_metric_publisher().publish_metric(
+            "SessionsEvicted",
+            1,
+            unit="Count",
+            dimensions=[{"Name": "Reason", "Value": "session_budget"}],
+        )
+        return CLOSE_CODE_MEMORY_LIMIT, "Session memory budget exceeded"
+
+    async def sweep(self):
+        """
+        Closes the idle sessions and, if the sessions hold more than
+        `max_total_bytes`, the largest ones, then publishes the totals.
+        """
+        now = time.monotonic()
+        sessions = []
+        closing = []
+        for client_id, client in list(self.server.connected_clients.items()):
+            if (
+                self.idle_timeout_seconds
+                and now - client.last_audio_time > self.idle_timeout_seconds
+                and not client.has_pending_work()
+            ):
+                self.idle_sessions += 1
+                log.info("Closing idle session", client_id=client_id)
+                get_metric_publisher().publish_metric(
+                    "SessionsClosedIdle", 1, unit="Count"
+                )
+                closing.append(
+                    self._close(
+                        client_id, CLOSE_CODE_IDLE_TIMEOUT, "Idle timeout"
+                    )
+                )
+                continue
+            sessions.append((client.memory_bytes(), client_id))
+
+        self.total_bytes = sum(memory_bytes for memory_bytes, _ in sessions)
+        largest = max((m for m, _ in sessions), default=0)
+        if (
+            self.max_total_bytes is not None
+            and self.total_bytes > self.max_total_bytes
+        ):
+            # Evict the sessions holding the most first: the fewest sessions
+            # are dropped to get back under the budget.
+            sessions.sort(reverse=True)
+            for memory_bytes, client_id in sessions:
+                if self.total_bytes <= self.max_total_bytes:
+                    break
+                self.evicted_sessions += 1
+                self.total_bytes -= memory_bytes
+                log.info(
+                    "Evicting session: sessions over the memory budget",
+                    client_id=client_id,
+                    memory_bytes=memory_bytes,
+                )
+                get_metric_publisher().publish_metric(
+                    "SessionsEvicted",
+                    1,
+                    unit="Count",
+                    dimensions=[{"Name": "Reason", "Value": "global_budget"}],
+                )
+                closing.append(
+                    self._close(
+                        client_id,
+                        CLOSE_CODE_MEMORY_LIMIT,
+                        "Server memory budget exceeded",
+                    )
+                )
+
+        cw = get_metric_publisher()
+        cw.publish_metric("SessionMemoryBytes", self.total_bytes, unit="Bytes")
+        cw.publish_metric("SessionMemoryMaxBytes", largest, unit="Bytes")
+        await asyncio.gather(*closing)
+
+    async def _close(self, client_id, code, reason):
+        websocket = self.server.websockets.get(client_id)
+        if websocket is not None:
+            await websocket.close(code, reason)
+
+    async def run(self, interval=10):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                log.error(f"Error sweeping sessions: {e}")
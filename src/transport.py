@@ -0,0 +1,76 @@
+import asyncio
+
+from core.logging import log
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+# Keyword arguments for `websockets.serve` / `websockets.connect`, plus
+# "uvloop" to run the server on uvloop's event loop when it is installed.
+TRANSPORT_PROFILES = {
+    # The websockets defaults: permessage-deflate, 1 MiB frames, 32 queued
+    # messages, 64 KiB write buffer, pings every 20 seconds.
+    "default": {},
+    # Audio frames are PCM and results are short JSON: neither compresses
+    # well enough to pay for deflate. Limits are explicit so that a slow
+    # reader applies backpressure instead of growing buffers.
+    "high_throughput": {
+        "uvloop": True,
+        "compression": None,
+        "max_size": 2**20,
+        "max_queue": 16,
+        "read_limit": 2**16,
+        "write_limit": 2**15,
+        "ping_interval": 30,
+        "ping_timeout": 30,
+        "close_timeout": 5,
+    },
+}
+
+
+def get_transport_options(profile="default", overrides=None):
+    """
+    Returns the options of a transport profile.
+
+    Args:
+        profile (str): Name of a profile in TRANSPORT_PROFILES.
+        overrides (dict): Options replacing the ones of the profile.
+
+    Returns:
+        dict: The profile options, including the "uvloop" flag.
+    """
+    if profile not in TRANSPORT_PROFILES:
+        raise ValueError(f"Unknown transport profile: {profile}")
+    options = dict(TRANSPORT_PROFILES[profile])
+    options.update(overrides or {})
+    return options
+
+
+def split_transport_options(options):
+    """
+    Splits profile options into the uvloop flag and the keyword arguments
+    for websockets.
+    """
+    websocket_options = dict(options)
+    use_uvloop = websocket_options.pop("uvloop", False)
+    return use_uvloop, websocket_options
+
+
+def install_event_loop_policy(use_uvloop):
+    """
+    Makes asyncio create uvloop event loops, if requested and installed.
+    Must be called before the event loop is created.
+
+    Returns:
+        bool: Whether uvloop is in use.
+    """
+    if not use_uvloop:
+        return False
+    if uvloop is None:
+        log.warning("uvloop not installed, using the asyncio event loop")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
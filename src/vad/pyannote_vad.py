@@ -15,6 +15,24 @@ class PyannoteVAD(VADInterface):
     Pyannote-based implementation of the VADInterface.
     """
 
+    DEFAULT_ARGS = {
+        "pyannote_args": {
+            # the threshold at which the model detects the start of speech,
+            # default: 0.5
+            "onset": 0.7,
+            # threshold for when speech is considered to have ended.
+            # default: 0.5
+            "offset": 0.3,
+            # minimum duration of speech required for it to be considered
+            # valid, default: 0.3
+            "min_duration_on": 0.5,
+            # how long silence must last for the model to consider that
+            # speech has ended and that a new speech segment may start.
+            # default: 0.3
+            "min_duration_off": 0.3,
+        },
+    }
+
     def __init__(self, **kwargs):
         """
         Initializes Pyannote's VAD pipeline.
@@ -37,13 +55,7 @@ class PyannoteVAD(VADInterface):
             )
 
         pyannote_args = kwargs.get(
-            "pyannote_args",
-            {
-                "onset": 0.7, # the threshold at which the model detects the start of speech, default: 0.5
-                "offset": 0.3, # threshold for when speech is considered to have ended. default: 0.5
-                "min_duration_on": 0.5, # minimum duration of speech required for it to be considered valid, default: 0.3
-                "min_duration_off": 0.3, # how long silence must last for the model to consider that speech has ended and that a new speech segment may start. default: 0.3
-            },
+            "pyannote_args", self.DEFAULT_ARGS["pyannote_args"]
         )
         self.model = Model.from_pretrained(
             model_name, use_auth_token=auth_token
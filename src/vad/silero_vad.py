@@ -0,0 +1,147 @@
+import asyncio
+
+import numpy as np
+from faster_whisper.vad import get_vad_model
+
+from .vad_interface import VADInterface
+
+
+class SileroStreamState:
+    """
+    Streaming state of the Silero model for the scratch buffer of a client:
+    the LSTM state after the last window that was run and the speech
+    probability of every window so far.
+    """
+
+    def __init__(self, model):
+        self.model_state = model.get_initial_state(batch_size=1)
+        self.probabilities = []
+        self.processed_bytes = 0
+
+
+class SileroVAD(VADInterface):
+    """
+    Silero VAD, using the ONNX model bundled with faster-whisper. It runs on
+    CPU and needs no Hugging Face token.
+
+    The model is stateful: each client keeps its state in `client.vad_state`
+    so that only the audio appended to the scratch buffer since the last
+    call goes through the model. The state is reset when the scratch buffer
+    is cleared.
+    """
+
+    # Like the WAV files written by save_audio_to_file
+    SAMPLING_RATE = 16000
+    SAMPLES_WIDTH = 2
+
+    def __init__(self, **kwargs):
+        """
+        Loads the Silero model.
+
+        Args:
+            threshold (float): Speech probability above which a window is
+                               speech.
+            neg_threshold (float): Speech probability below which a window is
+                                   silence, defaults to threshold - 0.15.
+            min_speech_duration_ms (int): Shorter segments are dropped.
+            min_silence_duration_ms (int): Silence needed to end a segment.
+            speech_pad_ms (int): Padding added on each side of the segments.
+            window_size_samples (int): 512, 1024 or 1536.
+        """
+        self.threshold = kwargs.get("threshold", 0.5)
+        self.neg_threshold = kwargs.get(
+            "neg_threshold", max(self.threshold - 0.15, 0.01)
+        )
+        self.min_speech_duration_ms = kwargs.get("min_speech_duration_ms", 250)
+        self.min_silence_duration_ms = kwargs.get(
+            "min_silence_duration_ms", 300
+        )
+        self.speech_pad_ms = kwargs.get("speech_pad_ms", 30)
+        self.window_size_samples = kwargs.get("window_size_samples", 512)
+        if self.window_size_samples not in (512, 1024, 1536):
+            raise ValueError(
+                "window_size_samples must be 512, 1024 or 1536 for Silero VAD"
+            )
+        self.model = get_vad_model()
+
+    async def detect_activity(self, client):
+        state = getattr(client, "vad_state", None)
+        buffer_bytes = len(client.scratch_buffer)
+        if not isinstance(state, SileroStreamState):
+            state = None
+        if state is None or state.processed_bytes > buffer_bytes:
+            state = SileroStreamState(self.model)
+            client.vad_state = state
+
+        window_bytes = self.window_size_samples * self.SAMPLES_WIDTH
+        end = buffer_bytes - (
+            (buffer_bytes - state.processed_bytes) % window_bytes
+        )
+        if end > state.processed_bytes:
+            audio = bytes(
+                client.scratch_buffer[state.processed_bytes : end]  # noqa
+            )
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._run_model, state, audio
+            )
+            state.processed_bytes = end
+        return self._segments(state.probabilities)
+
+    def _run_model(self, state, audio):
+        samples = (
+            np.frombuffer(audio, dtype=np.int16).astype(np.float32) / 32768.0
+        )
+        for start in range(0, len(samples), self.window_size_samples):
+            end = start + self.window_size_samples
+            window = samples[start:end]
+            probability, state.model_state = self.model(
+                window, state.model_state, self.SAMPLING_RATE
+            )
+            state.probabilities.append(float(np.squeeze(probability)))
+
+    def _segments(self, probabilities):
+        """
+        Turns window probabilities into speech segments, in seconds, with
+        the mean probability of their windows as confidence.
+        """
+        window_seconds = self.window_size_samples / self.SAMPLING_RATE
+        min_silence_windows = self.min_silence_duration_ms / (
+            1000 * window_seconds
+        )
+        segments = []
+        start = None
+        silence_start = None
+        for i, probability in enumerate(probabilities):
+            if start is None:
+                if probability >= self.threshold:
+                    start = i
+                    silence_start = None
+            elif probability >= self.threshold:
+                silence_start = None
+            elif probability < self.neg_threshold:
+                if silence_start is None:
+                    silence_start = i
+                if i + 1 - silence_start >= min_silence_windows:
+                    segments.append((start, silence_start))
+                    start = silence_start = None
+        if start is not None:
+            if silence_start is None:
+                silence_start = len(probabilities)
+            segments.append((start, silence_start))
+
+        pad = self.speech_pad_ms / 1000
+        duration = len(probabilities) * window_seconds
+        vad_segments = []
+        for start, end in segments:
+            if (end - start) * window_seconds * 1000 < (
+                self.min_speech_duration_ms
+            ):
+                continue
+            vad_segments.append(
+                {
+                    "start": max(0.0, start * window_seconds - pad),
+                    "end": min(duration, end * window_seconds + pad),
+                    "confidence": float(np.mean(probabilities[start:end])),
+                }
+            )
+        return vad_segments
@@ -1,4 +1,8 @@
-from .pyannote_vad import PyannoteVAD
+from src.registry import BackendRegistry
+
+VAD_BACKENDS = BackendRegistry("VAD", "voicestreamai.vad")
+VAD_BACKENDS.register("pyannote", "src.vad.pyannote_vad:PyannoteVAD")
+VAD_BACKENDS.register("silero", "src.vad.silero_vad:SileroVAD")
 
 
 class VADFactory:
@@ -11,14 +15,16 @@ class VADFactory:
         """
         Creates a VAD pipeline based on the specified type.
 
+        The implementation is only imported when it is first used, see
+        BackendRegistry.
+
         Args:
-            type (str): The type of VAD pipeline to create (e.g., 'pyannote').
+            type (str): The type of VAD pipeline to create (e.g., 'pyannote',
+                        'silero', or one registered through the
+                        'voicestreamai.vad' entry points).
             kwargs: Additional arguments for the VAD pipeline creation.
 
         Returns:
             VADInterface: An instance of a class that implements VADInterface.
         """
-        if type == "pyannote":
-            return PyannoteVAD(**kwargs)
-        else:
-            raise ValueError(f"Unknown VAD pipeline type: {type}")
+        return VAD_BACKENDS.create(type, **kwargs)
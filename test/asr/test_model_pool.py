@@ -0,0 +1,390 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from src.asr.model_pool import (
+    MAX_POOL_SIZE,
+    ASRModelPool,
+    ASRPoolAutoscaler,
+    ASRPoolManager,
+    ModelFootprint,
+    compute_model_pool_size,
+    measure_model_footprint,
+)
+from src.asr.whisper_asr import WhisperASR
+
+
+class FakeModelPool(ASRModelPool):
+    def _create_instance(self):
+        return object()
+
+    def has_memory_for_instance(self, headroom=0.1):
+        return True
+
+
+@mock.patch("src.asr.model_pool.get_metric_publisher")
+class TestASRPoolAutoscaler(unittest.TestCase):
+    def make_autoscaler(self, pool):
+        return ASRPoolAutoscaler(
+            pool,
+            grow_wait_seconds=0.1,
+            sustain_intervals=2,
+            idle_cooldown_seconds=60,
+            resize_cooldown_seconds=0,
+        )
+
+    def test_grows_on_sustained_wait(self, _):
+        async def run():
+            pool = FakeModelPool(1, "fake", {}, min_size=1, max_size=2)
+            autoscaler = self.make_autoscaler(pool)
+
+            await pool.acquire()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+
+            # A single saturated evaluation is not enough to grow
+            self.assertEqual(await autoscaler.step(), 0)
+            self.assertEqual(await autoscaler.step(), 1)
+            self.assertEqual(pool.size, 2)
+
+            await waiter
+            # The pool never grows beyond max_size
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+            await autoscaler.step()
+            self.assertEqual(await autoscaler.step(), 0)
+            self.assertEqual(pool.size, 2)
+            waiter.cancel()
+
+        asyncio.run(run())
+
+    def test_shrinks_after_idle_cooldown(self, _):
+        async def run():
+            pool = FakeModelPool(3, "fake", {}, min_size=2, max_size=3)
+            autoscaler = self.make_autoscaler(pool)
+
+            self.assertEqual(await autoscaler.step(), 0)
+
+            pool.last_saturated = time.monotonic() - 61
+            self.assertEqual(await autoscaler.step(), -1)
+            self.assertEqual(pool.size, 2)
+
+            # The pool never shrinks below min_size
+            pool.last_saturated = time.monotonic() - 61
+            self.assertEqual(await autoscaler.step(), 0)
+            self.assertEqual(pool.size, 2)
+
+        asyncio.run(run())
+
+
+@mock.patch("src.asr.model_pool.get_metric_publisher")
+@mock.patch.object(ASRModelPool, "_create_instance", lambda self: object())
+class TestASRPoolManager(unittest.TestCase):
+    def test_swap_drains_old_generation(self, _):
+        async def run():
+            old_pool = ASRModelPool(2, "fake", {})
+            manager = ASRPoolManager(old_pool)
+            in_flight = await manager.acquire()
+
+            with mock.patch.object(
+                ASRModelPool, "has_memory_for_instance", return_value=True
+            ):
+                await manager.start_swap("fake", {"model_size": "new"})
+
+            self.assertEqual(manager.generation, 1)
+            self.assertIsNot(manager.current, old_pool)
+            self.assertEqual(manager.size, 2)
+            self.assertEqual(manager.draining, [old_pool])
+
+            # The old generation is freed once its last instance is back
+            manager.release(in_flight)
+            self.assertEqual(manager.draining, [])
+            self.assertEqual(old_pool.size, 0)
+
+            model_instance = await manager.acquire()
+            self.assertEqual(manager.in_use, 1)
+            manager.release(model_instance)
+
+        asyncio.run(run())
+
+    def test_swap_retires_old_instances_without_memory(self, _):
+        async def run():
+            old_pool = ASRModelPool(2, "fake", {})
+            manager = ASRPoolManager(old_pool)
+            in_flight = await manager.acquire()
+
+            with mock.patch.object(
+                ASRModelPool, "has_memory_for_instance", return_value=False
+            ):
+                swap_task = manager.start_swap("fake", {})
+                await asyncio.sleep(0.1)
+                # The idle instance was replaced, the swap now waits for the
+                # one in use
+                self.assertEqual(manager.generation, 1)
+                self.assertEqual(manager.size, 1)
+                self.assertFalse(swap_task.done())
+
+                manager.release(in_flight)
+                await swap_task
+
+            self.assertEqual(manager.size, 2)
+            self.assertEqual(old_pool.size, 0)
+            self.assertEqual(manager.draining, [])
+
+        asyncio.run(run())
+
+    def test_failed_swap_regrows_old_generation(self, _):
+        def create_instance(pool):
+            if pool.model_kwargs:
+                raise RuntimeError("load error")
+            return object()
+
+        async def run():
+            old_pool = ASRModelPool(2, "fake", {})
+            manager = ASRPoolManager(old_pool)
+
+            with mock.patch.object(
+                ASRModelPool, "has_memory_for_instance", return_value=False
+            ), mock.patch.object(
+                ASRModelPool, "_create_instance", create_instance
+            ):
+                with self.assertRaises(RuntimeError):
+                    await manager.start_swap("fake", {"model_size": "new"})
+
+            # An old instance was retired for the new one, then reloaded
+            self.assertIs(manager.current, old_pool)
+            self.assertEqual(manager.generation, 0)
+            self.assertEqual(old_pool.size, 2)
+            status = manager.status()
+            self.assertFalse(status["swap_error"]["switched"])
+            self.assertEqual(status["swap_error"]["pool_size"], 2)
+
+        asyncio.run(run())
+
+    def test_failed_swap_after_switch_is_reported(self, _):
+        created = []
+
+        def create_instance(pool):
+            if pool.model_kwargs and len(created) == 1:
+                raise RuntimeError("out of memory")
+            if pool.model_kwargs:
+                created.append(pool)
+            return object()
+
+        async def run():
+            old_pool = ASRModelPool(2, "fake", {})
+            manager = ASRPoolManager(old_pool)
+
+            with mock.patch.object(
+                ASRModelPool, "has_memory_for_instance", return_value=False
+            ), mock.patch.object(
+                ASRModelPool, "_create_instance", create_instance
+            ):
+                with self.assertRaises(RuntimeError):
+                    await manager.start_swap("fake", {"model_size": "new"})
+
+            self.assertEqual(manager.generation, 1)
+            self.assertEqual(manager.size, 1)
+            self.assertEqual(
+                manager.status()["swap_error"],
+                {
+                    "error": "RuntimeError('out of memory')",
+                    "switched": True,
+                    "pool_size": 1,
+                    "target_pool_size": 2,
+                },
+            )
+
+        asyncio.run(run())
+
+
+@mock.patch("src.asr.model_pool.get_metric_publisher")
+@mock.patch("src.asr.model_pool.ASRFactory.create_asr_pipeline")
+class TestSharedModelPool(unittest.TestCase):
+    def test_slots_share_one_model(self, create_asr_pipeline, _):
+        async def run():
+            pool = ASRModelPool(
+                2,
+                "faster_whisper",
+                {"model_size": "tiny"},
+                max_size=4,
+                shared_model=True,
+            )
+            create_asr_pipeline.assert_called_once_with(
+                "faster_whisper", model_size="tiny", num_workers=4
+            )
+            first = await pool.acquire()
+            second = await pool.acquire()
+            self.assertIsNot(first, second)
+            self.assertIs(first.model, second.model)
+
+            with mock.patch.object(
+                pool, "has_memory_for_instance", return_value=True
+            ):
+                await pool.grow()
+            self.assertEqual(create_asr_pipeline.call_count, 1)
+            self.assertEqual(pool.size, 3)
+
+            pool.release(first)
+            pool.release(second)
+            pool.close()
+            self.assertEqual(pool.size, 0)
+            self.assertIsNone(pool._shared_instance)
+
+        asyncio.run(run())
+
+    def test_workers_spread_over_devices(self, create_asr_pipeline, _):
+        ASRModelPool(
+            1,
+            "faster_whisper",
+            {"device_index": [0, 1]},
+            max_size=5,
+            shared_model=True,
+        )
+        create_asr_pipeline.assert_called_once_with(
+            "faster_whisper", device_index=[0, 1], num_workers=3
+        )
+
+    def test_requires_faster_whisper(self, *_):
+        with self.assertRaises(ValueError):
+            ASRModelPool(1, "whisper", {}, shared_model=True)
+
+
+MiB = 1024**2
+
+
+class FakeMemorySampler:
+    source = "nvml"
+
+    def __init__(self):
+        self.used = 1000 * MiB
+
+    def used_bytes(self):
+        return self.used
+
+    def track_peak(self):
+        sampler = self
+
+        class Tracker:
+            def __enter__(self):
+                self.usage = {"peak": sampler.used}
+                return self.usage
+
+            def __exit__(self, *exc_info):
+                self.usage["peak"] = 1500 * MiB
+
+        return Tracker()
+
+
+@mock.patch("src.asr.model_pool.gpu_memory_unreadable", return_value=False)
+class TestModelFootprint(unittest.TestCase):
+    @mock.patch("src.asr.model_pool.ASRFactory.create_asr_pipeline")
+    @mock.patch("src.asr.model_pool.get_memory_sampler")
+    def test_measures_weights_and_decode_peak(self, get_sampler, create, _):
+        sampler = get_sampler.return_value = FakeMemorySampler()
+
+        def load(asr_type, **kwargs):
+            sampler.used += 200 * MiB
+            return mock.Mock()
+
+        create.side_effect = load
+        footprint, model_instance = measure_model_footprint(
+            "faster_whisper", {}, audio_seconds=5
+        )
+        model_instance.warmup.assert_called_once_with(5)
+        self.assertEqual(footprint.weights_bytes, 200 * MiB)
+        self.assertEqual(footprint.worker_bytes, 300 * MiB)
+
+    @mock.patch("src.asr.model_pool.ASRFactory.create_asr_pipeline")
+    @mock.patch("src.asr.model_pool.get_memory_sampler")
+    def test_failed_measurement_is_discarded(self, get_sampler, create, _):
+        sampler = get_sampler.return_value = FakeMemorySampler()
+
+        def load(asr_type, **kwargs):
+            sampler.used += 1200 * MiB
+            return mock.Mock()
+
+        create.side_effect = load
+        # The decode peak is below the memory used after loading
+        footprint, model_instance = measure_model_footprint(
+            "faster_whisper", {}
+        )
+        self.assertIsNone(footprint)
+        self.assertIsNotNone(model_instance)
+
+    @mock.patch(
+        "src.asr.model_pool.get_available_gpu_memory_bytes",
+        return_value=1000 * MiB,
+    )
+    def test_pool_size_from_measured_footprint(self, *_):
+        footprint = ModelFootprint(300 * MiB, 100 * MiB)
+        # The measured instance counts as one slot
+        self.assertEqual(
+            compute_model_pool_size(footprint=footprint, safety_margin=0.2),
+            3,
+        )
+        self.assertEqual(
+            compute_model_pool_size(
+                shared_model=True, footprint=footprint, safety_margin=0.2
+            ),
+            9,
+        )
+        self.assertEqual(
+            compute_model_pool_size(
+                shared_model=True,
+                footprint=footprint,
+                safety_margin=0.2,
+                max_size=4,
+            ),
+            4,
+        )
+
+    @mock.patch(
+        "src.asr.model_pool.get_available_gpu_memory_bytes",
+        return_value=200 * 1024**3,
+    )
+    def test_implausible_footprint_uses_estimates(self, *_):
+        estimate = ModelFootprint.estimate()
+        self.assertEqual(
+            compute_model_pool_size(
+                footprint=ModelFootprint(0, 0), safety_margin=0
+            ),
+            min(200 * 1024**3 // estimate.instance_bytes, MAX_POOL_SIZE),
+        )
+
+    @mock.patch("src.asr.model_pool.get_available_gpu_memory_bytes")
+    def test_unreadable_gpu_memory_is_not_used(self, available, unreadable):
+        unreadable.return_value = True
+        self.assertEqual(
+            compute_model_pool_size(footprint=ModelFootprint(0, 0)), 1
+        )
+        self.assertEqual(compute_model_pool_size(max_size=3), 3)
+        available.assert_not_called()
+
+    @mock.patch("src.asr.model_pool.get_available_gpu_memory_bytes")
+    @mock.patch("src.asr.model_pool.ASRFactory.get_asr_class")
+    def test_estimates_come_from_the_backend(self, get_asr_class, *_):
+        get_asr_class.return_value = WhisperASR
+        pool = FakeModelPool(1, "whisper", {})
+        # The backend is only looked up once the footprint is needed
+        get_asr_class.assert_not_called()
+        self.assertEqual(
+            pool.footprint.instance_bytes,
+            WhisperASR.WEIGHTS_MEMORY_BYTES + WhisperASR.WORKER_MEMORY_BYTES,
+        )
+        get_asr_class.assert_called_once_with("whisper")
+
+    @mock.patch("src.asr.model_pool.get_metric_publisher")
+    @mock.patch("src.asr.model_pool.ASRFactory.create_asr_pipeline")
+    def test_pool_uses_preloaded_instance(self, create, *_):
+        preloaded = object()
+        pool = ASRModelPool(
+            2, "faster_whisper", {}, preloaded_instance=preloaded
+        )
+        self.assertEqual(create.call_count, 1)
+        self.assertIs(pool.pool.get_nowait(), preloaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
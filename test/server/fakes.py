@@ -0,0 +1,106 @@
+"""
+Fakes shared by the tests of the buffering strategies: an ASR model pool,
+a VAD pipeline and a WebSocket, standing in for the real ones around a
+`Client`.
+"""
+
+import asyncio
+import json
+from unittest import mock
+
+from src.asr.model_pool import ASRModelPool
+from src.client import Client
+
+# Processing args of the clients made by `make_client`: chunks are processed
+# as soon as they hold half a second of audio.
+PROCESSING_ARGS = {
+    "chunk_length_seconds": 0.5,
+    "chunk_offset_seconds": 0.5,
+}
+
+
+class FakeASR:
+    """
+    Transcribes a chunk as the id of its client, after the next of the
+    pool's `delays`.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def transcribe(self, client):
+        self.pool.transcribed.append(bytes(client.scratch_buffer))
+        delay = self.pool.delays.pop(0) if self.pool.delays else 0
+        await asyncio.sleep(delay)
+        return {"text": client.client_id, "words": []}
+
+
+class FakeModelPool(ASRModelPool):
+    """
+    A pool of `asr_class` instances. The audio of every transcribed chunk
+    is kept in `transcribed`.
+    """
+
+    asr_class = FakeASR
+
+    def __init__(self, pool_size, delays=()):
+        self.delays = list(delays)
+        self.transcribed = []
+        super().__init__(pool_size, "fake", {})
+
+    def _create_instance(self):
+        return self.asr_class(self)
+
+
+class FakeVAD:
+    """
+    Finds speech from the start of the scratch buffer to the next of
+    `speech_ends`, in seconds, or to 0.1 seconds once they are used up.
+    """
+
+    def __init__(self, *speech_ends):
+        self.speech_ends = list(speech_ends)
+
+    async def detect_activity(self, client):
+        end = self.speech_ends.pop(0) if self.speech_ends else 0.1
+        return [{"start": 0.0, "end": end}]
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def make_client(
+    processing_strategy="silence_at_end_of_chunk", channels=1, **args
+):
+    """
+    A 16 kHz 16-bit client using `processing_strategy`, with `args`
+    overriding PROCESSING_ARGS.
+    """
+    client = Client("client", 16000, 2)
+    client.update_config(
+        {
+            "processing_strategy": processing_strategy,
+            "channels": channels,
+            "processing_args": dict(PROCESSING_ARGS, **args),
+        }
+    )
+    return client
+
+
+def patch_metric_publishers(test_class):
+    """
+    Replaces the metric publishers of the model pool and of the buffering
+    strategies for every test of `test_class`, which get the mocks as their
+    last two arguments (the strategies' last).
+    """
+    test_class = mock.patch("src.asr.model_pool.get_metric_publisher")(
+        test_class
+    )
+    return mock.patch(
+        "src.buffering_strategy.buffering_strategies.get_metric_publisher"
+    )(test_class)
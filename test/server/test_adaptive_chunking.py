@@ -0,0 +1,114 @@
+import types
+import unittest
+from unittest import mock
+
+from src.buffering_strategy.adaptive_chunking import (
+    ChunkLengthController,
+    set_chunk_length_controller,
+)
+from src.client import Client
+
+
+def make_pool(waiting=0, idle_count=1, queue_wait=None, rtf=None):
+    return types.SimpleNamespace(
+        waiting=waiting,
+        idle_count=idle_count,
+        queue_wait=queue_wait,
+        real_time_factor=rtf,
+    )
+
+
+@mock.patch("src.buffering_strategy.adaptive_chunking.get_metric_publisher")
+class TestChunkLengthController(unittest.TestCase):
+    def make_controller(self, pool):
+        return ChunkLengthController(
+            pool,
+            min_chunk_length_seconds=1.0,
+            max_chunk_length_seconds=6.0,
+            min_chunk_offset_seconds=0.1,
+            max_chunk_offset_seconds=0.5,
+            max_queue_wait_seconds=0.2,
+            max_real_time_factor=0.4,
+            step=0.5,
+        )
+
+    def test_starts_at_the_longest_chunk(self, _):
+        controller = self.make_controller(make_pool())
+        self.assertEqual(controller.chunk_length_seconds, 6.0)
+        self.assertEqual(controller.chunk_offset_seconds, 0.5)
+        # Nothing measured yet
+        self.assertEqual(controller.step(), 0)
+
+    def test_shortens_when_idle(self, metrics):
+        controller = self.make_controller(make_pool(queue_wait=0, rtf=0.1))
+        self.assertEqual(controller.step(), -1)
+        self.assertEqual(controller.chunk_length_seconds, 3.5)
+        self.assertEqual(controller.step(), -1)
+        self.assertEqual(controller.step(), 0)
+        self.assertEqual(controller.chunk_length_seconds, 1.0)
+        self.assertAlmostEqual(controller.chunk_offset_seconds, 0.1)
+        published = {
+            call.args[0]: call.args[1]
+            for call in metrics().publish_metric.call_args_list
+        }
+        self.assertEqual(published["ChunkLengthSeconds"], 1.0)
+
+    def test_lengthens_under_load(self, _):
+        pool = make_pool(queue_wait=0, rtf=0.1)
+        controller = self.make_controller(pool)
+        controller.level = 0.0
+        pool.queue_wait = 0.3
+        self.assertEqual(controller.step(), 1)
+        pool.queue_wait = 0.0
+        pool.real_time_factor = 0.5
+        self.assertEqual(controller.step(), 1)
+        self.assertEqual(controller.chunk_length_seconds, 6.0)
+
+        controller.level = 0.0
+        pool.real_time_factor = 0.1
+        pool.waiting, pool.idle_count = 2, 0
+        self.assertEqual(controller.step(), 1)
+
+    def test_holds_between_thresholds(self, _):
+        controller = self.make_controller(make_pool(queue_wait=0.15, rtf=0.1))
+        controller.level = 0.5
+        self.assertEqual(controller.step(), 0)
+        self.assertEqual(controller.level, 0.5)
+
+    def test_strategy_follows_controller(self, _):
+        controller = self.make_controller(make_pool())
+        controller.level = 0.0
+        set_chunk_length_controller(controller)
+        self.addCleanup(set_chunk_length_controller, None)
+
+        client = Client("client", 16000, 2)
+        client.update_config(
+            {
+                "processing_args": {
+                    "chunk_length_seconds": 5,
+                    "chunk_offset_seconds": 0.2,
+                }
+            }
+        )
+        strategy = client.buffering_strategy
+        strategy.update_chunk_settings()
+        self.assertEqual(strategy.chunk_length_seconds, 1.0)
+        self.assertEqual(strategy.chunk_offset_seconds, 0.1)
+
+        client.update_config(
+            {
+                "processing_args": {
+                    "chunk_length_seconds": 5,
+                    "chunk_offset_seconds": 0.2,
+                    "adaptive_chunking": False,
+                }
+            }
+        )
+        strategy = client.buffering_strategy
+        strategy.update_chunk_settings()
+        self.assertEqual(strategy.chunk_length_seconds, 5.0)
+        self.assertEqual(strategy.chunk_offset_seconds, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+import types
+import unittest
+from http import HTTPStatus
+
+from src.admin import AdminInterface
+from src.client import Client
+
+HEADERS = {"X-Admin-Key": "secret"}
+
+
+def busy_function(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+class TestAdminProfiling(unittest.TestCase):
+    def setUp(self):
+        self.admin = AdminInterface(types.SimpleNamespace(), api_key="secret")
+
+    async def request(self, path, headers=HEADERS):
+        status, _, body = await self.admin.process_request(path, headers)
+        return status, json.loads(body)
+
+    def profile(self, mode):
+        async def run():
+            status, body = await self.request(
+                f"/admin/profile?seconds=0.3&mode={mode}"
+            )
+            self.assertEqual(status, HTTPStatus.ACCEPTED)
+            self.assertEqual(body["state"], "running")
+            status, _ = await self.request("/admin/profile?seconds=1")
+            self.assertEqual(status, HTTPStatus.CONFLICT)
+
+            await asyncio.sleep(0.05)
+            busy_function(0.15)
+            await self.admin.profiler.task
+            return await self.request("/admin/profile_result")
+
+        return asyncio.run(run())
+
+    def test_sampling_profile(self):
+        status, body = self.profile("sampling")
+        self.assertEqual(status, HTTPStatus.OK)
+        self.assertEqual(body["state"], "done")
+        self.assertGreater(body["result"]["samples"], 0)
+        self.assertTrue(
+            any(
+                "busy_function" in stack["stack"]
+                for stack in body["result"]["stacks"]
+            )
+        )
+
+    def test_cprofile(self):
+        status, body = self.profile("cprofile")
+        self.assertEqual(body["state"], "done")
+        functions = {
+            row["function"]: row for row in body["result"]["functions"]
+        }
+        busy = [name for name in functions if "(busy_function)" in name]
+        self.assertEqual(len(busy), 1)
+        self.assertGreater(functions[busy[0]]["cumulative_seconds"], 0.1)
+
+    def test_invalid_parameters(self):
+        async def run():
+            status, body = await self.request("/admin/profile?mode=perf")
+            self.assertEqual(status, HTTPStatus.BAD_REQUEST)
+            status, _ = await self.request("/admin/profile?seconds=x")
+            self.assertEqual(status, HTTPStatus.BAD_REQUEST)
+            status, _ = await self.request("/admin/profile", headers={})
+            self.assertEqual(status, HTTPStatus.UNAUTHORIZED)
+
+        asyncio.run(run())
+
+    def test_memory_growth_is_attributed(self):
+        async def run():
+            clients = []
+            try:
+                _, body = await self.request("/admin/memory_snapshot")
+                self.assertNotIn("areas", body)
+                for i in range(10):
+                    client = Client(str(i), 16000, 2)
+                    client.append_audio_data(bytes(100000))
+                    clients.append(client)
+                _, body = await self.request("/admin/memory_snapshot")
+            finally:
+                await self.request("/admin/memory_snapshot?stop=1")
+            return body
+
+        body = asyncio.run(run())
+        self.assertEqual(body["state"], "tracing")
+        self.assertGreater(body["areas"]["client"], 10 * 100000)
+        self.assertEqual(body["top"][0]["area"], "client")
+
+
+if __name__ == "__main__":
+    unittest.main()
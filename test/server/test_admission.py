@@ -0,0 +1,122 @@
+import asyncio
+import types
+import unittest
+from unittest import mock
+
+from core.consts import (
+    CLOSE_CODE_AUDIO_RATE_LIMIT,
+    CLOSE_CODE_OVER_CAPACITY,
+    CLOSE_CODE_SESSION_LIMIT,
+)
+from src.admission import AdmissionController
+
+
+@mock.patch("src.admission.get_metric_publisher")
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        self.pool = types.SimpleNamespace(size=2, real_time_factor=None)
+
+    def test_rejects_above_capacity(self, _):
+        async def run():
+            # 2 instances * 0.5 utilization / 0.25 rtf = 4 sessions
+            controller = AdmissionController(
+                self.pool, target_utilization=0.5, default_rtf=0.25
+            )
+            for _ in range(4):
+                self.assertIsNone(await controller.admit("key"))
+            rejection = await controller.admit("key")
+            self.assertEqual(rejection[0], CLOSE_CODE_OVER_CAPACITY)
+
+            # The measured real-time factor takes over the default one
+            self.pool.real_time_factor = 0.5
+            await controller.release("key")
+            self.assertEqual(controller.active_sessions, 3)
+            self.assertFalse(controller.has_capacity())
+
+        asyncio.run(run())
+
+    def test_unlimited_until_rtf_is_known(self, _):
+        async def run():
+            controller = AdmissionController(self.pool)
+            for _ in range(100):
+                self.assertIsNone(await controller.admit("key"))
+            self.pool.real_time_factor = 0.5
+            self.assertFalse(controller.has_capacity())
+
+            controller.limit_capacity = False
+            self.assertTrue(controller.has_capacity())
+
+        asyncio.run(run())
+
+    def test_capacity_counts_the_pool_growth(self, _):
+        self.pool.max_size = 4
+        controller = AdmissionController(self.pool, target_utilization=0.5)
+        self.assertEqual(controller.capacity, 2.0)
+
+    def test_queued_session_admitted_when_one_ends(self, _):
+        async def run():
+            controller = AdmissionController(
+                self.pool,
+                target_utilization=0.5,
+                expected_rtf=1.0,
+                queue_timeout_seconds=1,
+            )
+            self.assertIsNone(await controller.admit("key"))
+            queued = asyncio.create_task(controller.admit("key"))
+            await asyncio.sleep(0.01)
+            self.assertFalse(queued.done())
+
+            await controller.release("key")
+            self.assertIsNone(await queued)
+            self.assertEqual(controller.active_sessions, 1)
+
+        asyncio.run(run())
+
+    def test_per_key_limits(self, _):
+        async def run():
+            controller = AdmissionController(
+                self.pool,
+                max_sessions_per_key=1,
+                audio_seconds_per_minute_per_key=10,
+                key_limits={"big": {"max_sessions": 2}},
+            )
+            self.assertIsNone(await controller.admit("small"))
+            rejection = await controller.admit("small")
+            self.assertEqual(rejection[0], CLOSE_CODE_SESSION_LIMIT)
+            self.assertIsNone(await controller.admit("big"))
+            self.assertIsNone(await controller.admit("big"))
+
+            self.assertIsNone(controller.consume_audio("small", 6))
+            rejection = controller.consume_audio("small", 6)
+            self.assertEqual(rejection[0], CLOSE_CODE_AUDIO_RATE_LIMIT)
+            self.assertIsNone(controller.consume_audio("big", 6))
+
+        asyncio.run(run())
+
+    def test_key_limit_is_checked_after_the_queue(self, _):
+        async def run():
+            controller = AdmissionController(
+                self.pool,
+                target_utilization=1.0,
+                expected_rtf=1.0,
+                queue_timeout_seconds=1,
+                max_sessions_per_key=1,
+            )
+            self.assertIsNone(await controller.admit("x"))
+            self.assertIsNone(await controller.admit("y"))
+            first = asyncio.create_task(controller.admit("key"))
+            second = asyncio.create_task(controller.admit("key"))
+            await asyncio.sleep(0.01)
+
+            await controller.release("x")
+            await controller.release("y")
+            self.assertIsNone(await first)
+            rejection = await second
+            self.assertEqual(rejection[0], CLOSE_CODE_SESSION_LIMIT)
+            self.assertEqual(controller.sessions_per_key["key"], 1)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
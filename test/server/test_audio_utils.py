@@ -0,0 +1,52 @@
+import unittest
+
+from src.audio_utils import compact_speech, restore_timestamps
+
+# One second of 16 kHz 16-bit audio
+SECOND = 32000
+
+
+class TestCompactSpeech(unittest.TestCase):
+    def test_removes_long_gaps(self):
+        audio = bytes(10 * SECOND)
+        compacted, regions = compact_speech(
+            audio,
+            [{"start": 1.0, "end": 2.0}, {"start": 6.0, "end": 7.0}],
+            padding_seconds=0.5,
+            min_gap_seconds=1.0,
+        )
+        self.assertEqual(len(compacted), 4 * SECOND)
+        self.assertEqual(regions, [(0.0, 0.5), (2.0, 5.5)])
+
+    def test_keeps_short_gaps(self):
+        audio = bytes(10 * SECOND)
+        compacted, regions = compact_speech(
+            audio,
+            [{"start": 1.0, "end": 2.0}, {"start": 2.5, "end": 3.0}],
+            padding_seconds=0.2,
+            min_gap_seconds=1.0,
+        )
+        self.assertEqual(len(compacted), int(2.4 * SECOND))
+        self.assertEqual(regions, [(0.0, 0.8)])
+
+    def test_padding_is_clipped_to_audio(self):
+        audio = bytes(2 * SECOND)
+        compacted, regions = compact_speech(
+            audio, [{"start": 0.1, "end": 1.9}], padding_seconds=0.5
+        )
+        self.assertEqual(len(compacted), 2 * SECOND)
+        self.assertEqual(regions, [(0.0, 0.0)])
+
+    def test_restore_timestamps(self):
+        regions = [(0.0, 0.5), (2.0, 5.5)]
+        words = [
+            {"word": "a", "start": 0.6, "end": 2.0, "probability": 0.9},
+            {"word": "b", "start": 2.0, "end": 2.4, "probability": 0.8},
+        ]
+        restored = restore_timestamps(words, regions)
+        self.assertEqual(
+            [(w["start"], w["end"]) for w in restored],
+            [(1.1, 2.5), (5.5, 5.9)],
+        )
+        self.assertEqual(restored[0]["word"], "a")
+        self.assertEqual(words[0]["start"], 0.6)
@@ -0,0 +1,89 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import unittest
+import wave
+
+import numpy as np
+
+from src.batch import BatchTranscriber
+from test.server.fakes import FakeModelPool, patch_metric_publishers
+
+
+class EnergyVAD:
+    """Speech wherever the samples are not zero, by 100 ms windows."""
+
+    async def detect_activity(self, client):
+        samples = np.frombuffer(bytes(client.scratch_buffer), dtype=np.int16)
+        segments = []
+        for start in range(0, len(samples), 1600):
+            if np.any(samples[start : start + 1600]):  # noqa: E203
+                if segments and segments[-1]["end"] == start / 16000:
+                    segments[-1]["end"] = (start + 1600) / 16000
+                else:
+                    segments.append(
+                        {"start": start / 16000, "end": (start + 1600) / 16000}
+                    )
+        return segments
+
+
+@patch_metric_publishers
+class TestBatchTranscriber(unittest.TestCase):
+    def transcribe(self, duration, speech, **kwargs):
+        """
+        Transcribes a file of `duration` seconds with speech in the (start,
+        end) ranges of `speech`, and returns its results in file order.
+        """
+        samples = np.zeros(int(duration * 16000), np.int16)
+        for start, end in speech:
+            samples[int(start * 16000) : int(end * 16000)] = 1  # noqa: E203
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "file.wav")
+            with wave.open(path, "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(16000)
+                wav_file.writeframes(samples.tobytes())
+
+            output = io.StringIO()
+            transcriber = BatchTranscriber(
+                EnergyVAD(), FakeModelPool(1), output, **kwargs
+            )
+            asyncio.run(transcriber.run([path]))
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        return sorted(results, key=lambda result: result["start"])
+
+    def test_overlapping_padding_is_merged(self, *_):
+        results = self.transcribe(
+            5, [(1.0, 1.5), (1.7, 2.2)], padding_seconds=0.2
+        )
+        self.assertEqual(len(results), 1)
+        self.assertAlmostEqual(results[0]["start"], 0.8)
+        self.assertAlmostEqual(results[0]["end"], 2.4)
+
+    def test_speech_is_carried_across_windows(self, *_):
+        results = self.transcribe(
+            4, [(1.5, 2.5)], window_seconds=2, padding_seconds=0.2
+        )
+        self.assertEqual(len(results), 1)
+        self.assertAlmostEqual(results[0]["start"], 1.3)
+        self.assertAlmostEqual(results[0]["end"], 2.7)
+
+    def test_long_speech_is_split(self, *_):
+        results = self.transcribe(
+            4,
+            [(0.5, 3.5)],
+            window_seconds=2,
+            max_utterance_seconds=1,
+            padding_seconds=0.0,
+        )
+        self.assertEqual(
+            [(r["start"], r["end"]) for r in results],
+            [(0.5, 1.5), (1.5, 2.5), (2.5, 3.5)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import asyncio
+import unittest
+
+from monitoring.metrics import overflow_stats
+from test.server.fakes import (
+    FakeModelPool,
+    FakeVAD,
+    FakeWebSocket,
+    make_client,
+    patch_metric_publishers,
+)
+
+# One chunk of 0.7 seconds of 16 kHz 16-bit audio
+CHUNK = bytes(22400)
+
+
+@patch_metric_publishers
+class TestChunkPipeline(unittest.TestCase):
+    async def drain(self, client):
+        strategy = client.buffering_strategy
+        while strategy.chunks_in_flight:
+            await asyncio.sleep(0.01)
+
+    def test_results_are_sent_in_order(self, *_):
+        async def run():
+            pool = FakeModelPool(2, delays=[0.05, 0])
+            websocket = FakeWebSocket()
+            client = make_client(max_chunks_in_flight=2)
+
+            for _ in range(2):
+                client.append_audio_data(CHUNK)
+                client.process_audio(websocket, FakeVAD(), pool)
+                await asyncio.sleep(0)
+            await self.drain(client)
+
+            self.assertEqual(
+                [m["sequence_number"] for m in websocket.sent], [0, 1]
+            )
+            self.assertEqual(len(websocket.sent), 2)
+
+        asyncio.run(run())
+
+    def test_coalesce_keeps_all_audio(self, *_):
+        async def run():
+            pool = FakeModelPool(1, delays=[0.05])
+            websocket = FakeWebSocket()
+            client = make_client(
+                max_chunks_in_flight=1, overflow_policy="coalesce"
+            )
+            coalesced = overflow_stats.chunks["coalesce"]
+
+            for _ in range(3):
+                client.append_audio_data(CHUNK)
+                client.process_audio(websocket, FakeVAD(), pool)
+                await asyncio.sleep(0)
+            await self.drain(client)
+
+            # The second and third messages make up a single held-back chunk
+            strategy = client.buffering_strategy
+            self.assertEqual(strategy.overflows["coalesced"], 1)
+            self.assertEqual(overflow_stats.chunks["coalesce"] - coalesced, 1)
+            self.assertEqual(len(b"".join(pool.transcribed)), 3 * len(CHUNK))
+            self.assertEqual(len(websocket.sent), 2)
+
+        asyncio.run(run())
+
+    def test_drop_oldest_discards_audio(self, *_):
+        async def run():
+            pool = FakeModelPool(1, delays=[0.05])
+            websocket = FakeWebSocket()
+            client = make_client(
+                max_chunks_in_flight=1, overflow_policy="drop_oldest"
+            )
+            dropped_seconds = overflow_stats.dropped_seconds
+
+            for _ in range(3):
+                client.append_audio_data(CHUNK)
+                client.process_audio(websocket, FakeVAD(), pool)
+                await asyncio.sleep(0)
+            await self.drain(client)
+
+            strategy = client.buffering_strategy
+            self.assertEqual(strategy.overflows["dropped"], 2)
+            self.assertAlmostEqual(
+                overflow_stats.dropped_seconds - dropped_seconds, 1.4
+            )
+            self.assertEqual(pool.transcribed, [CHUNK])
+
+        asyncio.run(run())
+
+    def test_block_waits_for_capacity(self, *_):
+        async def run():
+            pool = FakeModelPool(1, delays=[0.05])
+            websocket = FakeWebSocket()
+            client = make_client(
+                max_chunks_in_flight=1, overflow_policy="block"
+            )
+
+            client.append_audio_data(CHUNK)
+            client.process_audio(websocket, FakeVAD(), pool)
+            waiter = asyncio.create_task(client.wait_for_capacity())
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiter.done())
+
+            await self.drain(client)
+            await asyncio.wait_for(waiter, 1)
+
+        asyncio.run(run())
+
+    def test_compact_speech(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            compacted = make_client(compact_speech=True)
+            default = make_client()
+
+            for client in (compacted, default):
+                client.append_audio_data(CHUNK)
+                client.process_audio(websocket, FakeVAD(), pool)
+                await asyncio.sleep(0)
+                await self.drain(client)
+
+            # The speech ends at 0.1 seconds, padded by 0.2 seconds; the
+            # audio is left as it is by default
+            self.assertEqual(pool.transcribed, [bytes(9600), CHUNK])
+            self.assertEqual(len(websocket.sent), 2)
+
+        asyncio.run(run())
+
+    def test_unknown_overflow_policy(self, *_):
+        with self.assertRaises(ValueError):
+            make_client(overflow_policy="unknown")
+
+    def test_close_cancels_work(self, _, strategy_metrics):
+        async def run():
+            pool = FakeModelPool(1, delays=[0.05])
+            websocket = FakeWebSocket()
+            client = make_client(max_chunks_in_flight=2)
+
+            for _ in range(2):
+                client.append_audio_data(CHUNK)
+                client.process_audio(websocket, FakeVAD(), pool)
+                await asyncio.sleep(0.01)
+            # The first utterance is decoding, the second waits for a model
+            self.assertEqual(pool.waiting, 1)
+
+            client.append_audio_data(CHUNK[:100])
+            client.close()
+            await asyncio.sleep(0)
+            self.assertEqual(pool.waiting, 0)
+            self.assertTrue(client.session_closed.is_set())
+            self.assertEqual(len(client.buffer), 0)
+
+            await asyncio.sleep(0.1)
+            self.assertEqual(websocket.sent, [])
+            self.assertEqual(pool.transcribed, [CHUNK])
+            # The abandoned decode gave its model back
+            self.assertEqual(pool.idle_count, 1)
+            metrics = [
+                call.args[0]
+                for call in strategy_metrics().publish_metric.call_args_list
+            ]
+            self.assertIn("WastedDecodeSeconds", metrics)
+
+        asyncio.run(run())
+
+    def test_config_update_replaces_strategy(self, *_):
+        async def run():
+            pool = FakeModelPool(1, delays=[0.05])
+            client = make_client()
+            strategy = client.buffering_strategy
+            client.append_audio_data(CHUNK)
+            client.process_audio(FakeWebSocket(), FakeVAD(), pool)
+            await asyncio.sleep(0.01)
+
+            # Unchanged strategy settings keep the strategy and its work
+            processing_args = dict(client.config["processing_args"])
+            client.update_config(
+                {"language": "en", "processing_args": processing_args}
+            )
+            self.assertIs(client.buffering_strategy, strategy)
+            self.assertFalse(strategy.closed)
+
+            processing_args["chunk_length_seconds"] = 1
+            client.update_config({"processing_args": processing_args})
+            self.assertIsNot(client.buffering_strategy, strategy)
+            self.assertTrue(strategy.closed)
+            # The abandoned decode gives its model back
+            await asyncio.sleep(0.1)
+            self.assertEqual(pool.idle_count, 1)
+
+        asyncio.run(run())
@@ -0,0 +1,149 @@
+import asyncio
+import types
+import unittest
+
+import websockets
+
+from core.consts import CLOSE_CODE_OVER_CAPACITY, CLOSE_CODE_SESSION_LIMIT
+from src.admin import AdminInterface
+from src.gateway import Gateway
+
+
+class FakeBackend:
+    """A WebSocket server answering /status like `Server`."""
+
+    def __init__(self, name, idle=1, waiting=0, sessions=0):
+        self.name = name
+        self.server = types.SimpleNamespace(
+            connected_clients=dict.fromkeys(range(sessions)),
+            asr_pipeline=types.SimpleNamespace(
+                size=2, idle_count=idle, in_use=2 - idle, waiting=waiting
+            ),
+            admission_controller=None,
+        )
+        self.paths = []
+
+    async def handle_websocket(self, websocket):
+        self.paths.append(websocket.path)
+        async for message in websocket:
+            if message == "close":
+                await websocket.close(CLOSE_CODE_SESSION_LIMIT, "Bye")
+                return
+            await websocket.send(f"{self.name}:{message}")
+
+    async def start(self):
+        self.websocket_server = await websockets.serve(
+            self.handle_websocket,
+            "127.0.0.1",
+            0,
+            process_request=AdminInterface(self.server).process_request,
+        )
+        port = self.websocket_server.sockets[0].getsockname()[1]
+        self.uri = f"ws://127.0.0.1:{port}"
+
+    async def stop(self):
+        self.websocket_server.close()
+        await self.websocket_server.wait_closed()
+
+
+class TestGateway(unittest.TestCase):
+    def run_gateway(self, backends, test):
+        async def run():
+            for backend in backends:
+                await backend.start()
+            gateway = Gateway(
+                [backend.uri for backend in backends],
+                host="127.0.0.1",
+                port=0,
+            )
+            await gateway.poll()
+            websocket_server = await gateway.start()
+            port = websocket_server.sockets[0].getsockname()[1]
+            try:
+                await test(gateway, f"ws://127.0.0.1:{port}")
+            finally:
+                websocket_server.close()
+                await websocket_server.wait_closed()
+                for backend in backends:
+                    await backend.stop()
+
+        asyncio.run(run())
+
+    def test_status_is_polled(self):
+        backend = FakeBackend("a", idle=0, waiting=3, sessions=4)
+
+        async def test(gateway, uri):
+            status = gateway.backends[0].status
+            self.assertEqual(status["waiting"], 3)
+            self.assertEqual(status["sessions"], 4)
+            self.assertTrue(status["accepting"])
+            self.assertEqual(gateway.backends[0].load, 3)
+
+        self.run_gateway([backend], test)
+
+    def test_sessions_go_to_the_least_loaded_backend(self):
+        busy = FakeBackend("busy", idle=0, waiting=2)
+        free = FakeBackend("free", idle=2)
+
+        async def test(gateway, uri):
+            async with websockets.connect(uri + "/?AWAAZ_API_KEY=k") as ws:
+                await ws.send("hello")
+                self.assertEqual(await ws.recv(), "free:hello")
+            self.assertEqual(free.paths, ["/?AWAAZ_API_KEY=k"])
+            # Sessions routed since the last poll take the free models
+            self.assertEqual(gateway.backends[1].routed, 1)
+            self.assertEqual(gateway.backends[1].load, -1)
+
+        self.run_gateway([busy, free], test)
+
+    def test_unreachable_backend_is_skipped(self):
+        down = FakeBackend("down", idle=2)
+        up = FakeBackend("up", idle=0)
+
+        async def test(gateway, uri):
+            await down.stop()
+            async with websockets.connect(uri) as ws:
+                await ws.send("hello")
+                self.assertEqual(await ws.recv(), "up:hello")
+            self.assertFalse(gateway.backends[0].healthy)
+
+            await down.start()
+            gateway.backends[0].uri = down.uri
+            await gateway.poll()
+            self.assertTrue(gateway.backends[0].healthy)
+
+        self.run_gateway([down, up], test)
+
+    def test_unhealthy_after_failed_polls(self):
+        backend = FakeBackend("a")
+
+        async def test(gateway, uri):
+            await backend.stop()
+            await gateway.poll()
+            self.assertTrue(gateway.backends[0].healthy)
+            await gateway.poll()
+            self.assertFalse(gateway.backends[0].healthy)
+            async with websockets.connect(uri) as ws:
+                with self.assertRaises(websockets.ConnectionClosed):
+                    await ws.recv()
+                self.assertEqual(ws.close_code, CLOSE_CODE_OVER_CAPACITY)
+            await backend.start()
+
+        self.run_gateway([backend], test)
+
+    def test_close_code_is_passed_on(self):
+        backend = FakeBackend("a")
+
+        async def test(gateway, uri):
+            async with websockets.connect(uri) as ws:
+                await ws.send("close")
+                with self.assertRaises(websockets.ConnectionClosed):
+                    await ws.recv()
+                self.assertEqual(ws.close_code, CLOSE_CODE_SESSION_LIMIT)
+                self.assertEqual(ws.close_reason, "Bye")
+
+        self.run_gateway([backend], test)
+
+
+if __name__ == "__main__":
+    unittest.main()
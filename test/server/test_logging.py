@@ -0,0 +1,62 @@
+import logging
+import queue
+import unittest
+from unittest import mock
+
+import structlog
+
+from core.logging import HotPathSampler, NonBlockingQueueHandler, log_stats
+
+
+class TestHotPathSampler(unittest.TestCase):
+    def test_other_events_are_kept(self):
+        sampler = HotPathSampler(sample_rate=0.0)
+        event = {"event": "Client connected"}
+        self.assertIs(sampler(None, "info", event), event)
+
+    def test_sampling(self):
+        sampler = HotPathSampler(sample_rate=0.5)
+        sampled_out = log_stats.sampled_out
+        with mock.patch("core.logging.random.random", return_value=0.7):
+            with self.assertRaises(structlog.DropEvent):
+                sampler(None, "info", {"event": "vad", "hot_path": True})
+        with mock.patch("core.logging.random.random", return_value=0.2):
+            event = sampler(None, "info", {"event": "vad", "hot_path": True})
+        self.assertEqual(event, {"event": "vad"})
+        self.assertEqual(log_stats.sampled_out, sampled_out + 1)
+
+    def test_rate_limit(self):
+        sampler = HotPathSampler(max_per_second=2)
+        kept = 0
+        for _ in range(10):
+            try:
+                sampler(None, "info", {"event": "vad", "hot_path": True})
+                kept += 1
+            except structlog.DropEvent:
+                pass
+        self.assertEqual(kept, 2)
+
+
+class TestNonBlockingQueueHandler(unittest.TestCase):
+    def make_record(self, msg):
+        return logging.LogRecord(
+            "test", logging.INFO, __file__, 1, msg, None, None
+        )
+
+    def test_event_dicts_are_not_rendered(self):
+        records = queue.Queue()
+        handler = NonBlockingQueueHandler(records)
+        event = {"event": "Time taken for vad", "time_diff": 0.01}
+        handler.emit(self.make_record(event))
+        self.assertIs(records.get_nowait().msg, event)
+
+    def test_full_queue_drops_records(self):
+        handler = NonBlockingQueueHandler(queue.Queue(1))
+        dropped = log_stats.dropped
+        handler.emit(self.make_record({"event": "first"}))
+        handler.emit(self.make_record({"event": "second"}))
+        self.assertEqual(log_stats.dropped, dropped + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from asgi_correlation_id import correlation_id
+
+from monitoring.loop_lag import LoopLagWatchdog
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+@mock.patch("monitoring.loop_lag.get_metric_publisher")
+@mock.patch("monitoring.loop_lag.log")
+class TestLoopLagWatchdog(unittest.TestCase):
+    def run_blocked(self, watchdog):
+        async def session():
+            correlation_id.set("session-1")
+            await asyncio.sleep(0.05)
+            blocking_call()
+
+        async def run():
+            watchdog_task = asyncio.create_task(watchdog.run())
+            await asyncio.sleep(0.05)
+            await asyncio.create_task(session())
+            await asyncio.sleep(0.1)
+            watchdog_task.cancel()
+            await asyncio.gather(watchdog_task, return_exceptions=True)
+
+        asyncio.run(run())
+
+    def test_blocking_call_is_logged(self, log, _):
+        watchdog = LoopLagWatchdog(interval=0.02, threshold_seconds=0.1)
+        self.run_blocked(watchdog)
+
+        log.warning.assert_called_once()
+        kwargs = log.warning.call_args.kwargs
+        self.assertEqual(kwargs["correlation_id"], "session-1")
+        self.assertIn("blocking_call", kwargs["stack"])
+        self.assertGreaterEqual(kwargs["blocked_seconds"], 0.1)
+        max_lag, mean_lag, stalls = watchdog.pop_stats()
+        self.assertGreater(max_lag, 0.2)
+        self.assertEqual(stalls, 1)
+
+    def test_reports_are_rate_limited(self, log, _):
+        watchdog = LoopLagWatchdog(interval=0.02, threshold_seconds=0.1)
+        self.run_blocked(watchdog)
+        self.run_blocked(watchdog)
+        self.assertEqual(log.warning.call_count, 1)
+        self.assertEqual(watchdog.stalls, 2)
+
+    def test_lag_is_published(self, _, metrics):
+        async def run():
+            watchdog = LoopLagWatchdog(interval=0.01, publish_interval=0.05)
+            watchdog_task = asyncio.create_task(watchdog.run())
+            await asyncio.sleep(0.1)
+            watchdog_task.cancel()
+            await asyncio.gather(watchdog_task, return_exceptions=True)
+
+        asyncio.run(run())
+        published = {
+            call.args[0] for call in metrics().publish_metric.call_args_list
+        }
+        self.assertEqual(
+            published,
+            {
+                "EventLoopLagMaxSeconds",
+                "EventLoopLagMeanSeconds",
+                "EventLoopStalls",
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from test.server.fakes import (
+    FakeModelPool,
+    FakeVAD,
+    FakeWebSocket,
+    make_client,
+    patch_metric_publishers,
+)
+
+
+@patch_metric_publishers
+class TestMultiChannel(unittest.TestCase):
+    def make_client(self, channels):
+        return make_client(channels=channels)
+
+    def test_channels_are_split(self, *_):
+        client = self.make_client(2)
+        left = np.arange(100, dtype=np.int16)
+        right = -np.arange(100, dtype=np.int16)
+        interleaved = np.stack([left, right], axis=1).tobytes()
+
+        # Messages are not aligned on frames
+        client.append_audio_data(interleaved[:7])
+        client.append_audio_data(interleaved[7:])
+
+        left_client, right_client = client.channel_clients
+        self.assertEqual(bytes(left_client.buffer), left.tobytes())
+        self.assertEqual(bytes(right_client.buffer), right.tobytes())
+        self.assertEqual(len(client.buffer), 0)
+        self.assertEqual(client.total_samples, 100)
+
+    def test_results_are_tagged_with_their_channel(self, *_):
+        async def run():
+            pool = FakeModelPool(2)
+            websocket = FakeWebSocket()
+            client = self.make_client(2)
+            left = np.full(11200, 1, dtype=np.int16)
+            right = np.full(11200, 2, dtype=np.int16)
+
+            client.append_audio_data(np.stack([left, right], axis=1).tobytes())
+            client.process_audio(websocket, FakeVAD(), pool)
+            for channel_client in client.channel_clients:
+                while channel_client.buffering_strategy.chunks_in_flight:
+                    await asyncio.sleep(0.01)
+
+            self.assertEqual(
+                sorted(message["channel"] for message in websocket.sent),
+                [0, 1],
+            )
+            self.assertEqual(
+                sorted(pool.transcribed), [left.tobytes(), right.tobytes()]
+            )
+
+        asyncio.run(run())
+
+    def test_mono_sessions_are_unchanged(self, *_):
+        client = self.make_client(1)
+        client.append_audio_data(bytes(10))
+        self.assertEqual(client.channel_clients, [])
+        self.assertEqual(len(client.buffer), 10)
+
+    def test_config_update_keeps_channel_clients(self, *_):
+        client = self.make_client(2)
+        channel_clients = list(client.channel_clients)
+        client.append_audio_data(bytes(8))
+
+        client.update_config({"language": "en"})
+        self.assertEqual(client.channel_clients, channel_clients)
+        self.assertEqual(channel_clients[0].config["language"], "en")
+        self.assertEqual(len(channel_clients[0].buffer), 4)
+
+        client.update_config({"channels": 3})
+        self.assertEqual(len(client.channel_clients), 3)
+        for channel_client in channel_clients:
+            self.assertTrue(channel_client.buffering_strategy.closed)
+            self.assertEqual(len(channel_client.buffer), 0)
+        # The session itself goes on
+        self.assertFalse(client.session_closed.is_set())
+
+    def test_unsupported_channels(self, *_):
+        with self.assertRaises(ValueError):
+            self.make_client(0)
+
+    def test_rejected_channels_leave_the_config_unchanged(self, *_):
+        client = self.make_client(2)
+        channel_clients = client.channel_clients
+        strategy = client.buffering_strategy
+
+        for channels in (9, "two", None):
+            with self.assertRaises(ValueError):
+                client.update_config({"channels": channels, "language": "en"})
+        self.assertEqual(client.config["channels"], 2)
+        self.assertIsNone(client.config["language"])
+        self.assertIs(client.buffering_strategy, strategy)
+        self.assertEqual(client.channel_clients, channel_clients)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import gzip
+import os
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+from src.recorder import (
+    AUDIO,
+    CONFIG,
+    SESSION_CLOSE,
+    SESSION_OPEN,
+    SessionRecorder,
+    read_records,
+)
+
+
+class TestSessionRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_round_trip(self):
+        recorder = SessionRecorder(self.directory.name)
+        session_id = str(uuid.uuid4())
+        recorder.open_session(session_id, 16000, 2)
+        recorder.record_message(session_id, '{"type": "config"}')
+        recorder.record_message(session_id, b"\x01\x02" * 160)
+        recorder.close_session(session_id)
+        recorder.close()
+
+        records = list(read_records(recorder.path))
+        self.assertEqual(
+            [kind for kind, _, _, _ in records],
+            [SESSION_OPEN, CONFIG, AUDIO, SESSION_CLOSE],
+        )
+        self.assertTrue(all(r[1] == session_id for r in records))
+        self.assertEqual(records[1][3], b'{"type": "config"}')
+        self.assertEqual(records[2][3], b"\x01\x02" * 160)
+        times = [arrival_time for _, _, arrival_time, _ in records]
+        self.assertEqual(times, sorted(times))
+
+    def test_unsampled_sessions_are_not_recorded(self):
+        recorder = SessionRecorder(self.directory.name, fraction=0.0)
+        session_id = str(uuid.uuid4())
+        recorder.open_session(session_id, 16000, 2)
+        recorder.record_message(session_id, b"\x00" * 320)
+        recorder.close_session(session_id)
+        recorder.close()
+        self.assertEqual(list(read_records(recorder.path)), [])
+
+    @mock.patch("src.recorder.get_metric_publisher")
+    @mock.patch.object(SessionRecorder, "_write_records")
+    def test_dropped_records_are_counted(self, _, publisher):
+        # Without a writer, the queue fills up after the first record
+        recorder = SessionRecorder(self.directory.name, max_queued_records=1)
+        session_id = str(uuid.uuid4())
+        recorder.open_session(session_id, 16000, 2)
+        for _ in range(3):
+            recorder.record_message(session_id, b"\x00" * 320)
+        self.assertEqual(recorder.dropped_records, 3)
+        # Nothing is published on the caller's side
+        publisher.assert_not_called()
+
+        recorder.publish_dropped_records()
+        recorder.publish_dropped_records()
+        publisher.return_value.publish_metric.assert_called_once_with(
+            "RecorderDroppedRecords", 3, unit="Count"
+        )
+
+    def test_truncated_record_is_ignored(self):
+        recorder = SessionRecorder(self.directory.name)
+        session_id = str(uuid.uuid4())
+        recorder.open_session(session_id, 16000, 2)
+        recorder.record_message(session_id, b"\x00" * 320)
+        recorder.close()
+
+        with gzip.open(recorder.path, "rb") as archive:
+            data = archive.read()
+        truncated = os.path.join(self.directory.name, "truncated.rec.gz")
+        with gzip.open(truncated, "wb") as archive:
+            archive.write(data[:-10])
+        records = list(read_records(truncated))
+        self.assertEqual([r[0] for r in records], [SESSION_OPEN])
+
+
+if __name__ == "__main__":
+    unittest.main()
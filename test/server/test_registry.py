@@ -0,0 +1,94 @@
+import sys
+import types
+import unittest
+from unittest import mock
+
+from monitoring.startup import StartupReport
+from src.registry import BackendRegistry
+
+
+class FakeBackend:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+class FakeEntryPoint:
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def load(self):
+        return FakeBackend
+
+
+@mock.patch("src.registry.get_startup_report")
+class TestBackendRegistry(unittest.TestCase):
+    def setUp(self):
+        self.module = types.ModuleType("fake_backend_module")
+        self.module.FakeBackend = FakeBackend
+
+    def test_backends_are_imported_on_first_use(self, startup_report):
+        registry = BackendRegistry("ASR", "test.asr")
+        registry.register("fake", "fake_backend_module:FakeBackend")
+        with mock.patch.dict(
+            sys.modules, {"fake_backend_module": self.module}
+        ):
+            instance = registry.create("fake", size="tiny")
+        self.assertIsInstance(instance, FakeBackend)
+        self.assertEqual(instance.kwargs, {"size": "tiny"})
+        phases = [c.args[0] for c in startup_report().phase.call_args_list]
+        self.assertEqual(phases, ["asr_import", "asr_load"])
+
+    def test_unregistered_modules_are_not_imported(self, _):
+        registry = BackendRegistry("ASR", "test.asr")
+        registry.register("fake", "fake_backend_module:FakeBackend")
+        registry.register("other", "missing_backend_module:Missing")
+        with mock.patch.dict(
+            sys.modules, {"fake_backend_module": self.module}
+        ):
+            self.assertIs(registry.get("fake"), FakeBackend)
+        self.assertNotIn("missing_backend_module", sys.modules)
+
+    @mock.patch("src.registry.entry_points")
+    def test_entry_points(self, entry_points, _):
+        entry_points.return_value = [
+            FakeEntryPoint("plugin", "plugin_package:Backend"),
+            FakeEntryPoint("builtin", "plugin_package:Shadowing"),
+        ]
+        registry = BackendRegistry("VAD", "test.vad")
+        registry.register("builtin", FakeBackend)
+        self.assertIs(registry.get("plugin"), FakeBackend)
+        entry_points.assert_called_once_with(group="test.vad")
+        self.assertEqual(registry.names(), ["builtin", "plugin"])
+        self.assertIs(registry._targets["builtin"], FakeBackend)
+
+    @mock.patch("src.registry.entry_points", return_value=[])
+    def test_unknown_backend(self, *_):
+        registry = BackendRegistry("VAD", "test.vad")
+        with self.assertRaisesRegex(ValueError, "Unknown VAD pipeline type"):
+            registry.get("missing")
+
+
+@mock.patch("monitoring.startup.get_metric_publisher")
+class TestStartupReport(unittest.TestCase):
+    def test_phases_are_summed(self, metrics):
+        report = StartupReport()
+        for _ in range(2):
+            with report.phase("asr_load"):
+                pass
+        with self.assertRaises(RuntimeError):
+            with report.phase("asr_warmup"):
+                raise RuntimeError()
+        self.assertEqual(report.phases["asr_load"][1], 2)
+        self.assertEqual(report.phases["asr_warmup"][1], 1)
+
+        report.publish()
+        published = [
+            call.kwargs["dimensions"][0]["Value"]
+            for call in metrics().publish_metric.call_args_list
+        ]
+        self.assertEqual(published, ["asr_load", "asr_warmup", "total"])
+
+
+if __name__ == "__main__":
+    unittest.main()
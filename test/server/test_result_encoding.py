@@ -0,0 +1,75 @@
+import json
+import unittest
+
+import msgpack
+
+from src import result_encoding
+from src.result_encoding import encode_transcription, negotiate_result_encoding
+
+
+class TestResultEncoding(unittest.TestCase):
+    def setUp(self):
+        self.transcription = {
+            "language": "en",
+            "language_probability": 0.987654,
+            "text": "hello world",
+            "words": [
+                {
+                    "word": " hello",
+                    "start": 0.123456,
+                    "end": 0.5,
+                    "probability": 0.9,
+                },
+                {
+                    "word": " world",
+                    "start": 0.5,
+                    "end": 0.987654,
+                    "probability": 0.8,
+                },
+            ],
+            "processing_time": "0.1234",
+            "audio_duration": 1.0,
+        }
+
+    def test_default_encoding_is_plain_json(self):
+        encoded = encode_transcription(
+            self.transcription, negotiate_result_encoding(None)
+        )
+        self.assertIsInstance(encoded, str)
+        self.assertEqual(json.loads(encoded), self.transcription)
+
+    def test_columnar_words_with_rounding(self):
+        encoding = negotiate_result_encoding(
+            {"words": "columnar", "float_precision": 2}
+        )
+        decoded = json.loads(
+            encode_transcription(self.transcription, encoding)
+        )
+        self.assertEqual(
+            decoded["words"],
+            {
+                "word": [" hello", " world"],
+                "start": [0.12, 0.5],
+                "end": [0.5, 0.99],
+                "probability": [0.9, 0.8],
+            },
+        )
+        self.assertEqual(decoded["language_probability"], 0.99)
+        # The transcription itself is left untouched
+        self.assertEqual(self.transcription["words"][0]["start"], 0.123456)
+
+    def test_unsupported_requests_fall_back_to_defaults(self):
+        encoding = negotiate_result_encoding(
+            {"words": "rows", "float_precision": "2", "format": "xml"}
+        )
+        self.assertEqual(encoding, result_encoding.DEFAULT_RESULT_ENCODING)
+
+    def test_msgpack_binary_frames(self):
+        encoding = negotiate_result_encoding({"format": "msgpack"})
+        encoded = encode_transcription(self.transcription, encoding)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(msgpack.unpackb(encoded), self.transcription)
+
+
+if __name__ == "__main__":
+    unittest.main()
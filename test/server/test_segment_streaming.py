@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import types
+import unittest
+
+from src.asr.faster_whisper_asr import FasterWhisperASR
+from test.server.fakes import (
+    FakeASR,
+    FakeModelPool,
+    FakeVAD,
+    FakeWebSocket,
+    make_client,
+    patch_metric_publishers,
+)
+
+
+class SegmentedASR(FakeASR):
+    """Decodes one segment per 0.5 seconds of audio, one at a time."""
+
+    async def transcribe(self, client):
+        on_segment = getattr(client, "on_segment", None)
+        seconds = len(client.scratch_buffer) / 32000
+        segments = []
+        for i in range(int(seconds / 0.5)):
+            await asyncio.sleep(0.01)
+            segment = {
+                "text": f"{client.client_id}-{i}",
+                "start": i * 0.5,
+                "end": (i + 1) * 0.5,
+                "words": [],
+            }
+            segments.append(segment)
+            if on_segment is not None:
+                on_segment(dict(segment))
+        return {
+            "text": " ".join(segment["text"] for segment in segments),
+            "words": [],
+        }
+
+
+class SegmentedModelPool(FakeModelPool):
+    asr_class = SegmentedASR
+
+
+@patch_metric_publishers
+class TestSegmentStreaming(unittest.TestCase):
+    def make_client(self, stream_segments=True):
+        return make_client(
+            chunk_length_seconds=1.4,
+            chunk_offset_seconds=0.1,
+            stream_segments=stream_segments,
+            max_chunks_in_flight=4,
+        )
+
+    async def stream(self, client, utterances, pool, websocket):
+        for _ in range(utterances):
+            client.append_audio_data(bytes(int(1.5 * 16000) * 2))
+            client.process_audio(websocket, FakeVAD(), pool)
+            strategy = client.buffering_strategy
+            while strategy.processing_flag:
+                await asyncio.sleep(0)
+        await client.buffering_strategy.last_delivery
+
+    def test_segments_are_sent_before_the_utterance(self, *_):
+        async def run():
+            websocket = FakeWebSocket()
+            await self.stream(
+                self.make_client(), 1, SegmentedModelPool(1), websocket
+            )
+            return websocket.sent
+
+        sent = asyncio.run(run())
+        self.assertEqual(
+            [
+                (m["segment_index"], m["final"], m["sequence_number"])
+                for m in sent[:3]
+            ],
+            [(0, False, 0), (1, False, 0), (2, False, 0)],
+        )
+        self.assertEqual(sent[1]["text"], "client_seq0-1")
+        self.assertEqual(sent[1]["start"], 0.5)
+        self.assertTrue(sent[3]["final"])
+        self.assertEqual(len(sent), 4)
+
+    def test_utterances_stay_in_order(self, *_):
+        async def run():
+            websocket = FakeWebSocket()
+            await self.stream(
+                self.make_client(), 2, SegmentedModelPool(2), websocket
+            )
+            return websocket.sent
+
+        sent = asyncio.run(run())
+        self.assertEqual(
+            [(m["sequence_number"], m["final"]) for m in sent],
+            [(0, False)] * 3 + [(0, True)] + [(1, False)] * 3 + [(1, True)],
+        )
+
+    def test_disabled_by_default(self, *_):
+        async def run():
+            websocket = FakeWebSocket()
+            await self.stream(
+                self.make_client(False),
+                1,
+                SegmentedModelPool(1),
+                websocket,
+            )
+            return websocket.sent
+
+        sent = asyncio.run(run())
+        self.assertEqual(len(sent), 1)
+        self.assertNotIn("final", sent[0])
+
+
+class TestFasterWhisperSegments(unittest.TestCase):
+    def test_segments_are_passed_on_while_decoding(self):
+        word = types.SimpleNamespace(
+            word=" hi", start=0.0, end=0.4, probability=0.9
+        )
+        decoded = [
+            types.SimpleNamespace(
+                text=f" part {i}", start=i, end=i + 1, words=[word]
+            )
+            for i in range(2)
+        ]
+        received = []
+
+        def segments():
+            for i, segment in enumerate(decoded):
+                # The previous segments were passed on before this decode
+                self.assertEqual(len(received), i)
+                yield segment
+
+        asr = FasterWhisperASR.__new__(FasterWhisperASR)
+        asr.asr_pipeline = types.SimpleNamespace(
+            transcribe=lambda *args, **kwargs: (segments(), None)
+        )
+        result, _ = asr._decode(
+            "file.wav", None, threading.Event(), received.append
+        )
+        self.assertEqual(result, decoded)
+        self.assertEqual(
+            received[1],
+            {
+                "text": "part 1",
+                "start": 1,
+                "end": 2,
+                "words": [
+                    {
+                        "word": " hi",
+                        "start": 0.0,
+                        "end": 0.4,
+                        "probability": 0.9,
+                    }
+                ],
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import types
+import unittest
+from unittest import mock
+
+from core.consts import CLOSE_CODE_IDLE_TIMEOUT, CLOSE_CODE_MEMORY_LIMIT
+from src.client import Client
+from src.session_memory import SessionMemoryManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.closed_with = None
+
+    async def close(self, code, reason):
+        self.closed_with = code
+
+
+def make_server(sizes):
+    server = types.SimpleNamespace(connected_clients={}, websockets={})
+    for client_id, size in sizes.items():
+        client = Client(client_id, 16000, 2)
+        client.append_audio_data(bytes(size))
+        server.connected_clients[client_id] = client
+        server.websockets[client_id] = FakeWebSocket()
+    return server
+
+
+@mock.patch("src.session_memory.get_metric_publisher")
+class TestSessionMemoryManager(unittest.TestCase):
+    def test_memory_bytes(self, _):
+        client = Client("client", 16000, 2)
+        client.append_audio_data(bytes(100))
+        client.scratch_buffer += bytes(50)
+        client.buffering_strategy.pending_chunks.append((bytes(30), False))
+        self.assertEqual(client.memory_bytes(), 180)
+
+    def test_session_budget(self, _):
+        server = make_server({"small": 100, "large": 1000})
+        manager = SessionMemoryManager(server, max_session_bytes=500)
+        self.assertIsNone(
+            manager.check_session(server.connected_clients["small"])
+        )
+        code, _ = manager.check_session(server.connected_clients["large"])
+        self.assertEqual(code, CLOSE_CODE_MEMORY_LIMIT)
+        self.assertEqual(manager.evicted_sessions, 1)
+
+    def test_largest_sessions_are_evicted(self, metrics):
+        server = make_server({"a": 300, "b": 500, "c": 400})
+        manager = SessionMemoryManager(server, max_total_bytes=800)
+        asyncio.run(manager.sweep())
+
+        closed = {
+            client_id: websocket.closed_with
+            for client_id, websocket in server.websockets.items()
+        }
+        self.assertEqual(
+            closed, {"a": None, "b": CLOSE_CODE_MEMORY_LIMIT, "c": None}
+        )
+        self.assertEqual(manager.total_bytes, 700)
+        published = {
+            call.args[0]: call.args[1]
+            for call in metrics().publish_metric.call_args_list
+        }
+        self.assertEqual(published["SessionMemoryBytes"], 700)
+        self.assertEqual(published["SessionMemoryMaxBytes"], 500)
+
+    def test_idle_sessions_are_closed(self, _):
+        server = make_server({"active": 10, "idle": 10})
+        server.connected_clients["idle"].last_audio_time = (
+            time.monotonic() - 120
+        )
+        manager = SessionMemoryManager(server, idle_timeout_seconds=60)
+        asyncio.run(manager.sweep())
+
+        self.assertIsNone(server.websockets["active"].closed_with)
+        self.assertEqual(
+            server.websockets["idle"].closed_with, CLOSE_CODE_IDLE_TIMEOUT
+        )
+        self.assertEqual(manager.idle_sessions, 1)
+        self.assertEqual(manager.total_bytes, 10)
+
+    def test_sessions_waiting_on_their_audio_are_not_idle(self, _):
+        server = make_server({"blocked": 10, "decoding": 10})
+        for client in server.connected_clients.values():
+            client.last_audio_time = time.monotonic() - 120
+        blocked = server.connected_clients["blocked"].buffering_strategy
+        blocked.pending_chunks.append((bytes(30), False))
+        decoding = server.connected_clients["decoding"].buffering_strategy
+        decoding.chunks_in_flight = 1
+        manager = SessionMemoryManager(server, idle_timeout_seconds=60)
+        asyncio.run(manager.sweep())
+
+        self.assertIsNone(server.websockets["blocked"].closed_with)
+        self.assertIsNone(server.websockets["decoding"].closed_with)
+        self.assertEqual(manager.idle_sessions, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
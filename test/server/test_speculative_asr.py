@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+
+from test.server.fakes import (
+    FakeModelPool,
+    FakeVAD,
+    FakeWebSocket,
+    make_client,
+    patch_metric_publishers,
+)
+
+
+@patch_metric_publishers
+class TestSpeculativeASR(unittest.TestCase):
+    def make_client(self):
+        return make_client(
+            speculative=True, speculative_min_silence_seconds=0.1
+        )
+
+    async def stream(self, client, seconds, vad, pool, websocket):
+        client.append_audio_data(bytes(int(seconds * 16000) * 2))
+        client.process_audio(websocket, vad, pool)
+        strategy = client.buffering_strategy
+        while strategy.processing_flag:
+            await asyncio.sleep(0)
+        if strategy.last_delivery is not None:
+            await strategy.last_delivery
+
+    def test_uses_speculation_when_endpoint_confirmed(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            vad = FakeVAD(0.8, 0.8)
+            client = self.make_client()
+            strategy = client.buffering_strategy
+
+            await self.stream(client, 1.0, vad, pool, websocket)
+            self.assertIsNotNone(strategy.speculation)
+            self.assertEqual(websocket.sent, [])
+
+            await self.stream(client, 0.6, vad, pool, websocket)
+            self.assertIsNone(strategy.speculation)
+            self.assertEqual(len(websocket.sent), 1)
+            # Only the speculative decode ran
+            self.assertEqual(pool.transcribed, [bytes(32000)])
+
+        asyncio.run(run())
+
+    def test_discards_speculation_when_speech_continues(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            vad = FakeVAD(0.8, 1.2)
+            client = self.make_client()
+
+            await self.stream(client, 1.0, vad, pool, websocket)
+            await self.stream(client, 1.0, vad, pool, websocket)
+            self.assertEqual(len(websocket.sent), 1)
+            self.assertEqual(len(pool.transcribed), 2)
+            self.assertEqual(len(pool.transcribed[1]), 64000)
+
+        asyncio.run(run())
+
+    def test_discards_speculation_when_speech_ends_later(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            # The speech now ends after the end seen by the speculation,
+            # though before the end of the audio it transcribed
+            vad = FakeVAD(0.8, 0.9)
+            client = self.make_client()
+
+            await self.stream(client, 1.0, vad, pool, websocket)
+            await self.stream(client, 1.0, vad, pool, websocket)
+            self.assertEqual(len(websocket.sent), 1)
+            self.assertEqual(len(pool.transcribed), 2)
+
+        asyncio.run(run())
+
+    def test_no_speculation_without_idle_instance(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            client = self.make_client()
+
+            await pool.acquire()
+            await self.stream(client, 1.0, FakeVAD(0.8), pool, FakeWebSocket())
+            self.assertIsNone(client.buffering_strategy.speculation)
+
+        asyncio.run(run())
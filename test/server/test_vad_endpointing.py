@@ -0,0 +1,130 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from test.server.fakes import (
+    FakeModelPool,
+    FakeVAD,
+    FakeWebSocket,
+    make_client,
+    patch_metric_publishers,
+)
+
+
+class SpeechVAD(FakeVAD):
+    """Finds speech over the whole scratch buffer."""
+
+    async def detect_activity(self, client):
+        duration = len(client.scratch_buffer) / 32000
+        return [{"start": 0.0, "end": duration}]
+
+
+def tone(seconds):
+    samples = np.arange(int(seconds * 16000))
+    signal = 8000 * np.sin(2 * np.pi * 440 * samples / 16000)
+    return signal.astype(np.int16).tobytes()
+
+
+def silence(seconds):
+    return bytes(int(seconds * 16000) * 2)
+
+
+@patch_metric_publishers
+class TestVADEndpointing(unittest.TestCase):
+    def make_client(self, **processing_args):
+        return make_client(
+            "vad_endpointing", min_silence_ms=300, **processing_args
+        )
+
+    async def stream(self, client, websocket, pool, audio, frame=3200):
+        for start in range(0, len(audio), frame):
+            client.append_audio_data(audio[start : start + frame])  # noqa
+            client.process_audio(websocket, SpeechVAD(), pool)
+            await asyncio.sleep(0)
+
+    async def drain(self, client):
+        strategy = client.buffering_strategy
+        while strategy.chunks_in_flight:
+            await asyncio.sleep(0.01)
+
+    def test_ends_utterance_after_silence(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            client = self.make_client(idle_flush_seconds=0)
+
+            await self.stream(client, websocket, pool, tone(0.5))
+            await self.stream(client, websocket, pool, silence(0.2))
+            self.assertEqual(pool.transcribed, [])
+            await self.stream(client, websocket, pool, silence(0.2))
+            await self.drain(client)
+
+            self.assertEqual(len(pool.transcribed), 1)
+            self.assertEqual(len(websocket.sent), 1)
+            # Only the silence after the endpoint is left
+            self.assertLess(len(client.buffer), len(silence(0.2)))
+
+        asyncio.run(run())
+
+    def test_leading_silence_is_trimmed(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            client = self.make_client(pre_roll_ms=100)
+
+            await self.stream(client, websocket, pool, silence(5))
+            self.assertLessEqual(len(client.buffer), len(silence(0.1)))
+            self.assertEqual(pool.transcribed, [])
+
+        asyncio.run(run())
+
+    def test_idle_flush(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            client = self.make_client(idle_flush_seconds=0.05)
+
+            await self.stream(client, websocket, pool, tone(0.5))
+            await asyncio.sleep(0.1)
+            await self.drain(client)
+
+            self.assertEqual(pool.transcribed, [tone(0.5)])
+
+        asyncio.run(run())
+
+    def test_end_of_stream_flushes(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            client = self.make_client(idle_flush_seconds=0)
+
+            await self.stream(client, websocket, pool, tone(0.5))
+            client.flush(websocket, SpeechVAD(), pool)
+            await self.drain(client)
+
+            self.assertEqual(pool.transcribed, [tone(0.5)])
+            self.assertEqual(len(websocket.sent), 1)
+
+        asyncio.run(run())
+
+    def test_end_of_stream_with_silence_at_end_of_chunk(self, *_):
+        async def run():
+            pool = FakeModelPool(1)
+            websocket = FakeWebSocket()
+            client = make_client(
+                chunk_length_seconds=5, chunk_offset_seconds=0.1
+            )
+
+            await self.stream(client, websocket, pool, tone(1))
+            self.assertEqual(pool.transcribed, [])
+            client.flush(websocket, SpeechVAD(), pool)
+            await self.drain(client)
+
+            self.assertEqual(pool.transcribed, [tone(1)])
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# tests/vad/test_silero_vad.py
+
+import asyncio
+import json
+import os
+import unittest
+import wave
+
+from src.client import Client
+from src.vad.silero_vad import SileroVAD
+
+
+class TestSileroVAD(unittest.TestCase):
+    def setUp(self):
+        self.vad = SileroVAD()
+        self.annotations_path = os.path.join(
+            os.path.dirname(__file__), "../audio_files/annotations.json"
+        )
+        self.audio_file_path = os.path.join(
+            os.path.dirname(__file__), "../audio_files/eng_speech.wav"
+        )
+        self.client = Client("test_client", 16000, 2)
+
+    def load_annotations(self):
+        with open(self.annotations_path, "r") as file:
+            return json.load(file)
+
+    def test_detect_activity(self):
+        annotations = self.load_annotations()
+
+        for audio_file, data in annotations.items():
+            audio_file_path = os.path.join(
+                os.path.dirname(__file__), f"../audio_files/{audio_file}"
+            )
+
+            for annotated_segment in data["segments"]:
+                audio_segment = self.get_audio_segment(
+                    audio_file_path,
+                    annotated_segment["start"],
+                    annotated_segment["end"],
+                )
+                self.client.clear_scratch_buffer()
+                self.client.scratch_buffer += audio_segment
+
+                vad_results = asyncio.run(
+                    self.vad.detect_activity(self.client)
+                )
+
+                self.assertTrue(
+                    len(vad_results) > 0,
+                    f"No speech detected in {audio_file} between "
+                    f"{annotated_segment['start']} and "
+                    f"{annotated_segment['end']}",
+                )
+                for segment in vad_results:
+                    self.assertLessEqual(segment["start"], segment["end"])
+                    self.assertTrue(0 <= segment["confidence"] <= 1)
+
+    def test_streaming_matches_single_pass(self):
+        audio = self.get_audio_segment(self.audio_file_path, 0, 10)
+
+        self.client.scratch_buffer = bytearray(audio)
+        single_pass = asyncio.run(self.vad.detect_activity(self.client))
+
+        streaming_client = Client("streaming_client", 16000, 2)
+        chunk_bytes = 16000 * 2 // 4
+        for start in range(0, len(audio), chunk_bytes):
+            streaming_client.scratch_buffer += audio[
+                start : start + chunk_bytes  # noqa: E203
+            ]
+            streaming = asyncio.run(self.vad.detect_activity(streaming_client))
+
+        self.assertEqual(streaming, single_pass)
+
+    def test_silence(self):
+        self.client.scratch_buffer = bytearray(16000 * 2 * 2)
+        vad_results = asyncio.run(self.vad.detect_activity(self.client))
+        self.assertEqual(vad_results, [])
+
+    def get_audio_segment(self, file_path, start, end):
+        with wave.open(file_path, "rb") as wav_file:
+            rate = wav_file.getframerate()
+            wav_file.setpos(int(start * rate))
+            return wav_file.readframes(int((end - start) * rate))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from benchmark.vad_sweep import (
+    VAD_BACKENDS,
+    evaluate,
+    list_configurations,
+    overlap_seconds,
+    sweep,
+)
+
+
+class EnergyVAD:
+    """Speech wherever the samples are not zero, by 100 ms windows."""
+
+    async def detect_activity(self, client):
+        samples = np.frombuffer(bytes(client.scratch_buffer), dtype=np.int16)
+        segments = []
+        for start in range(0, len(samples), 1600):
+            if np.any(samples[start : start + 1600]):  # noqa: E203
+                if segments and segments[-1]["end"] == start / 16000:
+                    segments[-1]["end"] = (start + 1600) / 16000
+                else:
+                    segments.append(
+                        {
+                            "start": start / 16000,
+                            "end": (start + 1600) / 16000,
+                            "confidence": 1.0,
+                        }
+                    )
+        return segments
+
+
+def make_audio(pattern):
+    """Audio of (seconds, is_speech) parts, and its speech segments."""
+    parts, speech, position = [], [], 0.0
+    for seconds, is_speech in pattern:
+        parts.append(np.full(int(seconds * 16000), int(is_speech), np.int16))
+        if is_speech:
+            speech.append((position, position + seconds))
+        position += seconds
+    return np.concatenate(parts).tobytes(), speech
+
+
+class TestVADSweep(unittest.TestCase):
+    def test_overlap(self):
+        self.assertAlmostEqual(
+            overlap_seconds([(0, 2), (1, 3), (5, 6)], [(2, 5.5)]), 1.5
+        )
+
+    def test_evaluate(self):
+        audio, speech = make_audio(
+            [(2, False), (3, True), (6, False), (2, True), (1, False)]
+        )
+        report = asyncio.run(
+            evaluate(EnergyVAD(), [("file", audio, speech)], 1.0, 0.1)
+        )
+        self.assertEqual(report["vad_calls"], 14)
+        self.assertAlmostEqual(report["recall"], 1.0)
+        self.assertAlmostEqual(report["precision"], 1.0)
+        self.assertEqual(report["audio_seconds"], 14)
+        # The silent chunks are discarded, the utterances are sent with
+        # the silence following them in their last chunk
+        self.assertAlmostEqual(report["forwarded_seconds"], 7)
+
+    @mock.patch.object(VAD_BACKENDS, "get")
+    def test_configurations(self, get_backend):
+        # The grid is merged into the defaults of the backend
+        get_backend.side_effect = lambda vad_type: {
+            "pyannote": types.SimpleNamespace(
+                DEFAULT_ARGS={"pyannote_args": {"onset": 0.7, "offset": 0.3}}
+            ),
+            "silero": object,
+        }[vad_type]
+        configurations = list_configurations(
+            ["pyannote", "silero"],
+            {"pyannote": {"auth_token": "token"}},
+            {
+                "pyannote": {"pyannote_args.onset": [0.5, 0.6]},
+                "silero": {"threshold": [0.4]},
+            },
+        )
+        self.assertEqual(len(configurations), 3)
+        vad_type, vad_args = configurations[1]
+        self.assertEqual(vad_args["auth_token"], "token")
+        self.assertEqual(vad_args["pyannote_args"]["onset"], 0.6)
+        self.assertEqual(vad_args["pyannote_args"]["offset"], 0.3)
+        self.assertEqual(configurations[2], ("silero", {"threshold": 0.4}))
+
+    def test_unavailable_backends_are_reported(self):
+        args = types.SimpleNamespace(
+            chunk_length_seconds=1.0, chunk_offset_seconds=0.1
+        )
+        reports = asyncio.run(sweep([], [("missing", {})], args))
+        self.assertIn("Unknown VAD pipeline type", reports[0]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()